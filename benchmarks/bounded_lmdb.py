@@ -0,0 +1,54 @@
+"""
+Cost of bounding an LmdbCollection, comparing reads and writes against an
+unbounded collection, and against a bounded one that evicts as it goes,
+including one with no eviction headroom, which evicts on every write.
+
+    python benchmarks/bounded_lmdb.py
+"""
+
+from time import perf_counter
+from uuid import uuid4 as v4
+
+from conjure import LmdbCollection
+
+
+def time_calls(func, keys):
+    start = perf_counter()
+    for key in keys:
+        func(key)
+    return (perf_counter() - start) / len(keys)
+
+
+def main(n_keys=20000, value_size=1024):
+    value = b'x' * value_size
+    keys = [f'abc_{i:08d}' for i in range(n_keys)]
+
+    configurations = [
+        ('unbounded', dict(), None),
+        ('lru, roomy', dict(max_items=n_keys * 2), None),
+        ('lru, evicting', dict(max_items=n_keys // 4), None),
+        ('lfu, evicting', dict(max_items=n_keys // 4, eviction='lfu'), None),
+        ('lru, no room', dict(max_items=n_keys // 4), 0),
+    ]
+
+    print(f'{"collection":>14} {"write (us)":>12} {"read (us)":>11} {"evictions":>10}')
+
+    for name, kwargs, headroom in configurations:
+        db = LmdbCollection(f'/tmp/{v4().hex}', **kwargs)
+        if headroom is not None:
+            db.eviction_headroom = headroom
+
+        try:
+            write = time_calls(lambda key: db.put(key, value, 'application/octet-stream'), keys)
+
+            # read back whatever survived eviction
+            present = [key for key in keys if key in db]
+            read = time_calls(db.__getitem__, present)
+
+            print(f'{name:>14} {write * 1e6:>12.1f} {read * 1e6:>11.1f} {db.evictions:>10}')
+        finally:
+            db.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Time to read a slice of a large cached array, comparing a whole-array read
+with a chunked array that fetches only the chunks the slice touches.
+
+    python benchmarks/chunked.py
+"""
+
+from time import perf_counter
+from uuid import uuid4 as v4
+
+import numpy as np
+
+from conjure import LmdbCollection, numpy_conjure
+
+
+def time_calls(func, n_calls):
+    start = perf_counter()
+    for _ in range(n_calls):
+        func()
+    return (perf_counter() - start) / n_calls
+
+
+def main():
+    db = LmdbCollection(f'/tmp/{v4().hex}')
+
+    try:
+        @numpy_conjure(db, identifier='whole')
+        def whole(frames: int) -> np.ndarray:
+            return np.random.uniform(0, 1, (frames, 512)).astype(np.float32)
+
+        @numpy_conjure(db, identifier='chunked', chunked=True, chunks=(1024, 512))
+        def chunked(frames: int) -> np.ndarray:
+            return np.random.uniform(0, 1, (frames, 512)).astype(np.float32)
+
+        print(f'{"size":>10} {"whole (us)":>12} {"chunked (us)":>14}')
+
+        for frames in [2 ** 12, 2 ** 15, 2 ** 18]:
+            n_calls = max(3, 2 ** 20 // frames)
+            whole(frames)
+            chunked(frames)
+
+            whole_key = whole.key(frames)
+            chunked_key = chunked.key(frames)
+
+            whole_time = time_calls(lambda: whole.get(whole_key)[1000:2000], n_calls)
+            chunked_time = time_calls(lambda: chunked.get(chunked_key)[1000:2000], n_calls)
+
+            size_mb = frames * 512 * 4 / (1024 * 1024)
+            print(f'{str(size_mb) + "MB":>10} {whole_time * 1e6:>12.1f} {chunked_time * 1e6:>14.1f}')
+    finally:
+        db.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Compression ratio, throughput and read latency of each codec, for the kinds
+of values conjure typically stores: numpy arrays, small JSON index entries
+and pickles.  Codecs whose packages (zstandard, lz4) aren't installed are
+skipped
+
+    python benchmarks/compression.py
+"""
+
+import json
+from time import perf_counter
+from uuid import uuid4 as v4
+
+import dill
+import numpy as np
+
+
+def samples() -> dict:
+    t = np.linspace(0, 1, 2 ** 16, dtype=np.float32)
+    spectrogram = np.abs(np.sin(t[:, None] * np.arange(1, 65)[None, :] * 100)).astype(np.float32)
+    noise = np.random.normal(0, 1, (256, 256)).astype(np.float32)
+
+    return {
+        'tensor': [spectrogram[i:i + 512].tobytes() for i in range(0, 2 ** 16, 512)],
+        'noise': [noise.tobytes()] * 16,
+        'json': [
+            json.dumps({'key': f'document_{i}', 'offset': i * 16, 'label': 'speech'}).encode()
+            for i in range(10000)
+        ],
+        'pickle': [
+            dill.dumps({'step': i, 'loss': 1 / (i + 1), 'params': list(range(32))})
+            for i in range(2000)
+        ],
+    }
+
+
+def codecs(values: list, train: bool) -> dict:
+    from conjure import Lz4Codec, ZlibCodec, ZstdCodec
+
+    available = {'zlib': ZlibCodec()}
+
+    try:
+        available['zstd'] = ZstdCodec()
+        if train:
+            # dictionaries only pay off for many small, similar values
+            available['zstd+dict'] = ZstdCodec.train(values[::4], dict_size=16384)
+    except ImportError:
+        pass
+
+    try:
+        available['lz4'] = Lz4Codec()
+    except ImportError:
+        pass
+
+    return available
+
+
+def measure(name: str, values: list, codec_name: str, codec) -> None:
+    from conjure import Compression, LmdbCollection
+
+    # adaptive compression would store values that barely shrink as they are
+    compression = Compression(default=codec, adaptive=False, min_size=0)
+    original = sum(len(value) for value in values)
+
+    start = perf_counter()
+    stored = [compression.compress(value, 'application/octet-stream') for value in values]
+    compress = perf_counter() - start
+
+    start = perf_counter()
+    for value in stored:
+        compression.decompress(value)
+    decompress = perf_counter() - start
+
+    db = LmdbCollection(f'/tmp/{v4().hex}', compression=compression)
+    try:
+        db.put_many([(f'key_{i:08d}', value, 'application/octet-stream') for i, value in enumerate(values)])
+        start = perf_counter()
+        for i in range(len(values)):
+            db[f'key_{i:08d}']
+        read = (perf_counter() - start) / len(values)
+    finally:
+        db.destroy()
+
+    ratio = original / sum(len(value) for value in stored)
+    mb = original / 1e6
+    print(
+        f'{name:>8} {codec_name:>10} {ratio:>7.2f} {mb / compress:>14.1f} '
+        f'{mb / decompress:>16.1f} {read * 1e6:>11.1f}')
+
+
+def main():
+    print(
+        f'{"values":>8} {"codec":>10} {"ratio":>7} {"compress MB/s":>14} '
+        f'{"decompress MB/s":>16} {"read (us)":>11}')
+
+    for name, values in samples().items():
+        measure(name, values, 'none', None)
+
+        for codec_name, codec in codecs(values, train=name == 'json').items():
+            measure(name, values, codec_name, codec)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Write throughput of an LmdbCollection while several threads continuously
+scan the feed and key prefixes, using read-only transactions.
+
+    python benchmarks/concurrent_scans.py
+"""
+
+from threading import Event, Thread
+from time import perf_counter, sleep
+from uuid import uuid4 as v4
+
+from conjure import LmdbCollection
+
+
+def writer(db: LmdbCollection, prefix: str, duration: float, results: dict):
+    n_writes = 0
+    start = perf_counter()
+    while perf_counter() - start < duration:
+        db.put(f'{prefix}_{v4().hex}', b'value' * 64, 'application/octet-stream')
+        n_writes += 1
+    results['writes'] = n_writes / (perf_counter() - start)
+
+
+def reader(db: LmdbCollection, prefix: str, stop: Event, results: list):
+    n_scans = 0
+    n_items = 0
+    start = perf_counter()
+    while not stop.is_set():
+        n_items += sum(1 for _ in db.feed(offset=prefix, limit=1000))
+        n_items += sum(1 for _ in db.iter_prefix(prefix, prefix, limit=1000))
+        n_scans += 2
+    elapsed = perf_counter() - start
+    results.append((n_scans / elapsed, n_items / elapsed))
+
+
+def run(n_readers: int, duration: float = 3, n_initial_keys: int = 5000):
+    db = LmdbCollection(f'/tmp/{v4().hex}')
+    prefix = 'bench'
+
+    try:
+        for _ in range(n_initial_keys):
+            db.put(f'{prefix}_{v4().hex}', b'value' * 64, 'application/octet-stream')
+
+        stop = Event()
+        reader_results = []
+        readers = [
+            Thread(target=reader, args=(db, prefix, stop, reader_results))
+            for _ in range(n_readers)
+        ]
+        for r in readers:
+            r.start()
+
+        # give readers a moment to get going
+        sleep(0.1)
+
+        writer_results = {}
+        writer(db, prefix, duration, writer_results)
+
+        stop.set()
+        for r in readers:
+            r.join()
+
+        scans = sum(r[0] for r in reader_results)
+        items = sum(r[1] for r in reader_results)
+        return writer_results['writes'], scans, items
+    finally:
+        db.destroy()
+
+
+def main():
+    print(f'{"readers":>8} {"writes/s":>10} {"scans/s":>10} {"items read/s":>14}')
+    for n_readers in [0, 1, 2, 4, 8]:
+        writes, scans, items = run(n_readers)
+        print(f'{n_readers:>8} {writes:>10.0f} {scans:>10.0f} {items:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
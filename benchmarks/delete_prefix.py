@@ -0,0 +1,70 @@
+"""
+Time to purge every key sharing a prefix, one key at a time, compared with
+delete_prefix, for an LmdbCollection and for an S3Collection running against
+a local S3-compatible stand-in, which requires moto[server]
+
+    python benchmarks/delete_prefix.py
+"""
+
+import logging
+import os
+from time import perf_counter
+from uuid import uuid4 as v4
+
+
+def populate(db, prefix: str, n_keys: int):
+    for i in range(n_keys):
+        db.put(f'{prefix}_{i:08d}', b'value' * 16, 'application/octet-stream')
+
+
+def one_at_a_time(db, prefix: str):
+    for key in list(db.iter_prefix(prefix, prefix)):
+        del db[key]
+
+
+def compare(name: str, db, n_keys: int):
+    populate(db, 'single', n_keys)
+    start = perf_counter()
+    one_at_a_time(db, 'single')
+    single = perf_counter() - start
+
+    populate(db, 'batched', n_keys)
+    start = perf_counter()
+    db.delete_prefix('batched')
+    batched = perf_counter() - start
+
+    print(f'{name:>6} {n_keys:>8} {single:>14.2f} {batched:>18.2f}')
+
+
+def main(port=5125):
+    from conjure import LmdbCollection, S3Collection
+
+    print(f'{"store":>6} {"keys":>8} {"one by one (s)":>14} {"delete_prefix (s)":>18}')
+
+    db = LmdbCollection(f'/tmp/{v4().hex}')
+    try:
+        compare('lmdb', db, 200000)
+    finally:
+        db.destroy()
+
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+
+    os.environ.update({
+        'AWS_ENDPOINT_URL': f'http://localhost:{port}',
+        'AWS_ACCESS_KEY_ID': 'benchmark',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+    })
+
+    try:
+        compare('s3', S3Collection('conjure-benchmark'), 2000)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Latency of reading a single page of a function's feed, as the feed grows.
+Pages are read from the middle of the feed, and newest-first from its end.
+
+    python benchmarks/feed_pages.py
+"""
+
+from time import perf_counter
+from uuid import uuid4 as v4
+
+from conjure import LmdbCollection
+
+
+def time_calls(func, n_calls):
+    start = perf_counter()
+    for _ in range(n_calls):
+        func()
+    return (perf_counter() - start) / n_calls
+
+
+def main(page_size=100, n_calls=200):
+    db = LmdbCollection(f'/tmp/{v4().hex}')
+    base_key = 'bench'
+
+    try:
+        print(f'{"feed size":>10} {"middle page (us)":>18} {"newest page (us)":>18}')
+
+        size = 0
+        for target in [1000, 10000, 100000, 1000000]:
+            while size < target:
+                n = min(10000, target - size)
+                db.put_many(
+                    [(f'{base_key}_{v4().hex}', b'value', 'text/plain') for _ in range(n)])
+                size += n
+
+            for i, item in enumerate(db.feed(offset=base_key)):
+                if i == size // 2:
+                    middle = item['timestamp']
+                    break
+
+            middle_page = time_calls(
+                lambda: list(db.feed(offset=middle, limit=page_size)), n_calls)
+            newest_page = time_calls(
+                lambda: list(db.feed(offset=base_key, limit=page_size, reverse=True)), n_calls)
+
+            print(f'{size:>10} {middle_page * 1e6:>18.1f} {newest_page * 1e6:>18.1f}')
+    finally:
+        db.destroy()
+
+
+if __name__ == '__main__':
+    main()
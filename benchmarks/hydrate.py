@@ -0,0 +1,70 @@
+"""
+Time to warm an empty LocalCollectionWithBackup from its bucket, reading
+keys one at a time, compared with hydrate, which downloads in parallel and
+writes locally in batches.
+
+Runs against a local S3-compatible stand-in, which requires moto[server].
+The stand-in answers almost instantly, so each request is delayed by
+latency seconds, to stand in for the round trip to a real bucket
+
+    python benchmarks/hydrate.py
+"""
+
+import logging
+import os
+from time import perf_counter, sleep
+from uuid import uuid4 as v4
+
+
+def add_latency(db, latency: float):
+    db._remote.client.meta.events.register('before-send', lambda **kwargs: sleep(latency))
+
+
+def main(n_keys=1000, value_size=16 * 1024, latency=0.02, port=5126):
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+
+    os.environ.update({
+        'AWS_ENDPOINT_URL': f'http://localhost:{port}',
+        'AWS_ACCESS_KEY_ID': 'benchmark',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+    })
+
+    from conjure import LocalCollectionWithBackup, S3Collection
+
+    try:
+        bucket = S3Collection('conjure-benchmark')
+        value = os.urandom(value_size)
+        for i in range(n_keys):
+            bucket.put(f'abc_{i:08d}', value, 'application/octet-stream')
+
+        print(f'{"method":>12} {"keys":>6} {"seconds":>9}')
+
+        db = LocalCollectionWithBackup(f'/tmp/{v4().hex}', remote_bucket='conjure-benchmark')
+        add_latency(db, latency)
+        try:
+            start = perf_counter()
+            for key in db.iter_prefix(b'abc', b'abc', include_remote=True):
+                db[key]
+            print(f'{"one by one":>12} {n_keys:>6} {perf_counter() - start:>9.2f}')
+        finally:
+            db._local.destroy()
+
+        db = LocalCollectionWithBackup(f'/tmp/{v4().hex}', remote_bucket='conjure-benchmark')
+        add_latency(db, latency)
+        try:
+            start = perf_counter()
+            db.hydrate('abc_')
+            print(f'{"hydrate":>12} {n_keys:>6} {perf_counter() - start:>9.2f}')
+        finally:
+            db._local.destroy()
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Cache-hit latency of a conjured function, with and without the memoized
+function identifier.
+
+    python benchmarks/identifier.py
+"""
+
+from time import perf_counter
+from uuid import uuid4 as v4
+
+import numpy as np
+
+from conjure import LmdbCollection, numpy_conjure
+
+
+def time_calls(func, n_calls, *args, **kwargs):
+    start = perf_counter()
+    for _ in range(n_calls):
+        func(*args, **kwargs)
+    return (perf_counter() - start) / n_calls
+
+
+def main(n_calls=2000):
+    db = LmdbCollection(f'/tmp/{v4().hex}')
+
+    try:
+        @numpy_conjure(db)
+        def spectrogram(x: np.ndarray) -> np.ndarray:
+            spec = np.fft.rfft(x, axis=-1, norm='ortho')
+            spec = np.abs(spec)
+            spec = np.log(1 + spec)
+            return spec.astype(np.float32)
+
+        arr = np.random.normal(0, 1, (16, 128))
+
+        # populate the cache
+        spectrogram(arr)
+
+        def uncached_identifier(x):
+            # approximates the previous behavior, where the function's
+            # bytecode was re-hashed (several times) on every call
+            spectrogram.invalidate_identifier()
+            return spectrogram(x)
+
+        before = time_calls(uncached_identifier, n_calls, arr)
+        after = time_calls(spectrogram, n_calls, arr)
+
+        print(f'cache hit, identifier re-derived: {before * 1e6:.1f} us/call')
+        print(f'cache hit, identifier memoized:   {after * 1e6:.1f} us/call')
+        print(f'speedup: {before / after:.2f}x')
+    finally:
+        db.destroy()
+
+
+if __name__ == '__main__':
+    main()
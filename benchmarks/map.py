@@ -0,0 +1,54 @@
+"""
+Throughput of computing many results with a loop over Conjure.__call__,
+compared with Conjure.map on thread pools of increasing size.
+
+    python benchmarks/map.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from time import perf_counter
+from uuid import uuid4 as v4
+
+import numpy as np
+
+from conjure import LmdbCollection, numpy_conjure
+
+
+def spectrogram(seed: int) -> np.ndarray:
+    # numpy releases the GIL for the bulk of this work
+    signal = np.random.RandomState(seed).uniform(-1, 1, 2 ** 18)
+    frames = np.lib.stride_tricks.sliding_window_view(signal, 2048)[::256]
+    return np.abs(np.fft.rfft(frames * np.hanning(2048), axis=-1)).astype(np.float32)
+
+
+def main(n_items=256):
+    print(f'{"method":>12} {"items/s":>10}')
+
+    db = LmdbCollection(f'/tmp/{v4().hex}')
+    try:
+        conj = numpy_conjure(db, identifier='loop')(spectrogram)
+        start = perf_counter()
+        for seed in range(n_items):
+            conj(seed)
+        print(f'{"loop":>12} {n_items / (perf_counter() - start):>10.1f}')
+    finally:
+        db.destroy()
+
+    workers = 1
+    while workers <= (cpu_count() or 1):
+        db = LmdbCollection(f'/tmp/{v4().hex}')
+        try:
+            conj = numpy_conjure(db, identifier=f'threads{workers}')(spectrogram)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                start = perf_counter()
+                for _ in conj.map(range(n_items), executor=pool):
+                    pass
+                print(f'{f"map x{workers}":>12} {n_items / (perf_counter() - start):>10.1f}')
+        finally:
+            db.destroy()
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
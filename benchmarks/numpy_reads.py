@@ -0,0 +1,59 @@
+"""
+Time to read a cached array back out of an LmdbCollection, comparing the
+copying deserializer with zero-copy views over the memory map.
+
+    python benchmarks/numpy_reads.py
+"""
+
+from time import perf_counter
+from uuid import uuid4 as v4
+
+import numpy as np
+
+from conjure import LmdbCollection, numpy_conjure
+
+
+def time_calls(func, n_calls, *args):
+    start = perf_counter()
+    for _ in range(n_calls):
+        func(*args)
+    return (perf_counter() - start) / n_calls
+
+
+def main():
+    db = LmdbCollection(f'/tmp/{v4().hex}')
+
+    try:
+        @numpy_conjure(db, identifier='copying')
+        def copying(size: int) -> np.ndarray:
+            return np.random.uniform(0, 1, (size,)).astype(np.float32)
+
+        @numpy_conjure(db, identifier='zerocopy', zero_copy=True)
+        def zero_copy(size: int) -> np.ndarray:
+            return np.random.uniform(0, 1, (size,)).astype(np.float32)
+
+        print(f'{"size":>10} {"copying (us)":>14} {"zero-copy (us)":>16}')
+
+        for size_mb in [0.01, 1, 16, 128, 512]:
+            size = int(size_mb * 1024 * 1024) // 4
+            n_calls = max(3, int(256 / size_mb))
+
+            # populate the cache, and measure reads only, so the time
+            # spent hashing arguments is excluded
+            copying_key = copying.key(size)
+            zero_copy_key = zero_copy.key(size)
+            copying(size)
+            zero_copy(size)
+
+            copying_time = time_calls(copying.get, n_calls, copying_key)
+            zero_copy_time = time_calls(zero_copy.get, n_calls, zero_copy_key)
+
+            print(
+                f'{str(size_mb) + "MB":>10} '
+                f'{copying_time * 1e6:>14.1f} {zero_copy_time * 1e6:>16.1f}')
+    finally:
+        db.destroy()
+
+
+if __name__ == '__main__':
+    main()
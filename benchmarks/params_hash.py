@@ -0,0 +1,69 @@
+"""
+Time to derive a parameter key for array arguments of increasing size,
+comparing pickling the arguments with hashing array buffers directly.
+
+    python benchmarks/params_hash.py
+"""
+
+from hashlib import sha1
+from time import perf_counter
+
+import dill as pickle
+import numpy as np
+import torch
+
+from conjure.identifier import ParamsHash
+
+
+def pickled_sha1(*args, **kwargs):
+    # the previous approach, which pickles every argument
+    h = sha1()
+    h.update(pickle.dumps(list(args)))
+    h.update(pickle.dumps(kwargs))
+    return h.hexdigest()
+
+
+def time_calls(func, arg, n_calls):
+    start = perf_counter()
+    for _ in range(n_calls):
+        func(arg)
+    return (perf_counter() - start) / n_calls
+
+
+def available_digests():
+    digests = ['sha1', 'blake2b']
+    try:
+        import xxhash
+        digests.extend(['xxh64', 'xxh3_128'])
+    except ImportError:
+        pass
+    return digests
+
+
+def main():
+    digests = available_digests()
+    header = f'{"size":>10} {"pickle+sha1":>12} ' + ' '.join(f'{d:>12}' for d in digests)
+
+    for kind in ['numpy', 'torch']:
+        print(f'\n{kind} arguments (ms per key)')
+        print(header)
+
+        for size_mb in [0.01, 1, 16, 128, 512]:
+            n_elements = int(size_mb * 1024 * 1024) // 4
+            arr = np.random.normal(0, 1, (n_elements,)).astype(np.float32)
+            if kind == 'torch':
+                arr = torch.from_numpy(arr)
+
+            n_calls = max(1, int(64 / size_mb))
+
+            timings = [time_calls(
+                lambda x: pickled_sha1(x.numpy() if kind == 'torch' else x), arr, n_calls)]
+            for digest in digests:
+                identifier = ParamsHash(digest=digest)
+                timings.append(time_calls(identifier.derive_name, arr, n_calls))
+
+            print(f'{str(size_mb) + "MB":>10} ' + ' '.join(f'{t * 1e3:>12.3f}' for t in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Cost of a cache hit on a conjured function, with and without the in-memory
+tier of deserialized results, compared with the cost of hashing its arguments.
+
+    python benchmarks/result_cache.py
+"""
+
+from time import perf_counter
+from uuid import uuid4 as v4
+
+import numpy as np
+
+from conjure import LmdbCollection, ResultCache, numpy_conjure
+
+
+def time_calls(func, n_calls, *args):
+    start = perf_counter()
+    for _ in range(n_calls):
+        func(*args)
+    return (perf_counter() - start) / n_calls
+
+
+def main(n_calls=2000):
+    db = LmdbCollection(f'/tmp/{v4().hex}')
+    cache = ResultCache(max_bytes=1024 * 1024 * 1024)
+
+    try:
+        @numpy_conjure(db, identifier='uncached')
+        def uncached(x: np.ndarray) -> np.ndarray:
+            return np.fft.rfft(x).real
+
+        @numpy_conjure(db, identifier='cached', cache=cache)
+        def cached(x: np.ndarray) -> np.ndarray:
+            return np.fft.rfft(x).real
+
+        print(f'{"size":>10} {"key (us)":>10} {"cache hit (us)":>16} {"storage hit (us)":>18}')
+
+        for size in [128, 16384, 1024 * 1024]:
+            x = np.random.uniform(0, 1, size)
+            uncached(x)
+            cached(x)
+
+            key = cached.key(x)
+
+            key_time = time_calls(cached.key, n_calls, x)
+            cached_time = time_calls(cached.get, n_calls, key)
+            uncached_time = time_calls(uncached.get, n_calls, uncached.key(x))
+
+            print(
+                f'{size:>10} {key_time * 1e6:>10.1f} '
+                f'{cached_time * 1e6:>16.2f} {uncached_time * 1e6:>18.1f}')
+
+        print(cache.stats)
+    finally:
+        db.destroy()
+
+
+if __name__ == '__main__':
+    main()
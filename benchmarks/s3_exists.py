@@ -0,0 +1,60 @@
+"""
+Latency of existence checks against an S3Collection, comparing a download of
+the whole value, a HEAD request, and a HEAD request behind an ExistenceCache.
+
+Runs against a local S3-compatible stand-in, which requires moto[server]
+
+    python benchmarks/s3_exists.py
+"""
+
+import logging
+import os
+from time import perf_counter
+
+
+def time_calls(func, n_calls):
+    start = perf_counter()
+    for _ in range(n_calls):
+        func()
+    return (perf_counter() - start) / n_calls
+
+
+def main(n_calls=20, port=5123):
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+
+    os.environ.update({
+        'AWS_ENDPOINT_URL': f'http://localhost:{port}',
+        'AWS_ACCESS_KEY_ID': 'benchmark',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+    })
+
+    from conjure import ExistenceCache, S3Collection
+
+    try:
+        db = S3Collection('conjure-benchmark')
+        cached = S3Collection('conjure-benchmark', existence_cache=ExistenceCache())
+
+        print(f'{"size":>10} {"download (ms)":>15} {"head (ms)":>11} {"cached (ms)":>13}')
+
+        for size_mb in [0.001, 1, 50]:
+            key = f'value-{size_mb}'
+            db.put(key, os.urandom(int(size_mb * 1024 * 1024)), 'application/octet-stream')
+
+            download = time_calls(lambda: db[key], n_calls)
+            head = time_calls(lambda: key in db, n_calls)
+            from_cache = time_calls(lambda: key in cached, n_calls)
+
+            print(
+                f'{str(size_mb) + "MB":>10} {download * 1e3:>15.2f} '
+                f'{head * 1e3:>11.2f} {from_cache * 1e3:>13.4f}')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
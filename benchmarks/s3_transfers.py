@@ -0,0 +1,59 @@
+"""
+Time to write and read large values with an S3Collection, comparing single
+requests with multipart uploads and parallel ranged reads.
+
+Runs against a local S3-compatible stand-in, which requires moto[server].
+The stand-in runs in this process and re-reads the whole object for every
+ranged request, so numbers here say little about a real bucket, where
+parallel transfers make use of several connections
+
+    python benchmarks/s3_transfers.py
+"""
+
+import logging
+import os
+from time import perf_counter
+
+
+def timed(func):
+    start = perf_counter()
+    result = func()
+    return result, perf_counter() - start
+
+
+def main(port=5124):
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+
+    os.environ.update({
+        'AWS_ENDPOINT_URL': f'http://localhost:{port}',
+        'AWS_ACCESS_KEY_ID': 'benchmark',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+    })
+
+    from conjure import S3Collection
+
+    try:
+        single = S3Collection('conjure-benchmark', multipart_threshold=2 ** 40, part_size=2 ** 40)
+        parts = S3Collection('conjure-benchmark', part_size=8 * 1024 * 1024)
+
+        print(f'{"size":>8} {"method":>10} {"write (ms)":>12} {"read (ms)":>11}')
+
+        for size_mb in [64, 256]:
+            value = os.urandom(size_mb * 1024 * 1024)
+
+            for name, db in [('single', single), ('parts', parts)]:
+                key = f'{name}-{size_mb}'
+                _, write = timed(lambda: db.put(key, value, 'application/octet-stream'))
+                _, read = timed(lambda: db[key])
+                print(f'{str(size_mb) + "MB":>8} {name:>10} {write * 1e3:>12.1f} {read * 1e3:>11.1f}')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
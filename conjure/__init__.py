@@ -8,9 +8,13 @@ from .identifier import \
     FunctionContentIdentifier, FunctionNameIdentifier, ParamsHash, \
     ParamsIdentifier, ParamsJSON, LiteralFunctionIdentifier, LiteralParamsIdentifier
 from .storage import LocalCollectionWithBackup, LmdbCollection, S3Collection
+from .cache import ResultCache, ExistenceCache
+from .compression import Compression, Lz4Codec, ZlibCodec, ZstdCodec
+from .chunked import ChunkedArray, ChunkedArraySerializer, ChunkedArrayDeserializer
 from .decorate import \
-    Conjure, conjure, json_conjure, numpy_conjure, audio_conjure, time_series_conjure, \
+    Arguments, Conjure, conjure, json_conjure, numpy_conjure, audio_conjure, time_series_conjure, \
     text_conjure, MetaData, WriteNotification, conjure_index, pickle_conjure, bytes_conjure
+from .garbage import GarbageCollector
 from .serve import serve_conjure
 from .timestamp import timestamp_id
 from .contenttype import SupportedContentType
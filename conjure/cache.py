@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Union
+import time
+
+
+class ResultCache(object):
+    """
+    A bounded, in-memory tier of deserialized results, keyed by Conjure.key,
+    which evicts the least recently used entries once either max_items or
+    max_bytes is exceeded.
+
+    Sizes are those of the serialized results, which are a cheap stand-in for
+    the memory the deserialized objects occupy.  Cached objects are shared by
+    every caller, so they should be treated as immutable
+    """
+
+    def __init__(self, max_items: int = 1024, max_bytes: Union[int, None] = None):
+        super().__init__()
+
+        if max_items is not None and max_items < 1:
+            raise ValueError(f'max_items must be at least one, but was {max_items}')
+
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+
+        # key -> (value, size)
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: bytes):
+        return key in self._entries
+
+    def __getitem__(self, key: bytes) -> Any:
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                raise
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: bytes, value: Any, size: int) -> None:
+        if self.max_bytes is not None and size > self.max_bytes:
+            # this value would evict everything else, and itself
+            self.invalidate(key)
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        while (self.max_items is not None and len(self._entries) > self.max_items) \
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.nbytes -= size
+            self.evictions += 1
+
+    def invalidate(self, key: bytes) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.nbytes -= entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'items': len(self._entries),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate
+        }
+
+
+class ExistenceCache(object):
+    """
+    Remembers whether keys exist for a short while, so that repeated checks
+    don't each cost a round trip.  Positive and negative answers expire after
+    their own ttls, and a ttl of None means answers of that kind aren't cached
+    """
+
+    def __init__(
+            self,
+            positive_ttl: Union[float, None] = 30,
+            negative_ttl: Union[float, None] = 5,
+            max_items: int = 65536):
+
+        super().__init__()
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+
+        # key -> (exists, expires)
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: bytes) -> Union[bool, None]:
+        """
+        Return the remembered answer for key, or None if there isn't one
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: bytes, exists: bool) -> None:
+        ttl = self.positive_ttl if exists else self.negative_ttl
+
+        with self._lock:
+            self._entries.pop(key, None)
+            if ttl is None:
+                return
+
+            self._entries[key] = (exists, time.monotonic() + ttl)
+
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: bytes) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,271 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from typing import Iterable, List, Tuple, Union
+from uuid import uuid4
+import json
+import math
+
+import numpy as np
+
+from conjure.serialize import Deserializer, Serializer
+from conjure.storage import ensure_bytes, part_prefix
+
+
+def chunk_key(key: bytes, generation: str, index: Tuple[int, ...]) -> bytes:
+    return part_prefix(key) + f'{generation}:{".".join(map(str, index))}'.encode()
+
+
+def default_chunks(shape: Tuple[int, ...], itemsize: int, chunk_bytes: int) -> Tuple[int, ...]:
+    """
+    Split along the first axis only, into chunks of about chunk_bytes
+    """
+    if not shape:
+        return ()
+
+    row_bytes = math.prod(shape[1:]) * itemsize
+    rows = max(1, chunk_bytes // max(row_bytes, 1))
+    return (min(rows, max(shape[0], 1)), *(max(n, 1) for n in shape[1:]))
+
+
+class ChunkedArray(object):
+    """
+    A lazy, read-only view of an array stored as a grid of chunks, each under
+    a key of its own.  Indexing with integers, slices and Ellipsis reads only
+    the chunks that the selection touches, max_workers at a time, while any
+    other index reads the whole array first.
+
+    Chunks are read when the array is indexed, rather than when it's created,
+    so a chunk deleted, or evicted, in the meantime raises a KeyError then.
+    Each version of the array written under key has chunks of its own, named
+    by generation, so an array overwritten while it's read never mixes chunks
+    of both versions
+    """
+
+    def __init__(
+            self,
+            storage,
+            key: Union[str, bytes],
+            shape: Tuple[int, ...],
+            dtype: np.dtype,
+            chunks: Tuple[int, ...],
+            generation: str,
+            max_workers: int = 1):
+
+        super().__init__()
+        self.storage = storage
+        self.key = ensure_bytes(key)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.chunks = tuple(chunks)
+        self.generation = generation
+        self.max_workers = max_workers
+
+    def __repr__(self):
+        return f'ChunkedArray(key={self.key}, shape={self.shape}, dtype={self.dtype}, chunks={self.chunks})'
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def size(self) -> int:
+        return math.prod(self.shape)
+
+    @property
+    def nbytes(self) -> int:
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        if not self.shape:
+            raise TypeError('len() of unsized object')
+        return self.shape[0]
+
+    @property
+    def grid(self) -> Tuple[int, ...]:
+        """
+        The number of chunks along each axis
+        """
+        return tuple(math.ceil(n / c) for n, c in zip(self.shape, self.chunks))
+
+    def chunk_keys(self) -> List[bytes]:
+        return [chunk_key(self.key, self.generation, index) for index in product(*map(range, self.grid))]
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self[...]
+        return arr if dtype is None else arr.astype(dtype)
+
+    def _chunk_shape(self, index: Tuple[int, ...]) -> Tuple[int, ...]:
+        return tuple(
+            min(c, n - i * c) for i, c, n in zip(index, self.chunks, self.shape))
+
+    def _fetch(self, index: Tuple[int, ...]) -> np.ndarray:
+        raw = self.storage[chunk_key(self.key, self.generation, index)]
+        return np.frombuffer(raw, dtype=self.dtype).reshape(self._chunk_shape(index))
+
+    def _read_region(self, start: Tuple[int, ...], stop: Tuple[int, ...]) -> np.ndarray:
+        """
+        Read the contiguous region between start and stop, fetching only the
+        chunks that overlap it
+        """
+        out = np.empty([b - a for a, b in zip(start, stop)], dtype=self.dtype)
+        if out.size == 0:
+            return out
+
+        indices = list(product(*[
+            range(a // c, (b - 1) // c + 1) for a, b, c in zip(start, stop, self.chunks)
+        ]))
+
+        if self.max_workers > 1 and len(indices) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(indices))) as pool:
+                chunks = pool.map(self._fetch, indices)
+                self._assemble(out, start, stop, zip(indices, chunks))
+        else:
+            self._assemble(out, start, stop, ((index, self._fetch(index)) for index in indices))
+
+        return out
+
+    def _assemble(self, out: np.ndarray, start, stop, chunks: Iterable[Tuple[tuple, np.ndarray]]) -> None:
+        for index, chunk in chunks:
+            source = []
+            target = []
+
+            for i, c, a, b in zip(index, self.chunks, start, stop):
+                lo = max(i * c, a)
+                hi = min((i + 1) * c, b)
+                source.append(slice(lo - i * c, hi - i * c))
+                target.append(slice(lo - a, hi - a))
+
+            out[tuple(target)] = chunk[tuple(source)]
+
+    def _normalize(self, item) -> Union[Tuple[list, list, list], None]:
+        """
+        Translate an index into the region it touches, and the index to apply
+        to that region, or return None if it isn't made up of integers,
+        slices and a single Ellipsis
+        """
+        item = item if isinstance(item, tuple) else (item,)
+
+        ellipses = [n for n, i in enumerate(item) if i is Ellipsis]
+        if len(ellipses) > 1:
+            return None
+
+        if ellipses:
+            position = ellipses[0]
+            fill = (slice(None),) * (self.ndim - len(item) + 1)
+            item = item[:position] + fill + item[position + 1:]
+
+        if len(item) > self.ndim:
+            raise IndexError(
+                f'too many indices for array: array is {self.ndim}-dimensional, '
+                f'but {len(item)} were indexed')
+
+        item = item + (slice(None),) * (self.ndim - len(item))
+        start, stop, residual = [], [], []
+
+        for index, n in zip(item, self.shape):
+            if isinstance(index, (int, np.integer)) and not isinstance(index, bool):
+                index = int(index)
+                if not -n <= index < n:
+                    raise IndexError(f'index {index} is out of bounds for axis with size {n}')
+                index %= n
+                start.append(index)
+                stop.append(index + 1)
+                residual.append(0)
+            elif isinstance(index, slice):
+                positions = range(*index.indices(n))
+                if not positions:
+                    start.append(0)
+                    stop.append(0)
+                    residual.append(slice(0, 0))
+                    continue
+
+                lo = min(positions[0], positions[-1])
+                start.append(lo)
+                stop.append(max(positions[0], positions[-1]) + 1)
+                end = positions[-1] - lo + positions.step
+                residual.append(slice(positions[0] - lo, None if end < 0 else end, positions.step))
+            else:
+                return None
+
+        return start, stop, residual
+
+    def __getitem__(self, item) -> np.ndarray:
+        normalized = self._normalize(item)
+        if normalized is None:
+            return self[...][item]
+
+        start, stop, residual = normalized
+        return self._read_region(start, stop)[tuple(residual)]
+
+
+class ChunkedArraySerializer(Serializer):
+    """
+    Stores an array as a small JSON description of its shape, dtype and
+    chunking, with each chunk stored separately, as raw bytes, under a key
+    derived from the array's own and a generation that's new each time the
+    array is written.  Chunks have the shape given by chunks, or, by
+    default, span every axis but the first, and are about chunk_bytes in size
+    """
+
+    def __init__(self, chunks: Tuple[int, ...] = None, chunk_bytes: int = 4 * 1024 * 1024):
+        super().__init__()
+        self.chunks = chunks
+        self.chunk_bytes = chunk_bytes
+
+    def to_parts(self, key: bytes, content: np.ndarray) -> Tuple[bytes, List[Tuple[bytes, bytes]]]:
+        content = np.asarray(content)
+
+        if content.dtype.hasobject:
+            raise ValueError('Arrays of objects cannot be stored in chunks')
+
+        if self.chunks is None:
+            chunks = default_chunks(content.shape, content.dtype.itemsize, self.chunk_bytes)
+        elif len(self.chunks) != content.ndim:
+            raise ValueError(
+                f'chunks {self.chunks} do not match an array of shape {content.shape}')
+        else:
+            chunks = tuple(min(c, max(n, 1)) for c, n in zip(self.chunks, content.shape))
+
+        description = {
+            'shape': list(content.shape),
+            'dtype': content.dtype.str,
+            'chunks': list(chunks),
+            'generation': uuid4().hex,
+        }
+
+        grid = [math.ceil(n / c) for n, c in zip(content.shape, chunks)]
+        parts = []
+        for index in product(*map(range, grid)):
+            region = tuple(slice(i * c, (i + 1) * c) for i, c in zip(index, chunks))
+            parts.append((
+                chunk_key(key, description['generation'], index),
+                np.ascontiguousarray(content[region]).tobytes()))
+
+        return json.dumps(description).encode(), parts
+
+    def part_prefix(self, key: bytes) -> bytes:
+        return part_prefix(key)
+
+
+class ChunkedArrayDeserializer(Deserializer):
+    """
+    Reads arrays stored by ChunkedArraySerializer as ChunkedArrays, which
+    fetch max_workers chunks at a time.  By default, this is the storage's
+    own max_workers, if it has one, so that chunks stored in S3 are fetched
+    in parallel, and one otherwise
+    """
+
+    def __init__(self, max_workers: int = None):
+        super().__init__()
+        self.max_workers = max_workers
+
+    def from_storage(self, storage, key: bytes, encoded: bytes) -> ChunkedArray:
+        description = json.loads(bytes(encoded))
+        return ChunkedArray(
+            storage,
+            key,
+            shape=description['shape'],
+            dtype=description['dtype'],
+            chunks=description['chunks'],
+            generation=description['generation'],
+            max_workers=self.max_workers or getattr(storage, 'max_workers', 1))
@@ -0,0 +1,342 @@
+from threading import local
+from typing import Dict, Iterable, Union
+import struct
+import zlib
+
+# compressed values begin with a header naming the codec, the zstd
+# dictionary, if any, and the size of the original value, so that they can be
+# read without knowing how they were written
+MAGIC = b'\x00cjz'
+HEADER = struct.Struct('<4sBIQ')
+
+# content types whose values are already compressed, and would barely shrink
+COMPRESSED_CONTENT_TYPES = (
+    'image/',
+    'video/',
+    'audio/mpeg',
+    'audio/ogg',
+    'audio/flac',
+    'application/zip',
+    'application/gzip',
+    'application/zstd',
+)
+
+
+def dictionary_id(dictionary: bytes) -> int:
+    """
+    Read the id from a serialized zstd dictionary, without needing zstandard
+    """
+    return struct.unpack('<I', dictionary[4:8])[0]
+
+
+class UnknownDictionary(ValueError):
+    """
+    Raised when a value was compressed with a zstd dictionary that isn't
+    registered, so that readers can fetch it and try again
+    """
+
+    def __init__(self, dictionary_id: int):
+        super().__init__(f'zstd dictionary {dictionary_id} is unknown')
+        self.dictionary_id = dictionary_id
+
+
+class Codec(object):
+    """
+    A compression algorithm, identified in stored values by codec_id
+    """
+
+    codec_id = None
+    name = None
+
+    def __init__(self):
+        super().__init__()
+
+    @property
+    def dictionary_id(self) -> int:
+        return 0
+
+    def compress(self, data) -> bytes:
+        raise NotImplementedError()
+
+    def decompress(self, data, size: int) -> bytes:
+        raise NotImplementedError()
+
+
+class Uncompressed(Codec):
+    codec_id = 0
+    name = 'none'
+
+    def compress(self, data) -> bytes:
+        return bytes(data)
+
+    def decompress(self, data, size: int) -> bytes:
+        return bytes(data)
+
+
+class ZlibCodec(Codec):
+    """
+    Always available, but slower than zstd, and compresses less
+    """
+
+    codec_id = 1
+    name = 'zlib'
+
+    def __init__(self, level: int = 6):
+        super().__init__()
+        self.level = level
+
+    def compress(self, data) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data, size: int) -> bytes:
+        return zlib.decompress(data, bufsize=max(size, 1))
+
+
+class ZstdCodec(Codec):
+    """
+    zstd compression, which requires zstandard, optionally with a dictionary
+    trained on typical values.  Dictionaries make a large difference for
+    many small, similar values, e.g. JSON index entries, which otherwise
+    have too little content of their own to compress well
+    """
+
+    codec_id = 2
+    name = 'zstd'
+
+    def __init__(self, level: int = 3, dictionary: bytes = None):
+        super().__init__()
+        import zstandard
+
+        self._zstd = zstandard
+        self.level = level
+        self.dictionary = None if dictionary is None else zstandard.ZstdCompressionDict(dictionary)
+
+        # compression contexts can't be shared between threads
+        self._contexts = local()
+
+    @classmethod
+    def train(cls, samples: Iterable[bytes], dict_size: int = 16384, level: int = 3) -> 'ZstdCodec':
+        import zstandard
+
+        dictionary = zstandard.train_dictionary(dict_size, [bytes(sample) for sample in samples])
+        return cls(level=level, dictionary=dictionary.as_bytes())
+
+    @property
+    def dictionary_id(self) -> int:
+        return 0 if self.dictionary is None else self.dictionary.dict_id()
+
+    @property
+    def dictionary_bytes(self) -> Union[bytes, None]:
+        return None if self.dictionary is None else self.dictionary.as_bytes()
+
+    def _context(self, name: str, create):
+        context = getattr(self._contexts, name, None)
+        if context is None:
+            context = create()
+            setattr(self._contexts, name, context)
+        return context
+
+    def compress(self, data) -> bytes:
+        compressor = self._context(
+            'compressor', lambda: self._zstd.ZstdCompressor(level=self.level, dict_data=self.dictionary))
+        return compressor.compress(data)
+
+    def decompress(self, data, size: int) -> bytes:
+        decompressor = self._context(
+            'decompressor', lambda: self._zstd.ZstdDecompressor(dict_data=self.dictionary))
+        return decompressor.decompress(data, max_output_size=size)
+
+
+class Lz4Codec(Codec):
+    """
+    lz4 compression, which requires lz4.  It compresses less than zstd, but
+    decompresses faster still
+    """
+
+    codec_id = 3
+    name = 'lz4'
+
+    def __init__(self, acceleration: int = 1):
+        super().__init__()
+        import lz4.block
+
+        self._block = lz4.block
+        self.acceleration = acceleration
+
+    def compress(self, data) -> bytes:
+        # the header already records the original size
+        return self._block.compress(data, store_size=False, acceleration=self.acceleration)
+
+    def decompress(self, data, size: int) -> bytes:
+        return self._block.decompress(data, uncompressed_size=size)
+
+
+CODECS = {codec.codec_id: codec for codec in (Uncompressed, ZlibCodec, ZstdCodec, Lz4Codec)}
+
+
+class Compression(object):
+    """
+    Decides how values are compressed before they're stored, and reverses it
+    when they're read.
+
+    Values whose content type appears in codecs are compressed with that
+    codec, and all others with default, or not at all if it's None.  Values
+    smaller than min_size are never compressed.  When adaptive, content types
+    that are compressed already, e.g. images, are left alone, as are values
+    that shrink by less than min_saving, so that reads don't pay to
+    decompress values that save little space.
+
+    Stored values describe how they were compressed, so any Compression can
+    read them, as long as it knows the zstd dictionaries they were written
+    with
+    """
+
+    def __init__(
+            self,
+            default: Codec = None,
+            codecs: Dict[str, Codec] = None,
+            adaptive: bool = True,
+            min_size: int = 64,
+            min_saving: float = 0.1,
+            dictionaries: Iterable[bytes] = ()):
+
+        super().__init__()
+        self.default = default
+        self.codecs = dict(codecs or {})
+        self.adaptive = adaptive
+        self.min_size = min_size
+        self.min_saving = min_saving
+
+        # codec id -> codec, and dictionary id -> codec, for reads
+        self._decoders = dict()
+        self._dictionaries = dict()
+
+        for codec in [default, *self.codecs.values()]:
+            if codec is not None:
+                self.register(codec)
+
+        for dictionary in dictionaries:
+            self.register_dictionary(dictionary)
+
+    @property
+    def enabled(self) -> bool:
+        return self.default is not None or bool(self.codecs)
+
+    def register(self, codec: Codec) -> None:
+        """
+        Make codec available for reads of the values it compressed
+        """
+        if codec.dictionary_id:
+            self._dictionaries[codec.dictionary_id] = codec
+        else:
+            self._decoders.setdefault(codec.codec_id, codec)
+
+    def register_dictionary(self, dictionary: bytes) -> None:
+        """
+        Make a serialized zstd dictionary available for reads, without
+        loading zstandard until a value written with it is read
+        """
+        self._dictionaries.setdefault(dictionary_id(dictionary), dictionary)
+
+    def dictionary(self, dictionary_id: int) -> bytes:
+        """
+        The serialized zstd dictionary registered as dictionary_id
+        """
+        codec = self._dictionaries[dictionary_id]
+        return codec if isinstance(codec, bytes) else codec.dictionary_bytes
+
+    def train(
+            self,
+            content_type: str,
+            samples: Iterable[bytes],
+            dict_size: int = 16384,
+            level: int = 3) -> ZstdCodec:
+        """
+        Train a zstd dictionary on samples, and compress values of content_type
+        with it from now on
+        """
+        codec = ZstdCodec.train(samples, dict_size=dict_size, level=level)
+        self.codecs[content_type] = codec
+        self.register(codec)
+        return codec
+
+    def codec_for(self, content_type: Union[str, None]) -> Union[Codec, None]:
+        codec = self.codecs.get(content_type)
+        if codec is not None:
+            return codec
+
+        if self.adaptive and content_type is not None \
+                and content_type.startswith(COMPRESSED_CONTENT_TYPES):
+            return None
+
+        return self.default
+
+    @staticmethod
+    def is_compressed(stored) -> bool:
+        view = memoryview(stored)
+        return len(view) >= HEADER.size and bytes(view[:len(MAGIC)]) == MAGIC
+
+    def compress(self, value, content_type: Union[str, None]):
+        """
+        Return value as it should be stored, which is value itself when it
+        isn't worth compressing
+        """
+        size = memoryview(value).nbytes
+        codec = self.codec_for(content_type)
+
+        if codec is not None and size >= self.min_size:
+            compressed = codec.compress(value)
+            if not self.adaptive or len(compressed) <= size * (1 - self.min_saving):
+                return HEADER.pack(MAGIC, codec.codec_id, codec.dictionary_id, size) + compressed
+
+        # a value that happens to begin like a header is given one, so that
+        # it isn't mistaken for a compressed value
+        if self.is_compressed(value):
+            return HEADER.pack(MAGIC, Uncompressed.codec_id, 0, size) + bytes(value)
+
+        return value
+
+    def _decoder(self, codec_id: int, dictionary: int) -> Codec:
+        if dictionary:
+            codec = self._dictionaries.get(dictionary)
+            if codec is None:
+                raise UnknownDictionary(dictionary)
+            if isinstance(codec, bytes):
+                codec = self._dictionaries[dictionary] = ZstdCodec(dictionary=codec)
+            return codec
+
+        codec = self._decoders.get(codec_id)
+        if codec is None:
+            try:
+                codec = self._decoders[codec_id] = CODECS[codec_id]()
+            except KeyError:
+                raise ValueError(f'codec {codec_id} is unknown')
+        return codec
+
+    def decompress(self, stored):
+        """
+        Return the original value, which is stored itself when it was never
+        compressed
+        """
+        if not self.is_compressed(stored):
+            return stored
+
+        view = memoryview(stored)
+        _, codec_id, dictionary, size = HEADER.unpack(view[:HEADER.size])
+        return self._decoder(codec_id, dictionary).decompress(view[HEADER.size:], size)
+
+    def size(self, stored) -> int:
+        """
+        The size of the original value, read without decompressing it
+        """
+        if not self.is_compressed(stored):
+            return memoryview(stored).nbytes
+        return HEADER.unpack(memoryview(stored)[:HEADER.size])[3]
+
+    def dictionary_of(self, stored) -> int:
+        """
+        The id of the zstd dictionary stored was compressed with, or 0
+        """
+        if not self.is_compressed(stored):
+            return 0
+        return HEADER.unpack(memoryview(stored)[:HEADER.size])[2]
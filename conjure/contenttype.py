@@ -2,6 +2,7 @@ from enum import Enum
 
 class SupportedContentType(Enum):
     Tensor = 'application/tensor+octet-stream'
+    ChunkedTensor = 'application/tensor-chunks+json'
     Spectrogram = 'application/spectrogram+octet-stream'
     TimeSeries = 'application/time-series+octet-stream'
     TensorMovie = 'application/tensor-movie+octet-stream'
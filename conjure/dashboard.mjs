@@ -1344,11 +1344,18 @@ const conjure = async (
   }
 
   // extract the data about this specific conjure element
-  const { key, public_uri, content_type, feed_uri, func_identifier } =
+  const data =
     metaData === null
       ? JSON.parse(element.getAttribute("data-conjure"))
       : metaData;
 
+  // functions that haven't produced any results yet have no metadata
+  if (data === null) {
+    return;
+  }
+
+  const { key, public_uri, content_type, feed_uri, func_identifier } = data;
+
   const contentTypeToRenderClass = {
     "application/spectrogram+octet-stream": BasicSpectrogramView,
     "application/tensor+octet-stream": TensorView,
@@ -1396,47 +1403,42 @@ const conjure = async (
   const view = await renderer.renderURL(public_uri, containerId, existing);
   VIEW_CACHE[containerId] = view;
 
-  // TODO: If there's a refresh rate specified, periodically
-  // check the feed.  If there's an item with a timestamp larger
-  // than the one we've got, call conjure again with the same
-  // refresh rate and the new highest offset
+  // If refreshing is enabled, listen for new feed items pushed by the
+  // server, and call conjure again with the newest item as the offset
 
   if (refreshRate !== null && feed_uri) {
-    const interval = setInterval(async () => {
-      const searchParams = new URLSearchParams();
+    const searchParams = new URLSearchParams();
 
-      if (feedOffset) {
-        searchParams.append("offset", feedOffset);
-      }
+    if (feedOffset) {
+      searchParams.append("offset", feedOffset);
+    }
 
-      const feed = await fetch(`${feed_uri}?${searchParams}`).then((resp) =>
-        resp.json()
-      );
-      const onlyNew = feed.filter((item) => item.timestamp !== feedOffset);
-      console.log(`Checked feed and found ${onlyNew.length} new items`);
-      if (onlyNew.length) {
-        const index = onlyNew.length - 1;
-        const { key, timestamp } = onlyNew[index];
-        element.id = `id-${key}`;
-        const origMetadata = JSON.parse(element.getAttribute("data-conjure"));
-        const parts = origMetadata.public_uri.split("/").slice(0, -1);
-        const newPublicUri = [...parts, key].join("/");
-
-        const newMetaData = {
-          ...origMetadata,
-          public_uri: newPublicUri,
-        };
-
-        element.setAttribute("data-conjure", JSON.stringify(newMetaData));
-        clearInterval(interval);
-        await conjure({
-          element,
-          newMetaData,
-          refreshRate,
-          feedOffset: timestamp,
-        });
-      }
-    }, refreshRate);
+    const source = new EventSource(`${feed_uri}/events?${searchParams}`);
+
+    source.onmessage = async (event) => {
+      const { key, timestamp } = JSON.parse(event.data);
+      console.log(`Received new feed item ${timestamp}`);
+
+      source.close();
+
+      element.id = `id-${key}`;
+      const origMetadata = JSON.parse(element.getAttribute("data-conjure"));
+      const parts = origMetadata.public_uri.split("/").slice(0, -1);
+      const newPublicUri = [...parts, key].join("/");
+
+      const newMetaData = {
+        ...origMetadata,
+        public_uri: newPublicUri,
+      };
+
+      element.setAttribute("data-conjure", JSON.stringify(newMetaData));
+      await conjure({
+        element,
+        newMetaData,
+        refreshRate,
+        feedOffset: timestamp,
+      });
+    };
   }
 };
 
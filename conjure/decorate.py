@@ -1,10 +1,12 @@
 import datetime
 import json
 from types import FunctionType
-from typing import Any, Callable, Iterable, Tuple, Union
+from typing import Any, Callable, Iterable, Iterator, List, Tuple, Union
 from urllib.parse import ParseResult
 
 from markdown import markdown
+from conjure.cache import ResultCache
+from conjure.chunked import ChunkedArrayDeserializer, ChunkedArraySerializer
 from conjure.contenttype import SupportedContentType
 from conjure.identifier import \
     FunctionContentIdentifier, FunctionIdentifier, LiteralFunctionIdentifier, LiteralParamsIdentifier, \
@@ -13,8 +15,16 @@ from conjure.serialize import \
     Deserializer, IdentityDeserializer, IdentitySerializer, JSONDeserializer, \
     JSONSerializer, NumpyDeserializer, NumpySerializer, Serializer, \
     PickleSerializer, PickleDeserializer
-from conjure.storage import Collection, LocalCollectionWithBackup, ensure_bytes, ensure_str
+from conjure.storage import \
+    PART_CONTENT_TYPE, Collection, LocalCollectionWithBackup, WriteBatch, ensure_bytes, ensure_str, \
+    is_part
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+import asyncio
+import importlib
 import inspect
+import threading
+import time
 from urllib.parse import urlunparse
 from collections import Counter
 
@@ -28,7 +38,8 @@ class MetaData(object):
             content_length,
             identifier,
             func_name: str,
-            func_identifier: str):
+            func_identifier: str,
+            checksum: str = None):
 
         super().__init__()
         self.key = key
@@ -38,6 +49,7 @@ class MetaData(object):
         self.identifier = identifier
         self.func_name = func_name
         self.func_identifier = func_identifier
+        self.checksum = checksum
 
     def with_public_uri(self, public_uri: ParseResult):
         return MetaData(
@@ -47,7 +59,8 @@ class MetaData(object):
             content_length=self.content_length,
             identifier=self.identifier,
             func_name=self.func_name,
-            func_identifier=self.func_identifier
+            func_identifier=self.func_identifier,
+            checksum=self.checksum
         )
 
     def __str__(self):
@@ -108,6 +121,82 @@ class WriteNotification(object):
 WriteListener = Callable[[WriteNotification], None]
 
 
+def timed_call(func: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    """
+    Call func, returning its result along with the seconds it took
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _timed_call_by_name(module: str, qualname: str, args: tuple, kwargs: dict) -> Tuple[Any, float]:
+    """
+    Look up a function by module and qualified name, rather than pickling it,
+    and call it, returning its result along with the seconds it took.  When
+    the name refers to a decorated function, the undecorated callable is used
+    """
+    func = importlib.import_module(module)
+    for name in qualname.split('.'):
+        func = getattr(func, name)
+
+    if isinstance(func, Conjure):
+        func = func.callable
+
+    return timed_call(func, *args, **kwargs)
+
+
+class Arguments(object):
+    """
+    Several positional and/or keyword arguments for a single call, when
+    mapping a function that takes more than one argument
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.args = args
+        self.kwargs = kwargs
+
+    @classmethod
+    def of(cls, arg: Any) -> 'Arguments':
+        return arg if isinstance(arg, cls) else cls(arg)
+
+
+class KeyLocks(object):
+    """
+    Hands out a lock per key, discarding each once no thread holds or awaits it
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._locks = dict()
+        self._guard = threading.Lock()
+
+    def __len__(self):
+        return len(self._locks)
+
+    @contextmanager
+    def hold(self, key: bytes, timeout: float = None):
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+
+        acquired = False
+        try:
+            acquired = entry[0].acquire(timeout=-1 if timeout is None else timeout)
+            if not acquired:
+                raise TimeoutError(f'Timed out waiting for lock on {key}')
+            yield
+        finally:
+            if acquired:
+                entry[0].release()
+
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
 class Conjure(object):
 
     def __init__(
@@ -121,7 +210,15 @@ class Conjure(object):
         deserializer: Deserializer,
         key_delimiter='_',
         prefer_cache=True,
-        read_from_cache_hook=lambda x: None
+        read_from_cache_hook=lambda x: None,
+        cache: ResultCache = None,
+        single_flight: bool = False,
+        single_flight_timeout: float = 600,
+        lease_ttl: float = 600,
+        stream: bool = False,
+        ttl: float = None,
+        max_stale: float = None,
+        refresh_workers: int = 2
     ):
 
         super().__init__()
@@ -134,12 +231,44 @@ class Conjure(object):
         self.serializer = serializer
         self.deserializer = deserializer
         self.prefer_cache = prefer_cache
+
+        # an optional in-memory tier of deserialized results
+        self.cache = cache
+
+        # when single_flight is set, concurrent callers missing the same key
+        # wait for one of them to compute it, rather than all doing so
+        self.single_flight = single_flight
+        self.single_flight_timeout = single_flight_timeout
+        self.lease_ttl = lease_ttl
+        self._key_locks = KeyLocks()
+
+        # with stream, stored results are deserialized as they're read from
+        # storage, so large values needn't be held in memory all at once
+        self.stream = stream
+
+        # with ttl, results older than ttl seconds are served while they're
+        # recomputed in the background, unless they're more than max_stale
+        # seconds past their ttl, in which case callers wait for a new result
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.refresh_workers = refresh_workers
+        self.refresh_failures = 0
+        self._refresh_executor = None
+        self._refreshes = dict()
+        self._refresh_lock = threading.Lock()
         
         # ensure that a read hook is always present
         self.read_from_cache_hook = read_from_cache_hook or (lambda x: None)
 
         self.listeners = []
 
+        # deriving the function's identity can mean hashing its bytecode,
+        # so it's computed once and cached for the lifetime of this instance
+        self._identifier = None
+
+        # write batches are scoped to the thread that opened them
+        self._local = threading.local()
+
         if '_' in ensure_str(self.identifier):
             raise ValueError('"_" is not currently supported in literal function identifiers.  TODO: Make this configurable globally')
 
@@ -147,7 +276,18 @@ class Conjure(object):
     def offset(self):
         return self.storage.offset
 
-    def feed(self, offset: Union[bytes, str] = None):
+    def feed(
+            self,
+            offset: Union[bytes, str] = None,
+            limit: int = None,
+            batch_size: int = None,
+            reverse: bool = False):
+        """
+        Iterate over this function's results in the order they were written,
+        or newest first when reverse is True.  offset, when provided, is
+        the timestamp of the first item to return
+        """
+
         final_offset = offset or self.identifier
 
         search = ensure_bytes(self.identifier) if isinstance(
@@ -156,11 +296,57 @@ class Conjure(object):
         if not final_offset.startswith(search):
             raise ValueError(
                 f'offset must start with {self.identifier} but was {offset}')
-        return self.storage.feed(offset=final_offset)
+        return self.storage.feed(
+            offset=final_offset, limit=limit, batch_size=batch_size, reverse=reverse)
+
+    def _feed_after(self, offset: Union[bytes, str, None], limit: int) -> List[dict]:
+        items = list(self.feed(offset, limit=limit + 1))
+        if offset is not None and items and items[0]['timestamp'] == ensure_bytes(offset):
+            items = items[1:]
+        return items[:limit]
+
+    def wait_for_feed(
+            self,
+            offset: Union[bytes, str, None] = None,
+            timeout: float = 30,
+            limit: int = 100,
+            poll_interval: float = None) -> List[dict]:
+        """
+        Block until this function has results newer than offset, the timestamp
+        of the last item already seen, returning at most limit of them.  An
+        empty list is returned if timeout seconds elapse first.
+
+        Writes in this process are noticed immediately, while writes by other
+        processes are noticed within poll_interval seconds, or the storage's
+        own interval by default
+        """
+        deadline = time.monotonic() + timeout
+
+        while True:
+            # read the storage offset before the feed, so that no
+            # write landing in between is missed
+            storage_offset = self.storage.offset
+
+            items = self._feed_after(offset, limit)
+            if items:
+                return items
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+
+            if self.storage.wait_for_write(
+                    storage_offset, remaining, poll_interval=poll_interval) is None:
+                return []
+
+    def most_recent_feed_item(self) -> dict:
+        item = self.storage.most_recent_feed_item(self.identifier)
+        if item is None:
+            raise KeyError(f'{self.identifier} has no results')
+        return item
 
     def most_recent_key(self) -> str:
-        all_keys = list(self.feed())
-        return all_keys[-1]['key']
+        return self.most_recent_feed_item()['key']
 
     def most_recent_meta(self) -> MetaData:
         key = self.most_recent_key()
@@ -172,11 +358,20 @@ class Conjure(object):
 
     @property
     def name(self):
-        return self.func_identifier.derive_name(self.callable)
+        return self.identifier
 
     @property
     def identifier(self):
-        return self.func_identifier.derive_name(self.callable)
+        if self._identifier is None:
+            self._identifier = self.func_identifier.derive_name(self.callable)
+        return self._identifier
+
+    def invalidate_identifier(self) -> None:
+        """
+        Discard the cached function identifier, e.g. after the underlying
+        callable has been hot-reloaded, so that it is re-derived on next access
+        """
+        self._identifier = None
 
     @property
     def description(self):
@@ -191,7 +386,9 @@ class Conjure(object):
     def iter_keys(self):
         offset = f'{self.identifier}'.encode()
         for key in self.storage.iter_prefix(offset, prefix=offset):
-            yield key
+            # parts, e.g. the chunks of an array, aren't results
+            if not is_part(key):
+                yield key
 
     def register_listener(self, listener: WriteListener) -> None:
         self.listeners.append(listener)
@@ -199,13 +396,54 @@ class Conjure(object):
     def remove_listener(self, listener: WriteListener) -> None:
         self.listeners.remove(listener)
 
+    @property
+    def _batch(self) -> Union[WriteBatch, None]:
+        return getattr(self._local, 'batch', None)
+
+    @contextmanager
+    def batch(self, write_batch: WriteBatch = None):
+        """
+        Buffer results computed within this block, and write them to storage
+        together.  Buffered results are served as cache hits until then.
+
+        When no write_batch is provided, a new one is committed as the block
+        exits.  Otherwise, committing is left to the owner of write_batch
+        """
+        previous = self._batch
+
+        if write_batch is None:
+            with self.storage.batch() as write_batch:
+                self._local.batch = write_batch
+                try:
+                    yield write_batch
+                finally:
+                    self._local.batch = previous
+            return
+
+        self._local.batch = write_batch
+        try:
+            yield write_batch
+        finally:
+            self._local.batch = previous
+
     def exists(self, *args, **kwargs):
         key = self.key(*args, **kwargs)
-        return key in self.storage
-
-    def meta_from_key(self, key) -> MetaData:
-        # KLUDGE: Implement "head" requests to get object
-        # size without reading into memory/pulling from s3
+        batch = self._batch
+        return (batch is not None and key in batch) or key in self.storage
+
+    def _stored_metadata(self, key) -> dict:
+        batch = self._batch
+        if batch is not None and key in batch:
+            return dict()
+        return self.storage.metadata_many([key])[0] or dict()
+
+    async def _astored_metadata(self, key) -> dict:
+        batch = self._batch
+        if batch is not None and key in batch:
+            return dict()
+        return (await self.storage.ametadata_many([key]))[0] or dict()
+
+    def _meta_data(self, key, metadata: dict, content_length: int) -> MetaData:
         uri = None
         try:
             uri = self.storage.public_uri(key)
@@ -215,11 +453,22 @@ class Conjure(object):
         return MetaData(
             key=key,
             public_uri=uri,
-            content_type=self.content_type,
-            content_length=self.storage.content_length(key),
+            content_type=metadata.get('content_type') or self.content_type,
+            content_length=content_length,
             identifier=self.identifier,
             func_name=self.name,
-            func_identifier=self.identifier)
+            func_identifier=self.identifier,
+            checksum=metadata.get('checksum'))
+
+    def meta_from_key(self, key) -> MetaData:
+        # stored metadata answers without reading the value, falling back
+        # to storage that doesn't keep metadata
+        metadata = self._stored_metadata(key)
+        content_length = metadata.get('content_length')
+        if content_length is None:
+            content_length = self._content_length(key)
+
+        return self._meta_data(key, metadata, content_length)
 
     def meta(self, *args, **kwargs) -> MetaData:
         key = self.key(*args, **kwargs)
@@ -234,13 +483,140 @@ class Conjure(object):
     
     def delete(self, *args, **kwargs):
         key = self.key(*args, **kwargs)
+        if self.cache is not None:
+            self.cache.invalidate(key)
         del self.storage[key]
 
+        prefix = self.serializer.part_prefix(key)
+        if prefix is not None:
+            self.storage.delete_prefix(prefix)
+
+    def _content_length(self, key) -> int:
+        batch = self._batch
+        if batch is not None and key in batch:
+            return batch.content_length(key)
+        return self.storage.content_length(key)
+
+    def _read(self, key):
+        batch = self._batch
+        if batch is not None and key in batch:
+            return batch[key]
+
+        if self.deserializer.zero_copy:
+            return self.storage.view(key)
+        return self.storage[key]
+
+    def _read_object(self, key) -> Tuple[Any, int]:
+        batch = self._batch
+
+        if self.stream and (batch is None or key not in batch):
+            with self.storage.open(key) as f:
+                obj = self.deserializer.read(f)
+                return obj, f.tell()
+
+        raw = self._read(key)
+        source = batch if batch is not None and key in batch else self.storage
+        return self.deserializer.from_storage(source, key, raw), len(raw)
+
     def get(self, key):
-        raw = self.storage[key]
-        obj = self.deserializer.from_bytes(raw)
+        if self.cache is None:
+            obj, _ = self._read_object(key)
+            return obj
+
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+
+        obj, size = self._read_object(key)
+
+        # batched results may yet be discarded, so only those already
+        # in storage are cached
+        if self._batch is None or key not in self._batch:
+            self.cache.put(key, obj, size)
+
         return obj
 
+    async def aget(self, key):
+        if self.cache is not None:
+            try:
+                return self.cache[key]
+            except KeyError:
+                pass
+
+        batch = self._batch
+        if batch is not None and key in batch:
+            return self.deserializer.from_storage(batch, key, batch[key])
+
+        if self.deserializer.zero_copy:
+            raw = await self.storage.aview(key)
+        else:
+            raw = await self.storage.aget(key)
+
+        obj = self.deserializer.from_storage(self.storage, key, raw)
+        if self.cache is not None:
+            self.cache.put(key, obj, len(raw))
+        return obj
+
+    async def ameta(self, *args, **kwargs) -> MetaData:
+        key = self.key(*args, **kwargs)
+
+        metadata = await self._astored_metadata(key)
+        content_length = metadata.get('content_length')
+        if content_length is None:
+            batch = self._batch
+            if batch is not None and key in batch:
+                content_length = batch.content_length(key)
+            else:
+                content_length = await self.storage.acontent_length(key)
+
+        return self._meta_data(key, metadata, content_length)
+
+    async def acall(self, *args, **kwargs):
+        """
+        Like calling this function, but storage is accessed without blocking
+        the event loop, and new results are computed on the loop's default
+        executor
+        """
+        key = self.key(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+
+        servable = self.prefer_cache and (
+            self.ttl is None
+            or await loop.run_in_executor(None, self._servable, key, args, kwargs))
+
+        if servable:
+            try:
+                obj = await self.aget(key)
+                self.read_from_cache_hook(obj)
+                return obj
+            except KeyError:
+                pass
+
+        if self.single_flight and self._batch is None:
+            return await loop.run_in_executor(
+                None, lambda: self._compute_single_flight(key, *args, **kwargs))
+
+        obj, compute_time = await loop.run_in_executor(
+            None, lambda: timed_call(self.callable, *args, **kwargs))
+
+        results = [(key, obj, args, kwargs, compute_time)]
+        if self._batch is not None:
+            return self._store_many(results)[0]
+
+        stale = await loop.run_in_executor(None, self._stale_parts, [key])
+        parts, items, costs, readable = self._serialize(results)
+
+        # written in the same order as _store_many writes
+        if parts:
+            await self.storage.aput_many(parts)
+        await self.storage.aput(*items[0])
+        await self.storage.aput_metadata(costs)
+        if stale:
+            await loop.run_in_executor(None, self.storage.delete_many, stale)
+
+        return self._stored(results, readable)[0]
+
     def get_raw(self, key):
         raw = self.storage[key]
 
@@ -256,26 +632,420 @@ class Conjure(object):
                 key=key,
                 public_uri=public_uri,
                 content_type=self.content_type,
-                content_length=self.storage.content_length(key),
+                content_length=len(raw),
                 identifier=self.identifier,
                 func_name=self.name,
-                func_identifier=self.func_identifier
+                func_identifier=self.func_identifier,
+                checksum=self._stored_metadata(key).get('checksum')
             )
         )
 
     def _compute_and_store(self, key, *args, **kwargs):
-        obj = self.callable(*args, **kwargs)
-        raw = self.serializer.to_bytes(obj)
+        obj, compute_time = timed_call(self.callable, *args, **kwargs)
+        return self._store_many([(key, obj, args, kwargs, compute_time)])[0]
+
+    @staticmethod
+    def _cost(size: int, compute_time: float, serialize_time: float) -> dict:
+        return {
+            'compute_time': compute_time,
+            'serialize_time': serialize_time,
+            'size': size,
+            'created': time.time()
+        }
+
+    def _stale_parts(self, keys: Iterable[bytes]) -> List[bytes]:
+        """
+        List the parts already stored for keys, which are replaced, along with
+        their values, by the results about to be written
+        """
+        stale = []
+        for key in keys:
+            prefix = self.serializer.part_prefix(key)
+            if prefix is not None:
+                stale.extend(self.storage.iter_prefix(prefix, prefix))
+        return stale
+
+    def _readable(self, key: bytes, obj: Any, raw: bytes, parts: list, size: int) -> Tuple[Any, int]:
+        """
+        The result as reads of key will return it, and its size in the cache.
+        Results stored in parts are read lazily, so only their description is
+        charged
+        """
+        if not parts:
+            return obj, size
+        return self.deserializer.from_storage(self.storage, key, raw), len(raw)
+
+    def _serialize(
+            self,
+            results: List[Tuple[bytes, Any, tuple, dict, float]],
+            lazy: bool = True) -> Tuple[list, list, list, list]:
+        """
+        Serialize many (key, obj, args, kwargs, compute_time) results into the
+        parts and values to write, along with what each cost to produce, and
+        each (result, size) as reads of it will return it.  Unless lazy,
+        results are returned as they were computed
+        """
+        parts = []
+        items = []
+        costs = []
+        readable = []
+
+        for key, obj, _, _, compute_time in results:
+            (raw, result_parts), serialize_time = timed_call(self.serializer.to_parts, key, obj)
+            parts.extend((part_key, value, PART_CONTENT_TYPE) for part_key, value in result_parts)
+            items.append((key, raw, self.content_type))
+
+            size = len(raw) + sum(len(value) for _, value in result_parts)
+            costs.append((key, self._cost(size, compute_time, serialize_time)))
+
+            if lazy:
+                readable.append(self._readable(key, obj, raw, result_parts, size))
+            else:
+                readable.append((obj, size))
+
+        return parts, items, costs, readable
+
+    def _stored(self, results: List[Tuple[bytes, Any, tuple, dict, float]], readable: list) -> List[Any]:
+        """
+        Cache results that have just been written, notify listeners of them,
+        and return each as reads of it will
+        """
+        if self.cache is not None:
+            for (key, *_), (obj, size) in zip(results, readable):
+                self.cache.put(key, obj, size)
+
+        self._notify(results)
+        return [obj for obj, _ in readable]
+
+    def _store_many(self, results: List[Tuple[bytes, Any, tuple, dict, float]]) -> List[Any]:
+        """
+        Serialize and write many (key, obj, args, kwargs, compute_time)
+        results together, along with what each cost to produce, notify
+        listeners of each, and return each as reads of it will, unless it's
+        been buffered in a batch
+        """
+        stale = self._stale_parts(key for key, *_ in results)
+        batch = self._batch
+
+        # results in a batch are yet to be stored, so can't be read lazily
+        parts, items, costs, readable = self._serialize(results, lazy=batch is None)
 
         # TODO: Feed keys should be computed here, so they
         # can be passed along with the write notification
-        self.storage.put(key, raw, self.content_type)
+        if batch is not None:
+            for item in parts + items:
+                batch.put(*item)
+            batch.put_metadata(costs)
+            if stale:
+                batch.after_commit(lambda: self.storage.delete_many(stale))
+        else:
+            # parts are written first, so that values are never found
+            # without them, even by collections that write concurrently
+            if parts:
+                self.storage.put_many(parts)
+
+            if len(items) == 1:
+                self.storage.put(*items[0])
+            else:
+                self.storage.put_many(items)
+            self.storage.put_metadata(costs)
+
+            # parts of the values just replaced go last, so that readers of
+            # those values aren't left without them any sooner than necessary
+            if stale:
+                self.storage.delete_many(stale)
+
+            return self._stored(results, readable)
+
+        if self.cache is not None:
+            for key, *_ in results:
+                self.cache.invalidate(key)
+
+        # listeners of batched results are only notified once they're
+        # stored, and never if the batch is discarded
+        batch.after_commit(lambda: self._notify(results))
+        return [obj for obj, _ in readable]
+
+    def _notify(self, results: List[Tuple[bytes, Any, tuple, dict, float]]) -> None:
+        for key, obj, args, kwargs, _ in results:
+            for listener in self.listeners:
+                listener(WriteNotification(key, obj, *args, **kwargs))
+
+    def costs(self, keys: Iterable[bytes] = None) -> dict:
+        """
+        Map keys to their stored metadata, including what their results cost
+        to produce, without reading the results themselves.  By default,
+        every stored result of this function is included.
 
-        # notify listeners
-        for listener in self.listeners:
-            listener(WriteNotification(key, obj, *args, **kwargs))
+        Storage that can't keep metadata reports nothing
+        """
+        if keys is None:
+            prefix = f'{self.identifier}{self.key_delimiter}'.encode()
+            return {
+                key: metadata
+                for key, metadata in self.storage.iter_metadata(prefix)
+                if not is_part(key)
+            }
+
+        keys = list(keys)
+        return {
+            key: metadata
+            for key, metadata in zip(keys, self.storage.metadata_many(keys))
+            if metadata is not None
+        }
 
-        return obj
+    def cost_summary(self) -> dict:
+        """
+        Totals over every stored result with a recorded cost.  time_saved is
+        the compute time avoided each time all of them are read rather than
+        recomputed, less the time spent serializing them, which is a rough
+        stand-in for the time to read them back
+        """
+        costs = [cost for cost in self.costs().values() if 'compute_time' in cost]
+        compute_time = sum(cost['compute_time'] for cost in costs)
+        serialize_time = sum(cost.get('serialize_time', 0) for cost in costs)
+
+        return {
+            'results': len(costs),
+            'bytes': sum(cost.get('size', 0) for cost in costs),
+            'compute_time': compute_time,
+            'serialize_time': serialize_time,
+            'time_saved': max(0, compute_time - serialize_time)
+        }
+
+    def _get_or_compute(self, key, *args, **kwargs):
+        if not self._servable(key, args, kwargs):
+            return self._compute_and_store(key, *args, **kwargs)
+
+        try:
+            obj = self.get(key)
+            self.read_from_cache_hook(obj)
+            return obj
+        except KeyError:
+            return self._compute_and_store(key, *args, **kwargs)
+
+    def _age(self, key: bytes) -> Union[float, None]:
+        """
+        Seconds since the result for key was stored, or None if unknown
+        """
+        batch = self._batch
+        if batch is not None and key in batch:
+            return 0
+
+        metadata = self.storage.metadata_many([key])[0]
+        if metadata is None or 'created' not in metadata:
+            return None
+        return time.time() - metadata['created']
+
+    def _servable(self, key: bytes, args: tuple, kwargs: dict) -> bool:
+        """
+        Decide whether a stored result for key may be returned, scheduling a
+        refresh in the background if it's stale.  Results of unknown age,
+        e.g. in storage that can't keep metadata, are never stale
+        """
+        if self.ttl is None:
+            return True
+
+        age = self._age(key)
+        if age is None or age < self.ttl:
+            return True
+
+        if self.max_stale is not None and age >= self.ttl + self.max_stale:
+            return False
+
+        self._refresh(key, args, kwargs)
+        return True
+
+    def _refresh(self, key: bytes, args: tuple, kwargs: dict) -> None:
+        with self._refresh_lock:
+            if key in self._refreshes:
+                return
+
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(
+                    max_workers=self.refresh_workers,
+                    thread_name_prefix=f'{self.name}-refresh')
+
+            self._refreshes[key] = self._refresh_executor.submit(self._recompute, key, args, kwargs)
+
+    def _recompute(self, key: bytes, args: tuple, kwargs: dict) -> None:
+        try:
+            # other processes sharing storage may be refreshing the same key
+            token = self.storage.acquire_lease(key, self.lease_ttl)
+            if token is None:
+                return
+
+            try:
+                age = self._age(key)
+                if age is None or age >= self.ttl:
+                    self._compute_and_store(key, *args, **kwargs)
+            finally:
+                self.storage.release_lease(key, token)
+        except Exception:
+            # callers have already been served, so there's no one to raise to
+            self.refresh_failures += 1
+        finally:
+            with self._refresh_lock:
+                del self._refreshes[key]
+
+    def wait_for_refreshes(self, timeout: float = None) -> bool:
+        """
+        Block until background refreshes have finished, returning False if
+        timeout seconds elapse first
+        """
+        with self._refresh_lock:
+            pending = list(self._refreshes.values())
+
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def map(
+            self,
+            args: Iterable[Any],
+            executor: Executor = None,
+            ordered: bool = True,
+            write_batch_size: int = 64) -> Iterator[Any]:
+        """
+        Apply this function to each of many arguments, computing only those
+        results that aren't already stored, on executor, or on a new thread pool
+        if none is provided.  Each item of args is a single argument, or an
+        Arguments instance for functions taking several.
+
+        Process pools look the function up by name in the worker, so it must
+        be defined at the top level of a module, and arguments and results
+        must be picklable.
+
+        Results are yielded in the order of args or, when ordered is False, as
+        (index, result) pairs as each becomes available.  New results are
+        written in batches of write_batch_size
+        """
+        args = [Arguments.of(arg) for arg in args]
+        keys = [self.key(*arg.args, **arg.kwargs) for arg in args]
+
+        if self.prefer_cache:
+            exists = self.storage.contains_many(keys)
+            batch = self._batch
+            if batch is not None:
+                exists = [e or key in batch for e, key in zip(exists, keys)]
+        else:
+            exists = [False] * len(keys)
+
+        owns_executor = executor is None
+        if owns_executor:
+            executor = ThreadPoolExecutor()
+
+        if isinstance(executor, ProcessPoolExecutor):
+            module = self.callable.__module__
+            qualname = self.callable.__qualname__
+            if '<locals>' in qualname:
+                raise ValueError(
+                    f'{qualname} cannot be found by name in another process; '
+                    f'define it at the top level of a module to use a process pool')
+
+            def submit(arg: Arguments):
+                return executor.submit(_timed_call_by_name, module, qualname, arg.args, arg.kwargs)
+        else:
+            def submit(arg: Arguments):
+                return executor.submit(timed_call, self.callable, *arg.args, **arg.kwargs)
+
+        # each distinct key is computed only once
+        futures = dict()
+        submitted = dict()
+        for arg, key, e in zip(args, keys, exists):
+            if not e and key not in futures:
+                futures[key] = submit(arg)
+                submitted[key] = arg
+
+        pending = []
+        stored = set()
+
+        def stage(key, arg, obj, compute_time):
+            if key in stored:
+                return
+            stored.add(key)
+            pending.append((key, obj, arg.args, arg.kwargs, compute_time))
+            if len(pending) >= write_batch_size:
+                flush()
+
+        def flush():
+            if pending:
+                self._store_many(pending)
+                pending.clear()
+
+        try:
+            if ordered:
+                for arg, key in zip(args, keys):
+                    future = futures.get(key)
+                    if future is None:
+                        yield self._get_or_compute(key, *arg.args, **arg.kwargs)
+                        continue
+
+                    obj, compute_time = future.result()
+                    stage(key, arg, obj, compute_time)
+                    yield obj
+            else:
+                for i, (arg, key, e) in enumerate(zip(args, keys, exists)):
+                    if e:
+                        yield i, self._get_or_compute(key, *arg.args, **arg.kwargs)
+
+                indices = dict()
+                for i, (key, e) in enumerate(zip(keys, exists)):
+                    if not e:
+                        indices.setdefault(key, []).append(i)
+
+                keys_by_future = {future: key for key, future in futures.items()}
+                for future in as_completed(keys_by_future):
+                    key = keys_by_future[future]
+                    obj, compute_time = future.result()
+                    stage(key, submitted[key], obj, compute_time)
+                    for i in indices[key]:
+                        yield i, obj
+        finally:
+            # if iteration stops early, what's left isn't computed, but results
+            # computed so far are kept, whether or not they were yielded
+            for future in futures.values():
+                future.cancel()
+            for key, future in futures.items():
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    obj, compute_time = future.result()
+                    stage(key, submitted[key], obj, compute_time)
+            flush()
+
+            if owns_executor:
+                executor.shutdown(wait=False)
+
+    def _compute_single_flight(self, key, *args, **kwargs):
+        """
+        Compute and store the result for key, unless another thread or process
+        is already doing so, in which case wait for its result instead.
+
+        Threads in this process queue behind a lock per key, while processes
+        sharing storage coordinate with a lease, which is recovered once its
+        ttl has elapsed or its holder has exited
+        """
+        deadline = time.monotonic() + self.single_flight_timeout
+
+        with self._key_locks.hold(key, timeout=self.single_flight_timeout):
+            while True:
+                token = self.storage.acquire_lease(key, self.lease_ttl)
+
+                if token is not None:
+                    try:
+                        # the result may have been stored while this caller waited
+                        return self.get(key)
+                    except KeyError:
+                        return self._compute_and_store(key, *args, **kwargs)
+                    finally:
+                        self.storage.release_lease(key, token)
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f'Timed out waiting for another process to compute {key}')
+
+                # the lease holder's write moves the storage offset, but
+                # keys don't always have feed entries, so keep waits short
+                self.storage.wait_for_write(self.storage.offset, min(remaining, 0.25))
     
     def result_and_meta(self, *args, **kwargs) -> Tuple[Any, MetaData]:
         result = self.__call__(*args, **kwargs)
@@ -285,18 +1055,24 @@ class Conjure(object):
     def __call__(self, *args, **kwargs):
         key = self.key(*args, **kwargs)
 
-        if not self.prefer_cache:
+        if not self.prefer_cache or not self._servable(key, args, kwargs):
             return self._compute_and_store(key, *args, **kwargs)
 
         try:
-            raw = self.storage[key]
-            obj = self.deserializer.from_bytes(raw)
+            obj = self.get(key)
 
             self.read_from_cache_hook(obj)
             
             return obj
         except KeyError:
-            return self._compute_and_store(key, *args, **kwargs)
+            pass
+
+        # results buffered in a batch aren't visible to other callers, so
+        # there's nothing to gain from waiting on them
+        if self.single_flight and self._batch is None:
+            return self._compute_single_flight(key, *args, **kwargs)
+
+        return self._compute_and_store(key, *args, **kwargs)
 
 
 class Index(object):
@@ -344,9 +1120,11 @@ class Index(object):
             return None
         return ensure_bytes(self.collection.offset)
 
-    def index(self):
+    def index(self, batch_size: int = 128):
 
-        for item in self.conjure.feed(offset=self.offset):
+        # results are written as the feed is read, so the feed is read in
+        # batches, rather than holding a single snapshot open throughout
+        for item in self.conjure.feed(offset=self.offset, batch_size=batch_size):
             if self.offset == item['timestamp']:
                 continue
 
@@ -365,6 +1143,7 @@ class Index(object):
 
     def extract_and_store(self, key, result, feed_offset=None, *args, **kwargs):
         document_key = key
+        items = []
 
         for i, pair in enumerate(self.extract(key, result, *args, **kwargs)):
             try:
@@ -376,14 +1155,18 @@ class Index(object):
                 # from the document in an ordered, deterministic way
                 full_key = f'{k}_{ensure_str(document_key)}_{hex(i)}'
 
-                self.collection.put(
-                    ensure_bytes(full_key), self.serializer.to_bytes(value), self.content_type)
+                items.append(
+                    (ensure_bytes(full_key), self.serializer.to_bytes(value), self.content_type))
             except Exception as e:
                 print(f'Error processing document {document_key}, {key}')
                 pass
 
+        # all entries for the document, along with the new offset, are
+        # written together
+        self.collection.put_many(
+            items, offset=ensure_bytes(feed_offset) if feed_offset else None)
+
         if feed_offset:
-            self.collection.set_offset(ensure_bytes(feed_offset))
             self.keys_processed_in_current_session += 1
 
     def extract(self, key, result, *args, **kwargs) -> Iterable[Tuple[Union[str, bytes], Any]]:
@@ -445,7 +1228,14 @@ def conjure(
         deserializer: Deserializer,
         key_delimiter='_',
         prefer_cache=True,
-        read_from_cache_hook=lambda x: None):
+        read_from_cache_hook=lambda x: None,
+        cache: ResultCache = None,
+        single_flight: bool = False,
+        single_flight_timeout: float = 600,
+        lease_ttl: float = 600,
+        stream: bool = False,
+        ttl: float = None,
+        max_stale: float = None):
 
     def deco(f: Callable):
         return Conjure(
@@ -458,12 +1248,26 @@ def conjure(
             deserializer=deserializer,
             key_delimiter=key_delimiter,
             prefer_cache=prefer_cache,
-            read_from_cache_hook=read_from_cache_hook
+            read_from_cache_hook=read_from_cache_hook,
+            cache=cache,
+            single_flight=single_flight,
+            single_flight_timeout=single_flight_timeout,
+            lease_ttl=lease_ttl,
+            stream=stream,
+            ttl=ttl,
+            max_stale=max_stale
         )
     return deco
 
 
-def bytes_conjure(storage: Collection, content_type: Union[SupportedContentType, str], read_hook=None):
+def bytes_conjure(
+        storage: Collection,
+        content_type: Union[SupportedContentType, str],
+        read_hook=None,
+        cache: ResultCache = None,
+        single_flight: bool = False,
+        ttl: float = None,
+        max_stale: float = None):
     
     try:
         content_type = content_type.value
@@ -477,10 +1281,19 @@ def bytes_conjure(storage: Collection, content_type: Union[SupportedContentType,
         param_identifier=ParamsHash(),
         serializer=IdentitySerializer(),
         deserializer=IdentityDeserializer(),
-        read_from_cache_hook=read_hook
+        read_from_cache_hook=read_hook,
+        cache=cache,
+        single_flight=single_flight,
+        ttl=ttl,
+        max_stale=max_stale
     )
 
-def text_conjure(storage: Collection):
+def text_conjure(
+        storage: Collection,
+        cache: ResultCache = None,
+        single_flight: bool = False,
+        ttl: float = None,
+        max_stale: float = None):
     return conjure(
         content_type=SupportedContentType.Text.value,
         storage=storage,
@@ -488,10 +1301,25 @@ def text_conjure(storage: Collection):
         param_identifier=ParamsHash(),
         serializer=IdentitySerializer(),
         deserializer=IdentityDeserializer(),
+        cache=cache,
+        single_flight=single_flight,
+        ttl=ttl,
+        max_stale=max_stale
     )
 
 
-def pickle_conjure(storage: Collection, read_hook = None):
+def pickle_conjure(
+        storage: Collection,
+        read_hook = None,
+        cache: ResultCache = None,
+        single_flight: bool = False,
+        stream: bool = False,
+        ttl: float = None,
+        max_stale: float = None):
+    """
+    With stream, results are unpickled as they're read from storage, rather
+    than being read into memory in their entirety first
+    """
     return conjure(
         content_type='application/octet-stream',
         storage=storage,
@@ -499,9 +1327,20 @@ def pickle_conjure(storage: Collection, read_hook = None):
         param_identifier=ParamsHash(),
         serializer=PickleSerializer(),
         deserializer=PickleDeserializer(),
-        read_from_cache_hook=read_hook)
-
-def json_conjure(storage: Collection, tag_deserialized=False):
+        read_from_cache_hook=read_hook,
+        cache=cache,
+        single_flight=single_flight,
+        stream=stream,
+        ttl=ttl,
+        max_stale=max_stale)
+
+def json_conjure(
+        storage: Collection,
+        tag_deserialized=False,
+        cache: ResultCache = None,
+        single_flight: bool = False,
+        ttl: float = None,
+        max_stale: float = None):
     return conjure(
         content_type='application/json',
         storage=storage,
@@ -509,15 +1348,53 @@ def json_conjure(storage: Collection, tag_deserialized=False):
         param_identifier=ParamsHash(),
         serializer=JSONSerializer(),
         deserializer=JSONDeserializer(tag_deserialized=tag_deserialized),
+        cache=cache,
+        single_flight=single_flight,
+        ttl=ttl,
+        max_stale=max_stale
     )
 
 
 def numpy_conjure(
         storage: Collection, 
-        content_type=SupportedContentType.Tensor.value,
+        content_type=None,
         read_hook=lambda x: None,
         identifier: bytes = None,
-        param_key: bytes = None):
+        param_key: bytes = None,
+        zero_copy: bool = False,
+        cache: ResultCache = None,
+        single_flight: bool = False,
+        ttl: float = None,
+        max_stale: float = None,
+        chunked: bool = False,
+        chunks: Tuple[int, ...] = None,
+        max_workers: int = None):
+    """
+    With zero_copy, cached arrays are returned as read-only views over
+    storage, rather than being copied into new, writeable arrays.  Arrays
+    served from cache are shared between callers, and should not be modified.
+    Views keep the storage's read transaction open for as long as they
+    live, so zero_copy can't be combined with an in-memory cache
+
+    With chunked, or chunks, arrays are stored as a grid of chunks, and read
+    as ChunkedArrays, which fetch only the chunks a slice touches, at most
+    max_workers at a time
+    """
+    chunked = chunked or chunks is not None
+
+    if zero_copy and cache is not None and not chunked:
+        raise ValueError('zero_copy arrays would pin storage while cached, so zero_copy cannot be used with cache')
+
+    if chunked:
+        serializer = ChunkedArraySerializer(chunks=chunks)
+        deserializer = ChunkedArrayDeserializer(max_workers=max_workers)
+    else:
+        serializer = NumpySerializer()
+        deserializer = NumpyDeserializer(zero_copy=zero_copy)
+
+    if content_type is None:
+        content_type = SupportedContentType.ChunkedTensor.value \
+            if chunked else SupportedContentType.Tensor.value
 
     return conjure(
         content_type=content_type,
@@ -528,9 +1405,13 @@ def numpy_conjure(
         param_identifier=ParamsHash() 
             if param_key is None 
             else LiteralParamsIdentifier(param_key),
-        serializer=NumpySerializer(),
-        deserializer=NumpyDeserializer(),
-        read_from_cache_hook=read_hook
+        serializer=serializer,
+        deserializer=deserializer,
+        read_from_cache_hook=read_hook,
+        cache=cache,
+        single_flight=single_flight,
+        ttl=ttl,
+        max_stale=max_stale
     )
 
 
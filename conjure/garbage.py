@@ -0,0 +1,90 @@
+from typing import Dict, Iterable, Set
+
+from conjure.decorate import Conjure
+from conjure.storage import Collection, LocalCollectionWithBackup, ensure_bytes
+
+
+class GarbageCollector(object):
+    """
+    Finds and removes results stored under function identifiers that no
+    registered Conjure uses any longer, e.g. those left behind each time the
+    body of a function identified by FunctionContentIdentifier changes.
+
+    Every identifier in storage that isn't registered is considered garbage,
+    so all functions sharing the storage should be registered.  Storage with
+    a remote backup is listed on both sides, so that results which were
+    never read locally are found too
+    """
+
+    def __init__(
+            self,
+            storage: Collection,
+            conjures: Iterable[Conjure] = (),
+            batch_size: int = 10000):
+
+        super().__init__()
+        self.storage = storage
+        self.batch_size = batch_size
+        self._conjures = list()
+        self.register(*conjures)
+
+    def register(self, *conjures: Conjure) -> None:
+        self._conjures.extend(conjures)
+
+    @property
+    def live_identifiers(self) -> Set[bytes]:
+        return {ensure_bytes(c.identifier) for c in self._conjures}
+
+    def report(self) -> Dict[bytes, dict]:
+        """
+        Report the keys and bytes stored under each function identifier, and
+        whether that identifier is live
+        """
+        live = self.live_identifiers
+        if isinstance(self.storage, LocalCollectionWithBackup):
+            stats = self.storage.prefix_stats(include_remote=True)
+        else:
+            stats = self.storage.prefix_stats()
+
+        for identifier, entry in stats.items():
+            entry['live'] = identifier in live
+
+        return stats
+
+    def orphans(self) -> Dict[bytes, dict]:
+        return {
+            identifier: entry
+            for identifier, entry in self.report().items()
+            if not entry['live']
+        }
+
+    def collect(self, dry_run: bool = False) -> dict:
+        """
+        Delete results, and feed entries, for every orphaned identifier, in
+        transactions of at most batch_size keys
+        """
+        if not self._conjures:
+            raise ValueError(
+                'No functions are registered, so every result would be deleted')
+
+        orphans = self.orphans()
+        report = {'identifiers': orphans, 'keys': 0, 'bytes': 0}
+
+        for identifier, entry in orphans.items():
+            self.storage.delete_prefix(
+                identifier + b'_', dry_run=dry_run, batch_size=self.batch_size)
+            report['keys'] += entry['keys']
+            report['bytes'] += entry['bytes']
+
+            if 'remote' in entry:
+                remote = report.setdefault('remote', {'keys': 0, 'bytes': 0})
+                remote['keys'] += entry['remote']['keys']
+                remote['bytes'] += entry['remote']['bytes']
+
+        return report
+
+    def compact(self) -> dict:
+        """
+        Return the space freed by collect to the filesystem
+        """
+        return self.storage.compact()
@@ -1,7 +1,8 @@
-from hashlib import sha1
+from hashlib import blake2b, sha1
 import json
 from typing import Callable
 import dill as pickle
+import numpy as np
 import torch
 
 class FunctionIdentifier(object):
@@ -73,10 +74,37 @@ class LiteralParamsIdentifier(object):
         return self.name
 
 
+def _xxhash_digest(name: str):
+    def factory():
+        try:
+            import xxhash
+        except ImportError:
+            raise ImportError(
+                f'The xxhash package is required to use the {name} digest')
+        return getattr(xxhash, name)()
+    return factory
+
+
+# digests that may be used to identify parameters.  Anything other than sha1
+# is opt-in, since changing the digest changes every key derived from it
+PARAMS_DIGESTS = {
+    'sha1': sha1,
+    'blake2b': lambda: blake2b(digest_size=20),
+    'xxh64': _xxhash_digest('xxh64'),
+    'xxh3_128': _xxhash_digest('xxh3_128'),
+}
+
+
 class ParamsHash(ParamsIdentifier):
-    def __init__(self):
+    def __init__(self, digest: str = 'sha1'):
         super().__init__()
 
+        if digest not in PARAMS_DIGESTS:
+            raise ValueError(
+                f'digest must be one of {", ".join(PARAMS_DIGESTS)}, but was {digest}')
+
+        self.digest = digest
+
     def _get_underlying_data(self, value):
         """
         Wraps a special case for torch.Tensor values, which, unlike numpy arrays, do not have
@@ -84,19 +112,50 @@ class ParamsHash(ParamsIdentifier):
         """
 
         if isinstance(value, torch.Tensor):
-            return value.data.cpu().numpy()
+            # this is a zero-copy view for tensors that already live on the CPU
+            return value.detach().cpu().numpy()
         return value
 
+    def _is_hashable_array(self, value) -> bool:
+        return isinstance(value, np.ndarray) and not value.dtype.hasobject
+
+    def _update_with_array(self, h, arr: np.ndarray) -> None:
+        """
+        Feed an array's description and raw buffer directly into the digest,
+        avoiding pickling altogether.  Equal arrays produce identical digests
+        regardless of their memory layout, though non-contiguous arrays
+        must be copied first
+        """
+        arr = np.ascontiguousarray(arr)
+        h.update(f'{arr.dtype.str}{arr.shape}'.encode())
+        h.update(memoryview(arr.reshape(-1).view(np.uint8)))
 
     def _hash_args(self, *args, **kwargs):
-        args_hash = sha1()
+        args_hash = PARAMS_DIGESTS[self.digest]()
 
         transformed_args = list(map(self._get_underlying_data, args))
         transformed_kwargs = {k: self._get_underlying_data(v) for k, v in kwargs.items()}
 
+        # arrays are swapped out for placeholders, so the remaining arguments
+        # can be pickled cheaply.  When no arrays are present, this produces
+        # exactly the same digest as pickling all arguments
+        arrays = []
+
+        def placeholder(value):
+            if not self._is_hashable_array(value):
+                return value
+            arrays.append(value)
+            return ('__conjure_array__', len(arrays) - 1)
+
+        transformed_args = list(map(placeholder, transformed_args))
+        transformed_kwargs = {k: placeholder(v) for k, v in transformed_kwargs.items()}
+
         args_hash.update(pickle.dumps(transformed_args))
         args_hash.update(pickle.dumps(transformed_kwargs))
 
+        for arr in arrays:
+            self._update_with_array(args_hash, arr)
+
         args_hash = args_hash.hexdigest()
         return args_hash
 
@@ -1,4 +1,5 @@
 import json
+from contextlib import contextmanager
 from io import BytesIO
 from typing import Union, Callable, List, Tuple, Any, Dict
 
@@ -10,7 +11,7 @@ from soundfile import SoundFile
 from conjure import LiteralFunctionIdentifier, ParamsHash, Conjure, MetaData, tensor_movie, LiteralParamsIdentifier
 from conjure.serialize import \
     Serializer, Deserializer, IdentityDeserializer, IdentitySerializer
-from conjure.storage import Collection, ensure_bytes
+from conjure.storage import Collection, WriteBatch, ensure_bytes
 
 
 def display_matrix(
@@ -114,6 +115,27 @@ class Logger(object):
     def __init__(self, collection: Collection):
         self.collection = collection
         self.loggers: Dict[str, Conjure] = dict()
+        self._batch: Union[WriteBatch, None] = None
+
+    @contextmanager
+    def batch(self):
+        """
+        Write everything logged within this block to storage together, e.g.
+        once per training step, rather than once per logged value
+        """
+        with self.collection.batch() as write_batch:
+            self._batch = write_batch
+            try:
+                yield write_batch
+            finally:
+                self._batch = None
+
+    def _result_and_meta(self, l: Conjure, *args, **kwargs) -> Tuple[Any, MetaData]:
+        if self._batch is None:
+            return l.result_and_meta(*args, **kwargs)
+
+        with l.batch(self._batch):
+            return l.result_and_meta(*args, **kwargs)
 
     def _get_or_create_logger(
             self, key: str,
@@ -128,7 +150,7 @@ class Logger(object):
 
     def log_json(self, key: str, data: dict):
         l = self._get_or_create_logger(key, 'application/json', encode_json)
-        rm = l.result_and_meta(data)
+        rm = self._result_and_meta(l, data)
         return rm
 
     def log_matrix_with_cmap(
@@ -140,7 +162,7 @@ class Logger(object):
             key,
             'image/png',
             create_matrix_displayer_with_cmap(cmap))
-        rm = l.result_and_meta(matrix)
+        rm = self._result_and_meta(l, matrix)
         return rm
 
     def log_matrix(
@@ -148,14 +170,14 @@ class Logger(object):
             key: str,
             matrix: Union[np.ndarray, torch.Tensor]) -> Tuple[Any, MetaData]:
         l = self._get_or_create_logger(key, 'image/png', display_matrix)
-        rm = l.result_and_meta(matrix)
+        rm = self._result_and_meta(l, matrix)
         return rm
 
     def log_sound(
             self, key: str,
             audio: Union[np.ndarray, torch.Tensor]) -> Tuple[Any, MetaData]:
         l = self._get_or_create_logger(key, 'audio/wav', encode_audio)
-        rm = l.result_and_meta(audio)
+        rm = self._result_and_meta(l, audio)
         return rm
 
 
@@ -166,5 +188,5 @@ class Logger(object):
             fps: int = 10) -> Tuple[Any, MetaData]:
 
         l = self._get_or_create_logger(key, 'image/gif', create_movie_logger_with_fps(fps))
-        rm = l.result_and_meta(arr)
+        rm = self._result_and_meta(l, arr)
         return rm
@@ -1,8 +1,10 @@
 import json
+import math
 import dill
-from typing import Any, BinaryIO
+from typing import Any, BinaryIO, List, Tuple, Union
 from io import BytesIO
 import numpy as np
+from numpy.lib import format as npy_format
 import datetime
 
 
@@ -16,8 +18,26 @@ class Serializer(object):
     def write(self, content: Any, sink: BinaryIO) -> None:
         raise NotImplementedError()
 
+    def to_parts(self, key: bytes, content: Any) -> Tuple[bytes, List[Tuple[bytes, bytes]]]:
+        """
+        Serialize content to be stored under key, along with any parts of it
+        to be stored under keys of their own, e.g. the chunks of a large array
+        """
+        return self.to_bytes(content), []
+
+    def part_prefix(self, key: bytes) -> Union[bytes, None]:
+        """
+        The prefix shared by the keys of every part of the value stored under
+        key, or None if values aren't stored in parts
+        """
+        return None
+
 
 class Deserializer(object):
+    # deserializers that never mutate or retain a copy of the encoded
+    # value may opt in to receiving views directly over storage
+    zero_copy = False
+
     def __init__(self):
         super().__init__()
 
@@ -27,6 +47,13 @@ class Deserializer(object):
     def read(self, sink: BinaryIO) -> Any:
         raise NotImplementedError()
 
+    def from_storage(self, storage, key: bytes, encoded: bytes) -> Any:
+        """
+        Deserialize the value stored under key, which may read any parts of it
+        stored under keys of their own from storage
+        """
+        return self.from_bytes(encoded)
+
 
 class IdentitySerializer(Serializer):
     def __init__(self):
@@ -109,18 +136,60 @@ class NumpySerializer(Serializer):
     def to_bytes(self, content: np.ndarray) -> bytes:
         bio = BytesIO()
         np.save(bio, content)
-        bio.seek(0)
-        return bio.read()
+        return bio.getvalue()
 
     def write(self, content: np.ndarray, sink: BinaryIO) -> None:
         np.save(sink, content)
 
 
+NPY_HEADER_READERS = {
+    (1, 0): npy_format.read_array_header_1_0,
+    (2, 0): npy_format.read_array_header_2_0,
+}
+
+
 class NumpyDeserializer(Deserializer):
-    def __init__(self):
+    def __init__(self, zero_copy: bool = False):
+        """
+        When zero_copy is True, arrays are read-only views over the encoded
+        bytes, which, for LMDB-backed collections, are the memory map itself
+        """
         super().__init__()
+        self.zero_copy = zero_copy
+
+    def _view(self, encoded: Union[bytes, memoryview]) -> Union[np.ndarray, None]:
+        buf = memoryview(encoded)
+
+        if bytes(buf[:6]) != npy_format.MAGIC_PREFIX:
+            return None
+
+        version = (buf[6], buf[7])
+        try:
+            read_header = NPY_HEADER_READERS[version]
+        except KeyError:
+            return None
+
+        length_bytes = 2 if version == (1, 0) else 4
+        header_start = 8 + length_bytes
+        header_length = int.from_bytes(buf[8:header_start], 'little')
+        data_start = header_start + header_length
+
+        header = BytesIO(buf[8:data_start])
+        shape, fortran_order, dtype = read_header(header)
+
+        if dtype.hasobject:
+            return None
+
+        arr = np.frombuffer(
+            buf, dtype=dtype, count=math.prod(shape), offset=data_start)
+        return arr.reshape(shape, order='F' if fortran_order else 'C')
+
+    def from_bytes(self, encoded: Union[bytes, memoryview]) -> np.ndarray:
+        if self.zero_copy:
+            arr = self._view(encoded)
+            if arr is not None:
+                return arr
 
-    def from_bytes(self, encoded: bytes) -> np.ndarray:
         bio = BytesIO()
         bio.write(encoded)
         bio.seek(0)
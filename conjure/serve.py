@@ -1,3 +1,4 @@
+import json
 from typing import List, Union
 from urllib.parse import ParseResult, urlparse
 import falcon
@@ -6,9 +7,11 @@ import multiprocessing
 import gunicorn.app.base
 import sys
 import os
+import time
 from collections import defaultdict
+from itertools import islice
 
-from conjure.storage import ensure_str
+from conjure.storage import ensure_bytes, ensure_str
 
 MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -34,8 +37,13 @@ class ListFunctions(object):
         results = []
 
         for x in funcs:
-            meta = x.most_recent_meta()
-            meta = meta.with_public_uri(uri(self.port, x, meta.key))
+            try:
+                meta = x.most_recent_meta()
+                meta = meta.with_public_uri(uri(self.port, x, meta.key))
+                meta = meta.conjure_data
+            except KeyError:
+                # this function has not produced any results yet
+                meta = None
             
             results.append({
                 'id': x.identifier,
@@ -45,7 +53,7 @@ class ListFunctions(object):
                 'code': x.code,
                 'url': f'/functions/{x.identifier}',
                 'feed': f'/feed/{x.identifier}',
-                'meta': meta.conjure_data    
+                'meta': meta
             })
         res.media = results
         res.status = falcon.HTTP_OK
@@ -72,7 +80,8 @@ class Function(object):
                 'code': func.code,
                 'url': f'/functions/{func.identifier}',
                 'feed': f'/feed/{func.identifier}',
-                'keys': list(k.decode() for k in func.iter_keys())[:10],
+                'keys': [k.decode() for k in islice(func.iter_keys(), 10)],
+                'costs': func.cost_summary(),
                 'indexes': list(map(lambda x: dict(name=x.name, description=x.description_html), self.grouped.get(identifier, [])))
             }
         except KeyError:
@@ -124,30 +133,143 @@ class FunctionResult(object):
             result = func.get_raw(key)
             res.content_length = result.content_length
             res.content_type = result.content_type
+            res.etag = result.meta.checksum
             res.body = result.raw
             res.status = falcon.HTTP_OK
         except KeyError:
             res.status = falcon.HTTP_NOT_FOUND
 
+    def on_head(self, req: falcon.Request, res: falcon.Response, identifier: str, key: str):
+        try:
+            func = self.functions[identifier]
+            meta = func.meta_from_key(ensure_bytes(key))
+            res.content_length = meta.content_length
+            res.content_type = meta.content_type
+            res.etag = meta.checksum
+            res.status = falcon.HTTP_OK
+        except KeyError:
+            res.status = falcon.HTTP_NOT_FOUND
+
 
 class FunctionFeed(object):
-    def __init__(self, functions: List[Conjure]):
+    def __init__(self, functions: List[Conjure], default_page_size: int = 100, max_page_size: int = 1000):
         super().__init__()
         self.functions = {f.identifier: f for f in functions}
+        self.default_page_size = default_page_size
+        self.max_page_size = max_page_size
         print(list(self.functions.keys()))
 
     def on_get(self, req: falcon.Request, res: falcon.Response, identifier: str):
+        """
+        Return a single page of the feed, beginning at offset, along with the
+        offset of the following page, which is null when there are no more items
+        """
+        limit = req.get_param_as_int(
+            'limit', min_value=1, max_value=self.max_page_size, default=self.default_page_size)
+
+        order = req.get_param('order', default='asc')
+        if order not in ('asc', 'desc'):
+            raise falcon.HTTPInvalidParam('order must be one of asc or desc', 'order')
+
         try:
             func = self.functions[identifier]
             offset = req.get_param('offset')
-            items = list(func.feed(offset))  # [{ timestamp, key }]
-            res.media = list(
-                map(lambda x: {key: value.decode() for key, value in x.items()}, items))
+
+            # read one item beyond the page, to find where the next one begins
+            items = list(func.feed(offset, limit=limit + 1, reverse=order == 'desc'))  # [{ timestamp, key }]
+            next_offset = items[limit]['timestamp'].decode() if len(items) > limit else None
+
+            res.media = {
+                'items': list(
+                    map(lambda x: {key: value.decode() for key, value in x.items()}, items[:limit])),
+                'next_offset': next_offset
+            }
             res.status = falcon.HTTP_OK
         except KeyError:
             res.status = falcon.HTTP_NOT_FOUND
 
 
+class FunctionFeedEvents(object):
+    """
+    Push new feed items to clients as server-sent events, as they're written.
+
+    Each response lasts at most max_duration seconds, which should be shorter
+    than the gunicorn worker timeout.  EventSource clients then reconnect,
+    resuming from the Last-Event-ID header, so no items are missed.
+
+    A response occupies whatever serves it for its whole duration, so this
+    requires a threaded or async worker class, e.g. gthread, which
+    serve_conjure uses.  With sync workers, a few open streams would leave no
+    worker for any other request.  While waiting, writes by other processes
+    are checked for every poll_interval seconds
+    """
+
+    def __init__(
+            self,
+            functions: List[Conjure],
+            max_duration: float = 20,
+            heartbeat: float = 5,
+            retry_ms: int = 100,
+            poll_interval: float = 1):
+
+        super().__init__()
+        self.functions = {f.identifier: f for f in functions}
+        self.max_duration = max_duration
+        self.heartbeat = heartbeat
+        self.retry_ms = retry_ms
+        self.poll_interval = poll_interval
+
+    def _events(self, func: Conjure, offset: Union[bytes, None], duration: float):
+        deadline = time.monotonic() + duration
+        yield f'retry: {self.retry_ms}\n\n'.encode()
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+
+            items = func.wait_for_feed(
+                offset,
+                timeout=min(remaining, self.heartbeat),
+                poll_interval=self.poll_interval)
+
+            if not items:
+                # a comment line, which keeps intermediaries from closing
+                # an idle connection
+                yield b': keep-alive\n\n'
+                continue
+
+            for item in items:
+                data = json.dumps({key: value.decode() for key, value in item.items()})
+                yield f'id: {item["timestamp"].decode()}\ndata: {data}\n\n'.encode()
+
+            offset = items[-1]['timestamp']
+
+    def on_get(self, req: falcon.Request, res: falcon.Response, identifier: str):
+        duration = req.get_param_as_float(
+            'timeout', min_value=0, max_value=self.max_duration, default=self.max_duration)
+
+        try:
+            func = self.functions[identifier]
+        except KeyError:
+            res.status = falcon.HTTP_NOT_FOUND
+            return
+
+        offset = req.get_header('Last-Event-ID') or req.get_param('offset')
+
+        if offset is None:
+            # only items written from now on are of interest
+            try:
+                offset = func.most_recent_feed_item()['timestamp']
+            except KeyError:
+                offset = None
+
+        res.content_type = 'text/event-stream'
+        res.cache_control = ['no-cache']
+        res.stream = self._events(func, ensure_bytes(offset) if offset else None, duration)
+        res.status = falcon.HTTP_OK
+
+
 class Dashboard(object):
 
     def __init__(self, conjure_funcs: List[Conjure], port: int = None, web_components_version: str = '0.0.79'):
@@ -207,6 +329,7 @@ class MutliFunctionApplication(falcon.API):
             FunctionIndex(conjure_funcs, indexes))
 
         self.add_route('/feed/{identifier}', FunctionFeed(conjure_funcs))
+        self.add_route('/feed/{identifier}/events', FunctionFeedEvents(conjure_funcs))
         self.add_route('/functions/{identifier}/{key}',
                        FunctionResult(conjure_funcs))
         self.add_route(
@@ -240,7 +363,13 @@ def serve_conjure(
         n_workers: int = None,
         revive=True,
         indexes: List[Index] = [],
-        web_components_version: str = None):
+        web_components_version: str = None,
+        threads: int = 16):
+    """
+    Serve conjure_funcs over HTTP, on n_workers processes, each handling up
+    to threads requests at once, so that long-lived feed event streams don't
+    hold up other requests
+    """
 
     app = MutliFunctionApplication(
         conjure_funcs, indexes=indexes, port=port, web_component_version=web_components_version)
@@ -257,6 +386,8 @@ def serve_conjure(
             app,
             bind=f'0.0.0.0:{port}',
             workers=n_workers or worker_count,
+            worker_class='gthread',
+            threads=threads,
             worker_int=worker_int)
         standalone.run()
 
@@ -1,9 +1,29 @@
+from itertools import groupby, islice
 from os import PathLike
-from typing import Callable, Iterable, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, contextmanager
+from functools import partial
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 from urllib.parse import ParseResult, urlparse
 import lmdb
 import boto3
+import numpy as np
+from botocore.config import Config
 from shutil import rmtree
+from uuid import uuid4
+from weakref import WeakKeyDictionary, WeakSet, ref
+import asyncio
+import hashlib
+import heapq
+import io
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from conjure.cache import ExistenceCache
+from conjure.compression import Compression, UnknownDictionary, ZstdCodec, dictionary_id
 from conjure.timestamp import timestamp_id
 
 
@@ -19,13 +39,149 @@ def ensure_bytes(value: Union[str, bytes, memoryview]) -> bytes:
     return value if isinstance(value, bytes) else value.encode()
 
 
+def ensure_buffer(value: Union[str, bytes, bytearray, memoryview]) -> Union[bytes, bytearray, memoryview]:
+    """
+    Like ensure_bytes, but values that are already bytes-like aren't copied
+    """
+    return value.encode() if isinstance(value, str) else value
+
+
 def ensure_str(value: Union[str, bytes]) -> str:
     return value if isinstance(value, str) else value.decode()
 
 
+def prefix_upper_bound(prefix: bytes) -> Union[bytes, None]:
+    """
+    Return the smallest key greater than every key beginning with prefix, or
+    None if there is no such key
+    """
+    prefix = prefix.rstrip(b'\xff')
+    if not prefix:
+        return None
+    return prefix[:-1] + bytes([prefix[-1] + 1])
+
+
+def batches(items: Iterable, batch_size: Union[int, None]) -> Iterable[list]:
+    """
+    Group items into lists of at most batch_size, or a single list when
+    batch_size is None
+    """
+    if batch_size is None:
+        yield list(items)
+        return
+
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+def add_reports(total: dict, report: dict) -> dict:
+    for name in ('keys', 'bytes'):
+        if total[name] is None or report[name] is None:
+            total[name] = None
+        else:
+            total[name] += report[name]
+    return total
+
+
+BatchItem = Tuple[Union[str, bytes], Union[str, bytes], str]
+
+# values stored with this content type are parts of another value, e.g. the
+# chunks of a large array, rather than results in their own right, so they're
+# never added to a feed
+PART_CONTENT_TYPE = 'application/vnd.conjure.part'
+
+# parts are stored under the key of the value they belong to, followed by
+# this, which function identifiers and parameter hashes never contain, so that
+# listings of results can leave them out
+PART_INFIX = b'_part:'
+
+
+def part_prefix(key: Union[str, bytes]) -> bytes:
+    """
+    The prefix shared by the keys of every part of the value stored under key
+    """
+    return ensure_bytes(key) + PART_INFIX
+
+
+def is_part(key: Union[str, bytes]) -> bool:
+    return PART_INFIX in ensure_bytes(key)
+
+
+def owner_of(key: Union[str, bytes]) -> bytes:
+    """
+    The key of the value a part belongs to, or key itself if it isn't a part
+    """
+    return ensure_bytes(key).partition(PART_INFIX)[0]
+
+
+def _aiobotocore_session():
+    try:
+        from aiobotocore.session import get_session
+    except ImportError:
+        return None
+    return get_session()
+
+
 class Collection(object):
+
+    # the size of the thread pool that runs blocking operations on behalf
+    # of the async methods below
+    max_async_workers = 8
+
     def __init__(self):
         super().__init__()
+        self._async_executor = None
+        self._async_executor_lock = threading.Lock()
+
+    @property
+    def async_executor(self) -> ThreadPoolExecutor:
+        with self._async_executor_lock:
+            if self._async_executor is None:
+                self._async_executor = ThreadPoolExecutor(
+                    max_workers=self.max_async_workers,
+                    thread_name_prefix=f'{self.__class__.__name__}-async')
+            return self._async_executor
+
+    def _run_async(self, func: Callable, *args, **kwargs) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.async_executor, partial(func, *args, **kwargs))
+
+    async def aget(self, key) -> bytes:
+        return await self._run_async(self.__getitem__, key)
+
+    async def aview(self, key) -> Union[bytes, memoryview]:
+        return await self._run_async(self.view, key)
+
+    async def acontains(self, key) -> bool:
+        return await self._run_async(self.__contains__, key)
+
+    async def acontent_length(self, key) -> int:
+        return await self._run_async(self.content_length, key)
+
+    async def aput(self, key: bytes, value: bytes, content_type: str, created: float = None):
+        return await self._run_async(self.put, key, value, content_type, created=created)
+
+    async def aput_many(self, items: Iterable[BatchItem], offset: Union[bytes, None] = None):
+        return await self._run_async(self.put_many, list(items), offset)
+
+    async def adelete(self, key):
+        return await self._run_async(self.__delitem__, key)
+
+    async def aput_metadata(self, items: Iterable[Tuple[Union[str, bytes], dict]]):
+        return await self._run_async(self.put_metadata, list(items))
+
+    async def ametadata_many(self, keys: Iterable[Union[str, bytes]]) -> List[Union[dict, None]]:
+        return await self._run_async(self.metadata_many, list(keys))
+
+    async def aget_with_content_type(self, key) -> Tuple[bytes, Union[str, None]]:
+        return await self._run_async(self.get_with_content_type, key)
+
+    async def aget_with_metadata(self, key) -> Tuple[bytes, dict]:
+        return await self._run_async(self.get_with_metadata, key)
 
     def content_length(self, key) -> int:
         raise NotImplementedError()
@@ -33,23 +189,181 @@ class Collection(object):
     def __contains__(self, key):
         raise NotImplementedError()
 
-    def iter_prefix(self, start_key, prefix=None) -> Iterable[bytes]:
+    def contains_many(self, keys: Iterable[Union[str, bytes]]) -> List[bool]:
+        """
+        Check whether each of many keys exists, in order
+        """
+        return [key in self for key in keys]
+
+    def iter_prefix(self, start_key, prefix=None, limit: int = None) -> Iterable[bytes]:
         raise NotImplementedError()
 
-    def put(self, key: bytes, value: bytes, content_type: str):
+    def put(self, key: bytes, value: bytes, content_type: str, created: float = None):
+        """
+        Write a value.  Collections that record when values were created use
+        created, when given, rather than the current time, e.g. for values
+        first created elsewhere
+        """
         raise NotImplementedError()
 
+    def put_many(self, items: Iterable[BatchItem], offset: Union[bytes, None] = None):
+        """
+        Write many (key, value, content_type) items at once, optionally
+        recording a new offset along with them
+        """
+        for key, value, content_type in items:
+            self.put(key, value, content_type)
+
+        if offset is not None:
+            self.set_offset(offset)
+
+    def batch(self) -> 'WriteBatch':
+        return WriteBatch(self)
+
+    def put_metadata(self, items: Iterable[Tuple[Union[str, bytes], dict]]) -> None:
+        """
+        Merge (key, metadata) items into the small, JSON-serializable metadata
+        kept for each key.  Collections that can't store metadata discard it
+        """
+        pass
+
+    def metadata_many(self, keys: Iterable[Union[str, bytes]]) -> List[Union[dict, None]]:
+        """
+        Read the metadata of many keys, without reading their values
+        """
+        return [None for _ in keys]
+
+    def iter_metadata(self, prefix: Union[str, bytes]) -> Iterable[Tuple[bytes, dict]]:
+        """
+        Yield (key, metadata) pairs for every key beginning with prefix
+        """
+        return iter(())
+
     def __getitem__(self, key) -> bytes:
         raise NotImplementedError()
 
+    def get_with_content_type(self, key) -> Tuple[bytes, Union[str, None]]:
+        """
+        Read a value along with the content type it was stored with, or None
+        if the content type isn't known
+        """
+        return self[key], None
+
+    def get_with_metadata(self, key) -> Tuple[bytes, dict]:
+        """
+        Read a value along with its content type and, where it's known, the
+        time it was first created
+        """
+        value, content_type = self.get_with_content_type(key)
+        return value, {'content_type': content_type}
+
+    def copy(
+            self,
+            source: Union[str, bytes],
+            key: Union[str, bytes],
+            content_type: str,
+            created: float = None,
+            etag: str = None) -> None:
+        """
+        Write the value stored under source to key as well.  By default, the
+        value is read and written again.  Collections that version their
+        values raise KeyError if source's version no longer matches etag
+        """
+        self.put(key, self[source], content_type, created=created)
+
+    def view(self, key) -> Union[bytes, memoryview]:
+        """
+        Read a value, avoiding copies where the underlying storage allows it.
+        By default, this is no different from reading the value as bytes
+        """
+        return self[key]
+
+    def open(self, key) -> BinaryIO:
+        """
+        Open a value for reading as a file-like object.  By default, the
+        whole value is read into memory first
+        """
+        return io.BytesIO(self[key])
+
     def __delitem__(self, key):
         raise NotImplementedError()
 
+    def delete_many(self, keys: Iterable[Union[str, bytes]], dry_run: bool = False) -> dict:
+        """
+        Delete many keys, skipping any that don't exist, and report the number
+        of keys and bytes removed.  With dry_run, nothing is deleted, but
+        the report is the same
+        """
+        n_keys = 0
+        n_bytes = 0
+
+        for key in keys:
+            try:
+                n_bytes += self.content_length(key)
+            except KeyError:
+                continue
+
+            n_keys += 1
+            if not dry_run:
+                del self[key]
+
+        return {'keys': n_keys, 'bytes': n_bytes}
+
+    def delete_prefix(
+            self,
+            prefix: Union[str, bytes],
+            dry_run: bool = False,
+            batch_size: int = None) -> dict:
+        """
+        Delete every key beginning with prefix, as delete_many does.  With
+        batch_size, keys are deleted batch_size at a time as they're listed,
+        rather than all at once
+        """
+        keys = self.iter_prefix(prefix, prefix)
+        report = {'keys': 0, 'bytes': 0}
+        for batch in batches(keys, batch_size):
+            add_reports(report, self.delete_many(batch, dry_run=dry_run))
+        return report
+
+    def prefix_stats(self) -> Dict[bytes, dict]:
+        """
+        Report the number of keys and bytes stored under each base key, i.e.
+        each function identifier.  Parts count towards the bytes of the value
+        they belong to, but aren't keys in their own right
+        """
+        raise NotImplementedError()
+
+    def compact(self) -> dict:
+        """
+        Reclaim space left behind by deleted keys, reporting the bytes used
+        before and after
+        """
+        raise NotImplementedError()
+
     def public_uri(self, key) -> ParseResult:
         raise NotImplementedError()
 
-    def feed(self, offset: Union[bytes, str] = None):
+    def feed(
+            self,
+            offset: Union[bytes, str] = None,
+            limit: int = None,
+            batch_size: int = None,
+            reverse: bool = False) -> Iterable[dict]:
+        """
+        Iterate over (timestamp, key) items in the order they were written,
+        or newest first when reverse is True, beginning at offset
+        """
         raise NotImplementedError()
+
+    def most_recent_feed_item(self, offset: Union[bytes, str] = None) -> Union[dict, None]:
+        """
+        Return the newest feed item sharing offset's base key, or None if there
+        are no such items
+        """
+        item = None
+        for item in self.feed(offset):
+            pass
+        return item
     
     @property
     def offset(self):
@@ -57,18 +371,393 @@ class Collection(object):
     
     def set_offset(self, offset):
         raise NotImplementedError()
+
+    def wait_for_write(
+            self,
+            offset: Union[bytes, None],
+            timeout: float,
+            poll_interval: float = None) -> Union[bytes, None]:
+        """
+        Block until the collection's offset differs from offset, i.e., until
+        something new has been written, returning the new offset, or None if
+        timeout seconds elapse first.  poll_interval, when provided, overrides
+        how often writes by other processes are checked for
+        """
+        raise NotImplementedError()
+
+    def acquire_lease(self, key: Union[bytes, str], ttl: float) -> Union[str, None]:
+        """
+        Try to become the only process computing the value for key, returning
+        a token to release the lease with, or None if another live process
+        already holds it.  Leases expire after ttl seconds.
+
+        Collections that can't coordinate between processes always grant leases
+        """
+        return uuid4().hex
+
+    def release_lease(self, key: Union[bytes, str], token: str) -> None:
+        pass
     
 
+class WriteBatch(object):
+    """
+    Buffers writes to a collection, and commits them together via put_many
+    when the block exits without error.  Buffered values can be read back
+    before they're committed
+    """
+
+    def __init__(self, collection: Collection):
+        super().__init__()
+        self.collection = collection
+        self.items: List[BatchItem] = []
+        self.metadata: List[Tuple[bytes, dict]] = []
+        self.offset = None
+        self._values = dict()
+        self._callbacks: List[Callable[[], None]] = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return ensure_bytes(key) in self._values
+
+    def __getitem__(self, key) -> bytes:
+        return self._values[ensure_bytes(key)]
+
+    def content_length(self, key) -> int:
+        return len(self[key])
+
+    def put(self, key: Union[str, bytes], value: Union[str, bytes], content_type: str):
+        key = ensure_bytes(key)
+        value = ensure_bytes(value)
+        self.items.append((key, value, content_type))
+        self._values[key] = value
+
+    def put_metadata(self, items: Iterable[Tuple[Union[str, bytes], dict]]) -> None:
+        self.metadata.extend((ensure_bytes(key), metadata) for key, metadata in items)
+
+    def set_offset(self, offset):
+        self.offset = offset
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """
+        Call callback once the buffered writes have been committed.  Callbacks
+        are discarded along with the writes if the batch never commits
+        """
+        self._callbacks.append(callback)
+
+    def commit(self):
+        if self.items or self.offset is not None:
+            self.collection.put_many(self.items, offset=self.offset)
+
+        # writing values discards their previous metadata, so this comes after
+        if self.metadata:
+            self.collection.put_metadata(self.metadata)
+
+        callbacks = self._callbacks
+
+        self.items = []
+        self.metadata = []
+        self.offset = None
+        self._values = dict()
+        self._callbacks = []
+
+        for callback in callbacks:
+            callback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    A seekable, read-only stream over an S3 object, which fetches only the
+    ranges that are actually read.  When etag is given, reads fail with
+    PreconditionFailed, rather than mixing versions, if the object changes
+    """
+
+    def __init__(self, client, bucket: str, key: str, size: int, etag: str = None):
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'invalid whence {whence}')
+
+        if position < 0:
+            raise ValueError(f'negative seek position {position}')
+
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        buffer = memoryview(buffer).cast('B')
+        end = min(self._position + len(buffer), self.size)
+        if end <= self._position:
+            return 0
+
+        kwargs = dict() if self.etag is None else dict(IfMatch=self.etag)
+        resp = self.client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f'bytes={self._position}-{end - 1}', **kwargs)
+        data = resp['Body'].read()
+
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+# the object metadata recording the size of a compressed value
+ORIGINAL_LENGTH = 'original-length'
+
+# the object metadata recording when a value was first created, for values
+# uploaded some time after that, e.g. by replication
+CREATED = 'created'
+
+# zstd dictionaries that values in a bucket were compressed with are stored
+# beside them, under keys without the base key delimiter, so that readers
+# elsewhere can fetch them, and they're never counted as any function's keys
+DICTIONARIES_PREFIX = 'conjure-dictionaries/'
+
+
 class S3Collection(Collection):
 
-    def __init__(self, bucket, is_public=False, cors_enabled=False):
+    def __init__(
+            self,
+            bucket,
+            is_public=False,
+            cors_enabled=False,
+            max_workers: int = 16,
+            existence_cache: ExistenceCache = None,
+            multipart_threshold: int = 64 * 1024 * 1024,
+            part_size: int = 16 * 1024 * 1024,
+            compression: Compression = None):
+
         super().__init__()
+
+        # public objects are served by S3 exactly as they're stored
+        if is_public and compression is not None and compression.enabled:
+            raise ValueError('Values in a public bucket cannot be compressed')
+
         self.bucket = bucket
-        self.client = boto3.client('s3')
+
+        # each worker thread may hold a connection of its own
+        self.client = boto3.client(
+            's3', config=Config(max_pool_connections=max(10, max_workers)))
         self.is_public = is_public
         self.cors_enabled = cors_enabled
+        self.max_workers = max_workers
+        self.max_async_workers = max_workers
+
+        # values of at least multipart_threshold bytes are uploaded and
+        # downloaded in parts of part_size bytes, max_workers at a time.
+        # S3 requires that all parts but the last are at least 5MB
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+
+        # optionally, remember the answers to existence checks for a while.
+        # Answers may be stale when other clients write to or delete from
+        # the bucket, for at most the cache's ttls
+        self.existence_cache = existence_cache
+
+        # values that are compressed record their original size in the
+        # object's metadata.  Values written from file-like objects never are
+        self.compression = compression or Compression()
+
+        # ids of the dictionaries this client has written to the bucket
+        self._uploaded_dictionaries = set()
+
+        # non-blocking clients, one per event loop, when aiobotocore is installed
+        self._aio_clients = WeakKeyDictionary()
 
         self._create_bucket()
+
+    async def _aio_client(self):
+        loop = asyncio.get_running_loop()
+
+        entry = self._aio_clients.get(loop)
+        if entry is not None:
+            return entry[0]
+
+        session = _aiobotocore_session()
+        if session is None:
+            return None
+
+        stack = AsyncExitStack()
+        client = await stack.enter_async_context(session.create_client('s3'))
+
+        # another coroutine may have created a client in the meantime
+        entry = self._aio_clients.setdefault(loop, (client, stack))
+        if entry[0] is not client:
+            await stack.aclose()
+        return entry[0]
+
+    async def aclose(self):
+        """
+        Close the non-blocking client belonging to the running event loop
+        """
+        entry = self._aio_clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+
+    async def _aget(self, client, key: Union[str, bytes]) -> Tuple[bytes, dict]:
+        try:
+            resp = await client.get_object(Bucket=self.bucket, Key=ensure_str(key))
+        except client.exceptions.NoSuchKey:
+            raise KeyError(key)
+
+        async with resp['Body'] as stream:
+            stored = await stream.read()
+
+        try:
+            return self.compression.decompress(stored), resp
+        except UnknownDictionary as e:
+            await self._adownload_dictionary(client, e.dictionary_id)
+            return self.compression.decompress(stored), resp
+
+    async def _adownload_dictionary(self, client, dictionary: int) -> None:
+        try:
+            resp = await client.get_object(Bucket=self.bucket, Key=f'{DICTIONARIES_PREFIX}{dictionary}')
+        except client.exceptions.NoSuchKey:
+            return
+
+        async with resp['Body'] as stream:
+            self.compression.register_dictionary(await stream.read())
+
+    async def aget_with_content_type(self, key: Union[str, bytes]) -> Tuple[bytes, Union[str, None]]:
+        client = await self._aio_client()
+        if client is None:
+            return await super().aget_with_content_type(key)
+
+        value, resp = await self._aget(client, key)
+        return value, resp.get('ContentType')
+
+    async def aget_with_metadata(self, key: Union[str, bytes]) -> Tuple[bytes, dict]:
+        client = await self._aio_client()
+        if client is None:
+            return await super().aget_with_metadata(key)
+
+        value, resp = await self._aget(client, key)
+        return value, self._metadata(resp)
+
+    async def aget(self, key: Union[str, bytes]) -> bytes:
+        value, _ = await self.aget_with_content_type(key)
+        return value
+
+    async def aview(self, key: Union[str, bytes]) -> bytes:
+        return await self.aget(key)
+
+    async def _ahead(self, key: Union[str, bytes]) -> dict:
+        client = await self._aio_client()
+
+        try:
+            return await client.head_object(Bucket=self.bucket, Key=ensure_str(key))
+        except client.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                raise KeyError(key)
+            raise
+
+    async def acontains(self, key: Union[str, bytes]) -> bool:
+        if self.existence_cache is not None:
+            exists = self.existence_cache.get(ensure_bytes(key))
+            if exists is not None:
+                return exists
+
+        if await self._aio_client() is None:
+            return await super().acontains(key)
+
+        try:
+            await self._ahead(key)
+            exists = True
+        except KeyError:
+            exists = False
+
+        self._remember(key, exists)
+        return exists
+
+    async def acontent_length(self, key: Union[str, bytes]) -> int:
+        if await self._aio_client() is None:
+            return await super().acontent_length(key)
+
+        return self._original_length(await self._ahead(key))
+
+    async def aput(self, key: Union[str, bytes], value: bytes, content_type: str, created: float = None):
+        client = await self._aio_client()
+        if client is None:
+            return await super().aput(key, value, content_type, created)
+
+        # compressing large values would hold up the event loop
+        if self.compression.enabled:
+            value, metadata = await self._run_async(self._stored, value, content_type, created)
+        else:
+            value, metadata = self._stored(value, content_type, created)
+
+        await self._aupload_dictionary(client, value)
+
+        if len(value) >= self.multipart_threshold:
+            etag = await self._run_async(self._put_multipart, key, value, content_type, metadata)
+        else:
+            etag = (await client.put_object(
+                Bucket=self.bucket,
+                Key=ensure_str(key),
+                Body=value,
+                ContentType=content_type,
+                Metadata=metadata,
+                ACL=self.acl))['ETag']
+
+        self._remember(key, True)
+        return etag
+
+    async def _aupload_dictionary(self, client, stored) -> None:
+        dictionary = self.compression.dictionary_of(stored)
+        if not dictionary or dictionary in self._uploaded_dictionaries:
+            return
+
+        await client.put_object(
+            Bucket=self.bucket,
+            Key=f'{DICTIONARIES_PREFIX}{dictionary}',
+            Body=self.compression.dictionary(dictionary),
+            ContentType='application/octet-stream',
+            ACL=self.acl)
+        self._uploaded_dictionaries.add(dictionary)
+
+    async def aput_many(self, items: Iterable[BatchItem], offset: Union[bytes, None] = None):
+        if await self._aio_client() is None:
+            return await super().aput_many(items, offset)
+
+        # there's no feed, and so no offset to record
+        await asyncio.gather(*(self.aput(*item) for item in items))
+
+    async def adelete(self, key: Union[str, bytes]):
+        client = await self._aio_client()
+        if client is None:
+            return await super().adelete(key)
+
+        await client.delete_object(Bucket=self.bucket, Key=ensure_str(key))
+        self._remember(key, False)
     
     @property
     def offset(self):
@@ -89,24 +778,39 @@ class S3Collection(Collection):
     def acl(self):
         return 'public-read' if self.is_public else 'private'
 
+    def _head(self, key) -> dict:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=ensure_str(key))
+        except self.client.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                raise KeyError(key)
+            raise
+
+    def _remember(self, key, exists: bool) -> None:
+        if self.existence_cache is not None:
+            self.existence_cache.set(ensure_bytes(key), exists)
+
     def content_length(self, key) -> int:
         try:
-            resp = self.client.get_object_attributes(
-                Bucket=self.bucket, 
-                Key=ensure_str(key),
-                ObjectAttributes=['ObjectSize'])
-            return resp['ObjectSize']
-        except self.client.exceptions.NoSuchKey:
-            raise KeyError(key)
+            resp = self._head(key)
+        except KeyError:
+            self._remember(key, False)
+            raise
         except Exception:
             return 0
 
+        self._remember(key, True)
+        return self._original_length(resp)
+
+    @staticmethod
+    def _original_length(head: dict) -> int:
+        original = head.get('Metadata', {}).get(ORIGINAL_LENGTH)
+        return head['ContentLength'] if original is None else int(original)
+
     def destroy(self, prefix: str = ''):
         # first, delete all keys with the provided prefix
-        for key in self.iter_prefix(prefix):
-            k = ensure_str(key)
-            print(f'deleting key {k}')
-            self.client.delete_object(Bucket=self.bucket, Key=k)
+        report = self.delete_prefix(prefix)
+        print(f'deleted {report["keys"]} keys ({report["bytes"]} bytes) from {self.bucket}')
 
         if prefix == '':
             print(f'deleting bucket {self.bucket}')
@@ -144,18 +848,39 @@ class S3Collection(Collection):
             )
 
     def __contains__(self, key):
+        if self.existence_cache is not None:
+            exists = self.existence_cache.get(ensure_bytes(key))
+            if exists is not None:
+                return exists
+
         try:
-            # TODO: This could be a head request
-            self[ensure_str(key)]
-            return True
+            self._head(key)
+            exists = True
         except KeyError:
-            return False
+            exists = False
+
+        self._remember(key, exists)
+        return exists
+
+    def iter_prefix(
+            self,
+            start_key: Union[str, bytes],
+            prefix: Union[None, bytes, str] = None,
+            limit: int = None) -> Iterable[bytes]:
+
+        if limit is not None:
+            yield from islice(self.iter_prefix(start_key, prefix), limit)
+            return
 
-    def iter_prefix(self, start_key: Union[str, bytes], prefix: Union[None, bytes, str] = None) -> Iterable[bytes]:
+        # StartAfter is exclusive, while start_key, as for other collections,
+        # is included, so listing starts just before it.  S3 lists keys in
+        # the order of their utf-8 bytes
+        start_key = ensure_bytes(start_key)
+        start_after = ensure_str(start_key[:-1])
 
         resp = self.client.list_objects_v2(
             Bucket=self.bucket,
-            StartAfter=ensure_str(start_key),
+            StartAfter=start_after,
             Prefix=ensure_str(prefix) if prefix is not None else '',
         )
 
@@ -166,12 +891,14 @@ class S3Collection(Collection):
 
         while True:
             for content in contents:
-                yield ensure_bytes(content['Key'])
+                key = ensure_bytes(content['Key'])
+                if key >= start_key and not content['Key'].startswith(DICTIONARIES_PREFIX):
+                    yield key
 
             if resp['IsTruncated']:
                 resp = self.client.list_objects_v2(
                     Bucket=self.bucket,
-                    StartAfter=ensure_str(start_key),
+                    StartAfter=start_after,
                     Prefix=ensure_str(prefix) if prefix is not None else '',
                     ContinuationToken=resp['NextContinuationToken']
                 )
@@ -184,174 +911,1969 @@ class S3Collection(Collection):
             Bucket=self.bucket,
             Key=ensure_str(key)
         )
+        self._remember(key, False)
 
-    def put(self, key: Union[bytes, str], value: bytes, content_type: str):
-        self.client.put_object(
-            Bucket=self.bucket,
-            Key=ensure_str(key),
-            Body=value,
-            ContentType=content_type,
-            ACL=self.acl)
+    # the most keys a single DeleteObjects request may name
+    delete_batch_size = 1000
 
-    def __getitem__(self, key: Union[str, bytes]) -> bytes:
-        try:
-            resp = self.client.get_object(
-                Bucket=self.bucket, Key=ensure_str(key))
-            return resp['Body'].read()
-        except:
-            raise KeyError(key)
+    def _delete_batches(self, keys: List[str]) -> None:
+        batches = [
+            keys[i:i + self.delete_batch_size]
+            for i in range(0, len(keys), self.delete_batch_size)
+        ]
 
+        def delete(batch: List[str]) -> List[dict]:
+            resp = self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+            return resp.get('Errors', [])
 
-class LmdbCollection(Collection):
-    def __init__(
-            self,
-            path: PathLike,
-            extract_base_key: Callable[[bytes], bytes] = None,
-            default_database_name: str = 'data',
-            build_feed:bool = True,
-            port=None):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            errors = [error for errors in pool.map(delete, batches) for error in errors]
 
-        super().__init__()
+        failed = {error['Key'] for error in errors}
+        for key in keys:
+            if key not in failed:
+                self._remember(key, False)
 
-        # KLUDGE: Delimiter is configurable elsewhere, so this might cause problems
-        self.extract_base_key = extract_base_key or (
-            lambda x: ensure_bytes(ensure_str(x).split('_')[0]))
-        self.path = path
-        self.build_feed = build_feed
-        self.env = lmdb.open(
-            self.path,
-            max_dbs=10,
-            # https://stackoverflow.com/a/37311228/1015178
-            map_size=10e11, # one terabyte
-            writemap=True,
-            map_async=True,
-            metasync=True,
-            lock=False)
-        self._default_database_name = ensure_bytes(default_database_name)
-        self._data = self.env.open_db(self._default_database_name)
-        self._offsets = self.env.open_db(b'offsets')
+        if errors:
+            raise IOError(
+                f'Failed to delete {len(errors)} keys from {self.bucket}, '
+                f'e.g. {errors[0]["Key"]}: {errors[0].get("Message")}')
 
-        self._port = port
+    def delete_many(self, keys: Iterable[Union[str, bytes]], dry_run: bool = False) -> dict:
+        """
+        Delete many keys, in batches of up to 1000 keys, sent concurrently.
 
-        if self.build_feed:
-            self._feed = self.env.open_db(b'feed')
-    
-    def public_uri(self, key: Union[bytes, str]):
-        # TODO: This should be a subclass defined in serve.py
-        if self._port is None:
-            raise NotImplementedError()
-        base = ensure_str(self.extract_base_key(key))
-        k = ensure_str(key)
+        Each key is checked first, concurrently, so that, with or without
+        dry_run, the report counts only keys that existed, and their sizes
+        """
+        keys = [ensure_str(key) for key in keys]
 
-        uri = f'http://localhost:{self._port}/functions/{base}/{k}'
-        parsed = urlparse(uri)
-        return parsed
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            sizes = list(pool.map(self._size_or_none, keys))
 
-    @property
-    def offset(self):
-        with self.env.begin(write=False, db=self._offsets) as txn:
-            offset = txn.get(self._default_database_name, db=self._offsets)
-            return offset
-    
-    def set_offset(self, offset, txn=None):
-        if txn:
-            offset = txn.put(self._default_database_name, offset, db=self._offsets)
-            return offset
-        
-        with self.env.begin(write=True, db=self._offsets) as txn:
-            offset = txn.put(self._default_database_name, offset, db=self._offsets)
-            return offset
-    
-    def index_storage(self, name):
-        return LmdbCollection(
-            self.path, 
-            self.extract_base_key, 
-            default_database_name=name, 
-            build_feed=False)
+        existing = [(key, size) for key, size in zip(keys, sizes) if size is not None]
 
-    def destroy(self):
-        self.env.close()
-        rmtree(self.path)
+        if not dry_run:
+            self._delete_batches([key for key, _ in existing])
 
-    def feed(self, offset: Union[bytes, str] = None):
-        if not self.build_feed:
-            raise NotImplementedError('This storage instance has no feed')
-        
-        final_offset = offset or ''
-        prefix = self.extract_base_key(ensure_bytes(final_offset))
+        return {'keys': len(existing), 'bytes': sum(size for _, size in existing)}
 
-        for i, key in enumerate(self.iter_prefix(final_offset, db=self._feed, prefix=prefix)):
+    def _size_or_none(self, key: str) -> Union[int, None]:
+        try:
+            return self._head(key)['ContentLength']
+        except KeyError:
+            return None
 
-            with self.env.begin(buffers=True, write=False, db=self._feed) as txn:
-                memoryview_value = txn.get(key)
-                value = bytes(memoryview_value)
-                # a tuple of (time-based id, key)
-                output = {'timestamp': key, 'key': value}
-                yield output
+    def _list(self, prefix: Union[str, bytes] = '') -> Iterable[dict]:
+        # listings include sizes, so they're reported without extra requests
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=ensure_str(prefix)):
+            yield from page.get('Contents', [])
 
-    def content_length(self, key) -> int:
-        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
-            value = txn.get(ensure_bytes(key))
-            if value is None:
-                raise KeyError(key)
+    def delete_prefix(
+            self,
+            prefix: Union[str, bytes],
+            dry_run: bool = False,
+            batch_size: int = None) -> dict:
 
-            return len(value)
+        report = {'keys': 0, 'bytes': 0}
 
-    def __contains__(self, key: Union[str, bytes]):
-        try:
-            self[ensure_bytes(key)]
-            return True
-        except KeyError:
-            return False
+        for batch in batches(self._list(prefix), batch_size):
+            if not dry_run:
+                self._delete_batches([content['Key'] for content in batch])
 
-    def iter_prefix(
-            self,
+            report['keys'] += len(batch)
+            report['bytes'] += sum(content['Size'] for content in batch)
+
+        return report
+
+    def prefix_stats(self) -> Dict[bytes, dict]:
+        stats = dict()
+
+        for content in self._list():
+            base_key, delimiter, _ = ensure_bytes(content['Key']).partition(b'_')
+            if not delimiter:
+                continue
+
+            entry = stats.setdefault(base_key, {'keys': 0, 'bytes': 0})
+            if not is_part(content['Key']):
+                entry['keys'] += 1
+            entry['bytes'] += content['Size']
+
+        return stats
+
+    def put(
+            self,
+            key: Union[bytes, str],
+            value: Union[bytes, BinaryIO],
+            content_type: str,
+            created: float = None):
+        """
+        Write a value, which may be bytes-like, or a file-like object to be
+        read in parts, so that it's never held in memory all at once, and
+        return the new object's ETag
+        """
+        value, metadata = self._stored(value, content_type, created)
+
+        if not hasattr(value, 'read'):
+            self._upload_dictionary(value)
+
+        if hasattr(value, 'read') or len(value) >= self.multipart_threshold:
+            etag = self._put_multipart(key, value, content_type, metadata)
+        else:
+            etag = self.client.put_object(
+                Bucket=self.bucket,
+                Key=ensure_str(key),
+                Body=value,
+                ContentType=content_type,
+                Metadata=metadata,
+                ACL=self.acl)['ETag']
+
+        self._remember(key, True)
+        return etag
+
+    def _stored(
+            self,
+            value: Union[bytes, BinaryIO],
+            content_type: str,
+            created: Union[float, None]) -> Tuple[Union[bytes, BinaryIO], Dict[str, str]]:
+        """
+        The value as it's uploaded, and the object metadata describing it
+        """
+        metadata = dict()
+
+        if created is not None:
+            metadata[CREATED] = repr(created)
+
+        if not hasattr(value, 'read'):
+            value = ensure_buffer(value)
+            stored = self.compression.compress(value, content_type)
+            if stored is not value:
+                metadata[ORIGINAL_LENGTH] = str(memoryview(value).nbytes)
+            value = stored
+
+        return value, metadata
+
+    def _upload_dictionary(self, stored) -> None:
+        """
+        Make sure the dictionary stored was compressed with, if any, is in the
+        bucket, so that it can be read elsewhere
+        """
+        dictionary = self.compression.dictionary_of(stored)
+        if not dictionary or dictionary in self._uploaded_dictionaries:
+            return
+
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=f'{DICTIONARIES_PREFIX}{dictionary}',
+            Body=self.compression.dictionary(dictionary),
+            ContentType='application/octet-stream',
+            ACL=self.acl)
+        self._uploaded_dictionaries.add(dictionary)
+
+    def _download_dictionary(self, dictionary: int) -> None:
+        try:
+            resp = self.client.get_object(Bucket=self.bucket, Key=f'{DICTIONARIES_PREFIX}{dictionary}')
+        except self.client.exceptions.NoSuchKey:
+            return
+        self.compression.register_dictionary(resp['Body'].read())
+
+    def _decompress(self, stored):
+        try:
+            return self.compression.decompress(stored)
+        except UnknownDictionary as e:
+            # written elsewhere, with a dictionary this client hasn't seen
+            self._download_dictionary(e.dictionary_id)
+            return self.compression.decompress(stored)
+
+    def copy(
+            self,
+            source: Union[str, bytes],
+            key: Union[str, bytes],
+            content_type: str,
+            created: float = None,
+            etag: str = None) -> None:
+        """
+        Copy an object within the bucket, so that its bytes never leave S3.
+        With etag, the copy is only made from that version of source, and
+        KeyError is raised if source has since changed
+        """
+        try:
+            # the source's metadata describes how it's stored, so it's kept,
+            # except for when it was created
+            head = self._head(source)
+        except KeyError:
+            self._remember(source, False)
+            raise
+
+        if etag is not None and head['ETag'] != etag:
+            raise KeyError(source)
+
+        metadata = head.get('Metadata', {})
+        metadata.pop(CREATED, None)
+        if created is not None:
+            metadata[CREATED] = repr(created)
+
+        extra = {
+            'ContentType': content_type,
+            'Metadata': metadata,
+            'MetadataDirective': 'REPLACE',
+            'ACL': self.acl
+        }
+        if etag is not None:
+            extra['CopySourceIfMatch'] = etag
+
+        try:
+            # the managed copy splits objects too large for a single request
+            self.client.copy(
+                CopySource={'Bucket': self.bucket, 'Key': ensure_str(source)},
+                Bucket=self.bucket,
+                Key=ensure_str(key),
+                ExtraArgs=extra)
+        except self.client.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', '412'):
+                raise KeyError(source)
+            raise
+
+        self._remember(key, True)
+
+    def _parts(self, value: Union[bytes, BinaryIO]) -> Iterable[memoryview]:
+        if hasattr(value, 'read'):
+            part = value.read(self.part_size)
+
+            # an empty stream is still uploaded as a single, empty part
+            yield memoryview(part)
+
+            while True:
+                part = value.read(self.part_size)
+                if not part:
+                    return
+                yield memoryview(part)
+
+        buf = memoryview(value).cast('B')
+        for start in range(0, max(len(buf), 1), self.part_size):
+            yield buf[start:start + self.part_size]
+
+    def _put_multipart(
+            self,
+            key: Union[bytes, str],
+            value: Union[bytes, BinaryIO],
+            content_type: str,
+            metadata: Dict[str, str] = None):
+
+        key = ensure_str(key)
+
+        upload_id = self.client.create_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            ContentType=content_type,
+            Metadata=metadata or {},
+            ACL=self.acl)['UploadId']
+
+        # bounds the number of parts read, but not yet uploaded
+        slots = threading.BoundedSemaphore(self.max_workers * 2)
+
+        def upload_part(number: int, part: memoryview) -> dict:
+            try:
+                resp = self.client.upload_part(
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=io.BytesIO(part))
+                return {'ETag': resp['ETag'], 'PartNumber': number}
+            finally:
+                slots.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = []
+                for number, part in enumerate(self._parts(value), start=1):
+                    slots.acquire()
+                    futures.append(pool.submit(upload_part, number, part))
+                parts = [future.result() for future in futures]
+
+            return self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts})['ETag']
+        except BaseException:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def contains_many(self, keys: Iterable[Union[str, bytes]]) -> List[bool]:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(lambda key: key in self, keys))
+
+    def put_many(self, items: Iterable[BatchItem], offset: Union[bytes, None] = None):
+        """
+        Write many items concurrently.  Buckets have no feed, so offset is
+        ignored
+        """
+        # boto3 clients are thread-safe, so uploads can proceed concurrently
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(lambda item: self.put(*item), items))
+
+    def _get_range(self, key: str, start: int, end: int, etag: str) -> bytes:
+        resp = self.client.get_object(
+            Bucket=self.bucket, Key=key, Range=f'bytes={start}-{end - 1}', IfMatch=etag)
+        return resp['Body'].read()
+
+    def __getitem__(self, key: Union[str, bytes]) -> bytes:
+        """
+        Read a value, fetching values larger than a single part as parallel
+        ranged requests
+        """
+        value, _ = self.get_with_content_type(key)
+        return value
+
+    # reads that find the value overwritten while they were in progress are
+    # retried from the start this many times in all
+    max_read_attempts = 5
+
+    def get_with_content_type(self, key: Union[str, bytes]) -> Tuple[bytes, Union[str, None]]:
+        value, resp = self._get(key)
+        return value, resp.get('ContentType')
+
+    def get_with_metadata(self, key: Union[str, bytes]) -> Tuple[bytes, dict]:
+        value, resp = self._get(key)
+        return value, self._metadata(resp)
+
+    @staticmethod
+    def _metadata(resp: dict) -> dict:
+        """
+        Describe an object from the response to a GET or HEAD request
+        """
+        created = resp.get('Metadata', {}).get(CREATED)
+        return {
+            'content_type': resp.get('ContentType'),
+            'created': resp['LastModified'].timestamp() if created is None else float(created),
+        }
+
+    def _get(self, key: Union[str, bytes]) -> Tuple[bytes, dict]:
+        """
+        Read a value, along with the response describing it
+        """
+        # every range is read from the version of the object the first one
+        # came from.  If it's overwritten part way through, start again
+        for attempt in range(self.max_read_attempts):
+            try:
+                return self._get_ranges(key)
+            except self.client.exceptions.ClientError as e:
+                if e.response['Error']['Code'] != 'PreconditionFailed' \
+                        or attempt == self.max_read_attempts - 1:
+                    raise
+
+    def _get_ranges(self, key: Union[str, bytes]) -> Tuple[bytes, dict]:
+        k = ensure_str(key)
+
+        try:
+            resp = self.client.get_object(
+                Bucket=self.bucket, Key=k, Range=f'bytes=0-{self.part_size - 1}')
+        except self.client.exceptions.ClientError as e:
+            # S3 refuses any range of an empty object
+            if e.response['Error']['Code'] == 'InvalidRange':
+                return b'', self._head(k)
+            raise KeyError(key)
+        except Exception:
+            raise KeyError(key)
+
+        first = resp['Body'].read()
+        size = int(resp['ContentRange'].split('/')[-1])
+
+        if len(first) == size:
+            return self._decompress(first), resp
+
+        etag = resp['ETag']
+
+        def fetch(start: int) -> bytes:
+            return self._get_range(k, start, min(start + self.part_size, size), etag)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            rest = list(pool.map(fetch, range(len(first), size, self.part_size)))
+
+        return self._decompress(b''.join([first, *rest])), resp
+
+    def open(self, key: Union[str, bytes]) -> BinaryIO:
+        """
+        Open a value for streaming reads, which fetch it a part at a time
+        """
+        head = self._head(key)
+
+        # compressed values can't be decompressed a range at a time
+        if ORIGINAL_LENGTH in head.get('Metadata', {}):
+            return io.BytesIO(self[key])
+
+        size = head['ContentLength']
+        reader = S3RangeReader(self.client, self.bucket, ensure_str(key), size, head.get('ETag'))
+        return io.BufferedReader(reader, buffer_size=self.part_size)
+
+
+# (last access, access count, size) of each key in a bounded LmdbCollection
+ACCESS_RECORD = struct.Struct('<dQQ')
+
+# the total size of all values, kept alongside the access records.  Data keys
+# are text, so this can't collide with any of them
+TOTAL_BYTES_KEY = b'\x00total_bytes'
+
+EVICTION_POLICIES = ('lru', 'lfu', 'cost')
+
+# each key's rank under each eviction policy, packed big-endian so that ranks
+# sort in the same order as bytes as they do as numbers, i.e. last access for
+# 'lru', (access count, last access) for 'lfu' and (compute time per byte,
+# last access) for 'cost'
+RANKS = {
+    'lru': struct.Struct('>d'),
+    'lfu': struct.Struct('>Qd'),
+    'cost': struct.Struct('>dd'),
+}
+
+# the eviction policy the rank index was built for, kept alongside each key's
+# rank
+EVICTION_POLICY_KEY = b'\x00eviction'
+
+# with deduplication, keys hold pointers to values stored once under their
+# sha256 digest.  Shorter values are cheaper to store than a pointer to them
+POINTER_PREFIX = b'\x00sha256:'
+POINTER_SIZE = len(POINTER_PREFIX) + hashlib.sha256().digest_size
+
+# the dictionaries database holds zstd dictionaries by id, and the id of the
+# dictionary to use for each content type
+DICTIONARY_PREFIX = b'dictionary:'
+CONTENT_TYPE_PREFIX = b'content_type:'
+
+# the number of keys pointing at a value, followed by a key the value has
+# been replicated under, if any, and the replica's etag, if it has one,
+# after REPLICA_DELIMITER.  Keys are text, so they never contain it
+REFERENCE_COUNT = struct.Struct('<Q')
+REPLICA_DELIMITER = b'\x00'
+
+
+class Snapshot(object):
+    """
+    A read transaction that stays open for as long as any view read from it
+    is referenced, so that LMDB neither recycles nor unmaps the pages beneath
+    those views
+    """
+
+    def __init__(self, env: lmdb.Environment, db):
+        super().__init__()
+        self.txn = env.begin(write=False, buffers=True, db=db)
+
+        # a read transaction may move between threads, but mustn't be used
+        # by two at once
+        self.lock = threading.Lock()
+
+    def __del__(self):
+        try:
+            self.txn.abort()
+        except lmdb.Error:
+            # the environment has already been closed
+            pass
+
+
+class PinnedBuffer(np.ndarray):
+    """
+    Bytes read directly from the memory map, which keep the snapshot they
+    were read from open while they, or any view of them, are referenced
+    """
+    snapshot = None
+
+
+class LmdbCollection(Collection):
+    """
+    A collection stored in an LMDB environment on local disk.
+
+    By default, it grows without bound.  With max_bytes and/or max_items, it
+    becomes a cache, which evicts the least recently ('lru') or least
+    frequently ('lfu') read keys, along with their feed entries, whenever a
+    write exceeds either limit.  The 'cost' policy evicts keys that took the
+    least time to compute per byte first, according to the compute_time in
+    their metadata.  Keys awaiting replication are never evicted.
+
+    With deduplicate, identical values are stored once, under their digest,
+    and keys point at them.  A value is removed along with the last key
+    pointing at it.
+
+    With compression, values are compressed before they're stored, and
+    decompressed when they're read, including by view, which can then no
+    longer avoid a copy.  Sizes reported by nbytes, prefix_stats and
+    deletions, and limited by max_bytes, are those of values as stored, i.e.
+    after compression, however many keys share them, while content_length is
+    always that of the original value
+
+    Reads are tallied in memory, and written to a side database at most every
+    access_batch_size reads or access_flush_interval seconds, or along with
+    the next write, so that reads don't each need a write transaction
+    """
+
+    # evicting a little more than necessary means the next few writes don't
+    # each have to evict again
+    eviction_headroom = 0.1
+
+    def __init__(
+            self,
+            path: PathLike,
+            extract_base_key: Callable[[bytes], bytes] = None,
+            default_database_name: str = 'data',
+            build_feed:bool = True,
+            port=None,
+            poll_interval: float = 0.05,
+            max_bytes: int = None,
+            max_items: int = None,
+            eviction: str = 'lru',
+            access_batch_size: int = 1024,
+            access_flush_interval: float = 5,
+            deduplicate: bool = False,
+            compression: Compression = None,
+            parent: 'LmdbCollection' = None):
+
+        super().__init__()
+
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(
+                f'eviction must be one of {", ".join(EVICTION_POLICIES)}, but was {eviction}')
+
+        # KLUDGE: Delimiter is configurable elsewhere, so this might cause problems
+        self.extract_base_key = extract_base_key or (
+            lambda x: ensure_bytes(ensure_str(x).split('_')[0]))
+        self.path = path
+        self.build_feed = build_feed
+        self._default_database_name = ensure_bytes(default_database_name)
+        self._port = port
+
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.eviction = eviction
+        self.evictions = 0
+
+        # the number of writes that found their value already stored
+        self.deduplicate = deduplicate
+        self.deduplicated = 0
+
+        # values that were compressed are always read back, whether or not
+        # compression is enabled now
+        self.compression = compression or Compression()
+
+        # key -> (last access, access count) of reads not yet written
+        self.access_batch_size = access_batch_size
+        self.access_flush_interval = access_flush_interval
+        self._accesses = dict()
+        self._pending_reads = 0
+        self._accesses_lock = threading.Lock()
+        self._accesses_flushed = time.monotonic()
+
+        # py-lmdb refuses, rather than waits for, a second write transaction
+        # on the same environment, so writers in this process take turns.
+        # Collections from index_storage use their parent's environment, and
+        # take turns with its writers, too
+        self._parent = parent
+        self._write_lock = threading.Lock() if parent is None else parent._write_lock
+
+        # read transactions beneath views, shared by views read between the
+        # same two writes
+        self._snapshot = None
+        self._snapshots = WeakSet()
+        self._snapshot_lock = threading.Lock()
+
+        self._open()
+
+        # writers in this process wake waiters immediately, while writes from
+        # other processes are noticed by polling the stored offset
+        self.poll_interval = poll_interval
+        self._written = threading.Condition()
+    
+    def _open(self):
+        if self._parent is not None:
+            self.env = self._parent.env
+        else:
+            self.env = lmdb.open(
+                self.path,
+                max_dbs=32,
+                # https://stackoverflow.com/a/37311228/1015178
+                map_size=10e11, # one terabyte
+                writemap=True,
+                map_async=True,
+                metasync=True,
+                lock=True)
+        self._page_size = self.env.stat()['psize']
+        self._data = self.env.open_db(self._default_database_name)
+        self._offsets = self.env.open_db(b'offsets')
+
+        if self.build_feed:
+            self._feed = self.env.open_db(b'feed')
+
+            # the feed entries of each key, so that they can be removed along
+            # with it, without scanning the feed
+            self._feed_index = self.env.open_db(b'feed_index', dupsort=True)
+            self._index_feed()
+
+        self._leases = self.env.open_db(b'leases')
+
+        # keys written locally that are yet to be replicated elsewhere
+        self._outbox = self.env.open_db(b'outbox')
+
+        self._metadata = self.env.open_db(self._default_database_name + b'_meta')
+
+        # values shared by several keys, and how many keys point at each.  These
+        # are opened regardless, so that pointers are followed even if
+        # deduplication has since been turned off
+        self._blobs = self.env.open_db(self._default_database_name + b'_blobs')
+        self._references = self.env.open_db(self._default_database_name + b'_refs')
+
+        # zstd dictionaries trained on values in this environment
+        self._dictionaries = self.env.open_db(b'dictionaries')
+        self._load_dictionaries()
+
+        if self.bounded:
+            self._access = self.env.open_db(self._default_database_name + b'_access')
+
+            # rank + key for every key that may be evicted, in eviction order,
+            # and each key's current rank
+            self._ranks = self.env.open_db(self._default_database_name + b'_rank')
+            self._ranked = self.env.open_db(self._default_database_name + b'_ranked')
+            self._track_existing_keys()
+
+    def _index_feed(self) -> None:
+        """
+        Index the feed entries of an environment written before the feed was
+        indexed
+        """
+        with self._begin_write(db=self._feed) as txn:
+            if txn.stat(self._feed_index)['entries'] or not txn.stat(self._feed)['entries']:
+                return
+
+            for feed_key, key in txn.cursor():
+                txn.put(key, feed_key, db=self._feed_index)
+
+    def _load_dictionaries(self) -> None:
+        # ids of the dictionaries stored here, so that values written with
+        # any other, e.g. one trained on another collection that shares this
+        # one's compression, bring theirs along
+        self._stored_dictionaries = set()
+
+        with self.env.begin(write=False, db=self._dictionaries) as txn:
+            for key, value in txn.cursor():
+                if key.startswith(DICTIONARY_PREFIX):
+                    self.compression.register_dictionary(value)
+                    self._stored_dictionaries.add(dictionary_id(value))
+
+            # dictionaries trained for a content type go on being used for it,
+            # unless compression says otherwise
+            for key, value in txn.cursor():
+                if key.startswith(CONTENT_TYPE_PREFIX):
+                    content_type = key[len(CONTENT_TYPE_PREFIX):].decode()
+                    if content_type not in self.compression.codecs:
+                        dictionary = txn.get(DICTIONARY_PREFIX + value)
+                        self.compression.codecs[content_type] = ZstdCodec(dictionary=dictionary)
+
+    def train_dictionary(
+            self,
+            content_type: str,
+            prefix: Union[str, bytes] = b'',
+            max_samples: int = 10000,
+            dict_size: int = 16384,
+            level: int = 3) -> ZstdCodec:
+        """
+        Train a zstd dictionary on at most max_samples values beginning with
+        prefix, and compress new values of content_type with it from now on.
+        The dictionary is stored, so that values written with it can always be
+        read, and is used again for content_type when the collection is
+        reopened.  Values already stored are unaffected
+        """
+        prefix = ensure_bytes(prefix)
+        samples = []
+
+        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
+            cursor = txn.cursor()
+            if cursor.set_range(prefix):
+                for key, value in cursor:
+                    if len(samples) >= max_samples or not bytes(key).startswith(prefix):
+                        break
+                    samples.append(bytes(self.compression.decompress(self._resolve(txn, value))))
+
+        codec = self.compression.train(content_type, samples, dict_size=dict_size, level=level)
+
+        with self._begin_write(db=self._dictionaries) as txn:
+            self._store_dictionary(txn, codec.dictionary_id)
+            txn.put(CONTENT_TYPE_PREFIX + content_type.encode(), struct.pack('<I', codec.dictionary_id))
+
+        return codec
+
+    def _store_dictionary(self, txn: lmdb.Transaction, dictionary: int) -> None:
+        key = struct.pack('<I', dictionary)
+        txn.put(DICTIONARY_PREFIX + key, self.compression.dictionary(dictionary), db=self._dictionaries)
+        self._stored_dictionaries.add(dictionary)
+
+    @contextmanager
+    def _begin_write(self, **kwargs):
+        with self._write_lock:
+            with self.env.begin(write=True, **kwargs) as txn:
+                yield txn
+
+    @property
+    def bounded(self) -> bool:
+        return self.max_bytes is not None or self.max_items is not None
+
+    @staticmethod
+    def _digest(stored) -> Union[bytes, None]:
+        """
+        Return the digest a stored value points at, or None if it's the value
+        itself
+        """
+        if len(stored) != POINTER_SIZE or bytes(stored[:len(POINTER_PREFIX)]) != POINTER_PREFIX:
+            return None
+        return bytes(stored[len(POINTER_PREFIX):])
+
+    def _resolve(self, txn: lmdb.Transaction, stored):
+        digest = self._digest(stored)
+        if digest is None:
+            return stored
+        return txn.get(digest, db=self._blobs)
+
+    def _store_blob(self, txn: lmdb.Transaction, value) -> bytes:
+        """
+        Add a reference to value, storing it if it's new, and return a pointer
+        to it
+        """
+        digest = hashlib.sha256(value).digest()
+        record = txn.get(digest, db=self._references)
+
+        if record is None:
+            txn.put(digest, value, db=self._blobs)
+            count, replica = 0, b''
+        else:
+            count, replica = REFERENCE_COUNT.unpack(record[:REFERENCE_COUNT.size])[0], \
+                bytes(record[REFERENCE_COUNT.size:])
+            self.deduplicated += 1
+
+        txn.put(digest, REFERENCE_COUNT.pack(count + 1) + replica, db=self._references)
+        return POINTER_PREFIX + digest
+
+    def _release(self, txn: lmdb.Transaction, key: bytes, stored: bytes) -> None:
+        """
+        Remove key's reference to the value it pointed at, and the value itself
+        once nothing else refers to it
+        """
+        digest = self._digest(stored)
+        if digest is None:
+            return
+
+        record = txn.get(digest, db=self._references)
+        if record is None:
+            return
+
+        count = REFERENCE_COUNT.unpack(record[:REFERENCE_COUNT.size])[0]
+        replica = bytes(record[REFERENCE_COUNT.size:])
+
+        if count <= 1:
+            txn.delete(digest, db=self._references)
+            txn.delete(digest, db=self._blobs)
+            return
+
+        # the replica under this key may no longer hold the same value
+        if replica.partition(REPLICA_DELIMITER)[0] == key:
+            replica = b''
+        txn.put(digest, REFERENCE_COUNT.pack(count - 1) + replica, db=self._references)
+
+    def replica_of(self, key: Union[str, bytes]) -> Union[Tuple[bytes, Union[str, None]], None]:
+        """
+        Return a key whose value has already been replicated and is identical
+        to key's, if there is one, along with the replica's etag, if known
+        """
+        key = ensure_bytes(key)
+
+        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
+            stored = txn.get(key)
+            digest = None if stored is None else self._digest(stored)
+            if digest is None:
+                return None
+
+            record = txn.get(digest, db=self._references)
+            if record is None:
+                return None
+
+            replica, _, etag = bytes(record[REFERENCE_COUNT.size:]).partition(REPLICA_DELIMITER)
+            if not replica:
+                return None
+            return replica, etag.decode() or None
+
+    def mark_replicated(self, key: Union[str, bytes], etag: str = None) -> None:
+        """
+        Record that key's value has been replicated under key, as the version
+        etag, if the remote collection versions values, so that later keys
+        with the same value can be copied from it
+        """
+        key = ensure_bytes(key)
+
+        with self._begin_write(db=self._data) as txn:
+            stored = txn.get(key)
+            digest = None if stored is None else self._digest(stored)
+            if digest is None:
+                return
+
+            record = txn.get(digest, db=self._references)
+            if record is None or len(record) > REFERENCE_COUNT.size:
+                return
+
+            replica = key if etag is None else key + REPLICA_DELIMITER + etag.encode()
+            txn.put(digest, record + replica, db=self._references)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The total size of all values, which is only tracked, rather than
+        counted, in a bounded collection
+        """
+        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
+            if self.bounded:
+                return self._total_bytes(txn)
+            return sum(
+                len(self._resolve(txn, value)) for value in txn.cursor().iternext(keys=False, values=True))
+
+    def _track_existing_keys(self) -> None:
+        """
+        Create access records for keys written before the collection was
+        bounded, ranking them behind any key that's read from now on, and
+        rank keys again if the eviction policy has changed
+        """
+        with self._begin_write(buffers=True) as txn:
+            if txn.get(TOTAL_BYTES_KEY, db=self._access) is None:
+                total = 0
+                for key, value in txn.cursor(db=self._data).iternext(keys=True, values=True):
+                    size = len(self._resolve(txn, value))
+                    total += size
+                    self._put_access(txn, bytes(key), 0, 0, size)
+
+                self._set_total_bytes(txn, total)
+            elif txn.get(EVICTION_POLICY_KEY, db=self._ranked) != self.eviction.encode():
+                txn.drop(self._ranks, delete=False)
+                txn.drop(self._ranked, delete=False)
+
+                records = [
+                    (bytes(key), ACCESS_RECORD.unpack(record))
+                    for key, record in txn.cursor(db=self._access).iternext(keys=True, values=True)
+                    if bytes(key) != TOTAL_BYTES_KEY
+                ]
+                for key, record in records:
+                    self._rerank(txn, key, self._rank(txn, key, *record))
+
+            txn.put(EVICTION_POLICY_KEY, self.eviction.encode(), db=self._ranked)
+
+    def _total_bytes(self, txn: lmdb.Transaction) -> int:
+        return struct.unpack('<Q', txn.get(TOTAL_BYTES_KEY, db=self._access))[0]
+
+    def _set_total_bytes(self, txn: lmdb.Transaction, total: int) -> None:
+        txn.put(TOTAL_BYTES_KEY, struct.pack('<Q', total), db=self._access)
+
+    def _rank(self, txn: lmdb.Transaction, key: bytes, last_access: float, count: int, size: int) -> bytes:
+        if self.eviction == 'lru':
+            return RANKS['lru'].pack(last_access)
+
+        if self.eviction == 'lfu':
+            return RANKS['lfu'].pack(count, last_access)
+
+        # a recorded size includes any parts stored alongside the value
+        metadata = txn.get(key, db=self._metadata)
+        metadata = json.loads(bytes(metadata)) if metadata is not None else {}
+        return RANKS['cost'].pack(
+            metadata.get('compute_time', 0) / max(metadata.get('size', size), 1), last_access)
+
+    def _rerank(self, txn: lmdb.Transaction, key: bytes, rank: bytes) -> None:
+        # parts are never ranked, but are evicted along with their value
+        if is_part(key):
+            return
+
+        self._unrank(txn, key)
+        txn.put(key, rank, db=self._ranked)
+        txn.put(rank + key, b'', db=self._ranks)
+
+    def _unrank(self, txn: lmdb.Transaction, key: bytes) -> None:
+        previous = txn.get(key, db=self._ranked)
+        if previous is not None:
+            txn.delete(bytes(previous) + key, db=self._ranks)
+            txn.delete(key, db=self._ranked)
+
+    def _put_access(self, txn: lmdb.Transaction, key: bytes, last_access: float, count: int, size: int) -> None:
+        txn.put(key, ACCESS_RECORD.pack(last_access, count, size), db=self._access)
+        self._rerank(txn, key, self._rank(txn, key, last_access, count, size))
+
+    def _track_write(self, txn: lmdb.Transaction, key: bytes, size: int, now: float) -> int:
+        """
+        Record a write of key, returning the change in total size
+        """
+        record = txn.get(key, db=self._access)
+        if record is None:
+            count, previous_size = 0, 0
+        else:
+            _, count, previous_size = ACCESS_RECORD.unpack(record)
+
+        self._put_access(txn, key, now, count + 1, size)
+        return size - previous_size
+
+    def _untrack(self, txn: lmdb.Transaction, keys: Iterable[bytes]) -> None:
+        removed = 0
+        for key in keys:
+            record = txn.get(key, db=self._access)
+            if record is not None:
+                removed += ACCESS_RECORD.unpack(record)[2]
+                txn.delete(key, db=self._access)
+                self._unrank(txn, key)
+
+        if removed:
+            self._set_total_bytes(txn, self._total_bytes(txn) - removed)
+
+    def _record_access(self, key: bytes) -> None:
+        if not self.bounded:
+            return
+
+        # reading a part counts as reading the value it belongs to
+        key = owner_of(key)
+        now = time.time()
+
+        with self._accesses_lock:
+            _, count = self._accesses.get(key, (now, 0))
+            self._accesses[key] = (now, count + 1)
+            self._pending_reads += 1
+            due = self._pending_reads >= self.access_batch_size \
+                or time.monotonic() - self._accesses_flushed >= self.access_flush_interval
+
+        if due:
+            self.flush_accesses()
+
+    def _apply_accesses(self, txn: lmdb.Transaction) -> None:
+        with self._accesses_lock:
+            accesses, self._accesses = self._accesses, dict()
+            self._pending_reads = 0
+            self._accesses_flushed = time.monotonic()
+
+        for key, (last_access, count) in accesses.items():
+            record = txn.get(key, db=self._access)
+            if record is None:
+                # the key has been deleted, or evicted, since it was read
+                continue
+
+            _, previous_count, size = ACCESS_RECORD.unpack(record)
+            self._put_access(txn, key, last_access, previous_count + count, size)
+
+    def flush_accesses(self) -> None:
+        """
+        Write reads tallied in memory to the access database
+        """
+        if not self.bounded:
+            return
+
+        with self._begin_write(buffers=True) as txn:
+            self._apply_accesses(txn)
+
+    @staticmethod
+    def _part_keys(cursor: lmdb.Cursor, key: bytes) -> Iterator[bytes]:
+        prefix = part_prefix(key)
+        if not cursor.set_range(prefix):
+            return
+
+        for part in cursor.iternext(keys=True, values=False):
+            part = bytes(part)
+            if not part.startswith(prefix):
+                return
+            yield part
+
+    def _eviction_candidates(self, txn: lmdb.Transaction, protected: set) -> Iterator[Tuple[List[bytes], int]]:
+        """
+        Yield (keys, size) for each key that may be evicted, lowest ranked
+        first, along with its parts, so that a value is never left without
+        them.  Only as much of the rank index is read as the caller needs
+        """
+        rank_size = RANKS[self.eviction].size
+        data = txn.cursor(db=self._data)
+
+        for ranked in txn.cursor(db=self._ranks).iternext(keys=True, values=False):
+            key = bytes(ranked[rank_size:])
+            if key in protected:
+                continue
+
+            # parts just written belong to the next version of the value
+            keys = [key, *(part for part in self._part_keys(data, key) if part not in protected)]
+
+            # keys yet to be replicated exist nowhere else
+            if any(txn.get(k, db=self._outbox) is not None for k in keys):
+                continue
+
+            yield keys, sum(ACCESS_RECORD.unpack(txn.get(k, db=self._access))[2] for k in keys)
+
+    def _evict(self, txn: lmdb.Transaction, protected: set) -> None:
+        n_bytes = self._total_bytes(txn)
+        n_items = txn.stat(self._data)['entries']
+
+        over_bytes = self.max_bytes is not None and n_bytes > self.max_bytes
+        over_items = self.max_items is not None and n_items > self.max_items
+        if not (over_bytes or over_items):
+            return
+
+        keep = 1 - self.eviction_headroom
+        max_bytes = None if self.max_bytes is None else self.max_bytes * keep
+        max_items = None if self.max_items is None else int(self.max_items * keep)
+
+        victims = []
+
+        for keys, size in self._eviction_candidates(txn, protected):
+            if not ((max_bytes is not None and n_bytes > max_bytes)
+                    or (max_items is not None and n_items > max_items)):
+                break
+
+            victims.extend(keys)
+            n_bytes -= size
+            n_items -= len(keys)
+
+        self._remove(txn, victims, dry_run=False)
+        self.evictions += len(victims)
+
+    def public_uri(self, key: Union[bytes, str]):
+        # TODO: This should be a subclass defined in serve.py
+        if self._port is None:
+            raise NotImplementedError()
+        base = ensure_str(self.extract_base_key(key))
+        k = ensure_str(key)
+
+        uri = f'http://localhost:{self._port}/functions/{base}/{k}'
+        parsed = urlparse(uri)
+        return parsed
+
+    @property
+    def offset(self):
+        with self.env.begin(write=False, db=self._offsets) as txn:
+            offset = txn.get(self._default_database_name, db=self._offsets)
+            return offset
+    
+    def set_offset(self, offset, txn=None):
+        if txn:
+            offset = txn.put(self._default_database_name, offset, db=self._offsets)
+            return offset
+        
+        with self._begin_write(db=self._offsets) as txn:
+            offset = txn.put(self._default_database_name, offset, db=self._offsets)
+            return offset
+    
+    def index_storage(self, name):
+        """
+        A collection of another database in this environment.  LMDB
+        environments may only be opened once per process, so it shares this
+        collection's
+        """
+        return LmdbCollection(
+            self.path, 
+            self.extract_base_key, 
+            default_database_name=name, 
+            build_feed=False,
+            compression=self.compression,
+            parent=self)
+
+    @property
+    def views_open(self) -> bool:
+        """
+        Whether any view returned by view is still referenced
+        """
+        return len(self._snapshots) > 0
+
+    def destroy(self):
+        # views still referenced keep the environment mapped, and it's closed
+        # once they're gone.  A shared environment is left to its owner
+        if not self.views_open and self._parent is None:
+            self.env.close()
+        rmtree(self.path)
+
+    def _feed_range(self, offset: Union[bytes, str, None]) -> Tuple[Union[bytes, None], bytes]:
+        """
+        Determine the (start_key, prefix) of the feed entries sharing offset's
+        base key.  An offset naming only the base key, rather than a specific
+        entry, starts at the beginning (or the end, in reverse) of the feed
+        """
+        offset = ensure_bytes(offset or '')
+        base_key = self.extract_base_key(offset)
+
+        # feed keys take the form {base_key}_{timestamp}
+        prefix = base_key + b'_' if base_key else b''
+        start_key = None if offset == base_key else offset
+        return start_key, prefix
+
+    def feed(
+            self,
+            offset: Union[bytes, str] = None,
+            limit: int = None,
+            batch_size: int = None,
+            reverse: bool = False) -> Iterable[dict]:
+
+        if not self.build_feed:
+            raise NotImplementedError('This storage instance has no feed')
+        
+        start_key, prefix = self._feed_range(offset)
+
+        items = self._iter_items(
+            self._feed,
+            start_key,
+            prefix=prefix,
+            limit=limit,
+            batch_size=batch_size,
+            reverse=reverse)
+
+        for key, value in items:
+            # a tuple of (time-based id, key)
+            yield {'timestamp': key, 'key': value}
+
+    def most_recent_feed_item(self, offset: Union[bytes, str] = None) -> Union[dict, None]:
+        if not self.build_feed:
+            raise NotImplementedError('This storage instance has no feed')
+
+        _, prefix = self._feed_range(offset)
+
+        # seek directly to the end of the prefix's range, which is O(log n)
+        for key, value in self._scan(self._feed, None, prefix, limit=1, reverse=True):
+            return {'timestamp': key, 'key': value}
+
+        return None
+
+    def content_length(self, key) -> int:
+        key = ensure_bytes(key)
+
+        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
+            # the metadata spares the value's pages from being read at all
+            metadata = txn.get(key, db=self._metadata)
+            if metadata is not None:
+                content_length = json.loads(bytes(metadata)).get('content_length')
+                if content_length is not None:
+                    return content_length
+
+            value = txn.get(key)
+            if value is None:
+                raise KeyError(key)
+
+            return self.compression.size(self._resolve(txn, value))
+
+    def __contains__(self, key: Union[str, bytes]):
+        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
+            return txn.get(ensure_bytes(key)) is not None
+
+    def contains_many(self, keys: Iterable[Union[str, bytes]]) -> List[bool]:
+        # a single read transaction, and no copies of the values themselves
+        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
+            return [txn.get(ensure_bytes(key)) is not None for key in keys]
+
+    def _seek(self, cursor: lmdb.Cursor, start_key: Union[bytes, None], prefix: bytes, reverse: bool) -> bool:
+        """
+        Position the cursor at the first key of a scan, returning False if there
+        are no keys in range.  A start_key of None means the beginning (or the
+        end, in reverse) of the prefix's range
+        """
+        if not reverse:
+            return cursor.set_range(prefix if start_key is None else start_key)
+
+        if start_key is None:
+            upper = prefix_upper_bound(prefix)
+            if upper is not None and cursor.set_range(upper):
+                return cursor.prev()
+            return cursor.last()
+
+        # in reverse, begin at the greatest key less than or equal to start_key
+        if cursor.set_range(start_key):
+            return bytes(cursor.key()) == start_key or cursor.prev()
+        return cursor.last()
+
+    def _scan(
+            self,
+            db,
+            start_key: Union[bytes, None],
+            prefix: Union[bytes, None],
+            limit: Union[int, None],
+            reverse: bool = False):
+        """
+        Yield (key, value) pairs from a single, read-only snapshot.  The
+        transaction remains open until the generator is exhausted or closed
+        """
+        prefix = prefix or b''
+
+        with self.env.begin(write=False, buffers=True, db=db) as txn:
+            cursor = txn.cursor()
+            if not self._seek(cursor, start_key, prefix, reverse):
+                return
+
+            items = cursor.iterprev(keys=True, values=True) \
+                if reverse else cursor.iternext(keys=True, values=True)
+
+            for i, (key, value) in enumerate(items):
+                if limit is not None and i >= limit:
+                    break
+
+                key = bytes(key)
+                if not key.startswith(prefix):
+                    break
+                yield key, bytes(value)
+
+    def _iter_items(
+            self,
+            db,
+            start_key: Union[str, bytes, None],
+            prefix: Union[str, bytes, None] = None,
+            limit: int = None,
+            batch_size: int = None,
+            reverse: bool = False):
+        """
+        Yield (key, value) pairs in key order (or reverse key order), beginning
+        at start_key.
+
+        By default, the scan happens in a single snapshot.  When batch_size is
+        provided, at most batch_size items are read per transaction, and no
+        transaction is held open while the caller consumes them, which makes
+        it safe to write to the same environment mid-iteration
+        """
+        if start_key is not None:
+            start_key = ensure_bytes(start_key)
+        if prefix is not None:
+            prefix = ensure_bytes(prefix)
+
+        if batch_size is None:
+            yield from self._scan(db, start_key, prefix, limit, reverse)
+            return
+
+        remaining = limit
+        last_key = None
+
+        while remaining is None or remaining > 0:
+            n_items = batch_size if remaining is None else min(batch_size, remaining)
+
+            # when resuming, the scan includes the last key already yielded
+            overlap = 0 if last_key is None else 1
+            batch = list(self._scan(db, start_key, prefix, n_items + overlap, reverse))
+            if overlap and batch and batch[0][0] == last_key:
+                batch = batch[1:]
+            else:
+                batch = batch[:n_items]
+
+            yield from batch
+
+            if len(batch) < n_items:
+                break
+
+            last_key = start_key = batch[-1][0]
+            if remaining is not None:
+                remaining -= len(batch)
+
+    def iter_prefix(
+            self,
             start_key: Union[str, bytes],
             prefix: Union[str, bytes, None] = None,
-            db=None):
+            db=None,
+            limit: int = None,
+            batch_size: int = None) -> Iterable[bytes]:
 
         if db is None:
             db = self._data
 
-        start_key = ensure_bytes(start_key)
-        if prefix is not None:
-            prefix = ensure_bytes(prefix)
+        items = self._iter_items(
+            db, start_key, prefix=prefix, limit=limit, batch_size=batch_size)
 
-        with self.env.begin(write=True, buffers=True, db=db) as txn:
-            cursor = txn.cursor()
-            cursor.set_range(start_key)
+        for key, _ in items:
+            yield key
+
+    def __delitem__(self, key: Union[str, bytes]):
+        key = ensure_bytes(key)
 
-            it = cursor.iternext(keys=True, values=False)
-            for key in it:
+        with self._begin_write(db=self._data) as txn:
+            stored = txn.get(key)
+            if stored is not None:
+                self._release(txn, key, stored)
+
+            txn.delete(key)
+            txn.delete(key, db=self._metadata)
+
+            if self.bounded:
+                self._untrack(txn, [key])
+
+    def _delete_feed_entries(self, txn: lmdb.Transaction, deleted: set) -> None:
+        """
+        Remove feed entries pointing at deleted keys, so that feeds don't
+        refer to values that no longer exist
+        """
+        cursor = txn.cursor(db=self._feed_index)
+
+        for key in deleted:
+            if not cursor.set_key(key):
+                continue
+
+            for feed_key in [bytes(feed_key) for feed_key in cursor.iternext_dup()]:
+                txn.delete(feed_key, db=self._feed)
+
+            txn.delete(key, db=self._feed_index)
+
+    def _remove(self, txn: lmdb.Transaction, keys: Iterable[bytes], dry_run: bool, feed: bool = True) -> dict:
+        n_keys = 0
+        n_bytes = 0
+        deleted = set()
+
+        for key in keys:
+            value = txn.get(key, db=self._data)
+            if value is None:
+                continue
+
+            n_keys += 1
+            n_bytes += len(self._resolve(txn, value))
+
+            if not dry_run:
+                self._release(txn, key, value)
+                txn.delete(key, db=self._data)
+                txn.delete(key, db=self._outbox)
+                txn.delete(key, db=self._metadata)
+                deleted.add(key)
+
+        if deleted and feed and self.build_feed:
+            self._delete_feed_entries(txn, deleted)
+
+        if deleted and self.bounded:
+            self._untrack(txn, deleted)
+
+        return {'keys': n_keys, 'bytes': n_bytes}
+
+    def _delete_keys(self, keys: Iterable[bytes], dry_run: bool, feed: bool = True) -> dict:
+        if dry_run:
+            with self.env.begin(buffers=True, db=self._data) as txn:
+                return self._remove(txn, keys, dry_run, feed=feed)
+
+        with self._begin_write(buffers=True, db=self._data) as txn:
+            return self._remove(txn, keys, dry_run, feed=feed)
+
+    def delete_many(self, keys: Iterable[Union[str, bytes]], dry_run: bool = False) -> dict:
+        """
+        Delete many keys, along with their feed entries, in a single transaction
+        """
+        return self._delete_keys([ensure_bytes(key) for key in keys], dry_run)
+
+    def _delete_range(self, db, prefix: bytes, batch_size: Union[int, None]) -> None:
+        """
+        Delete every key in db beginning with prefix, at most batch_size keys
+        per transaction
+        """
+        while True:
+            n_deleted = 0
+
+            with self._begin_write(db=db) as txn:
+                cursor = txn.cursor()
+                if cursor.set_range(prefix):
+                    while bytes(cursor.key()).startswith(prefix) \
+                            and (batch_size is None or n_deleted < batch_size):
+                        # deleting moves the cursor to the following entry
+                        cursor.delete()
+                        n_deleted += 1
+
+            if batch_size is None or n_deleted < batch_size:
+                break
+
+    def delete_prefix(
+            self,
+            prefix: Union[str, bytes],
+            dry_run: bool = False,
+            batch_size: int = None) -> dict:
+        """
+        Delete every key beginning with prefix, along with their feed
+        entries.  By default, this happens in a single transaction, while
+        batch_size bounds the keys deleted per transaction, so that other
+        writers aren't held up for long
+        """
+        prefix = ensure_bytes(prefix)
+
+        # a prefix covering all of a base key's keys takes the base key's
+        # feed with it, which avoids matching feed entries one by one
+        whole_feed = self.build_feed and prefix == self.extract_base_key(prefix) + b'_'
+
+        if batch_size is None:
+            keys = list(self.iter_prefix(prefix, prefix))
+        else:
+            keys = self.iter_prefix(prefix, prefix, batch_size=batch_size)
+
+        report = {'keys': 0, 'bytes': 0}
+        for batch in batches(keys, batch_size):
+            add_reports(report, self._delete_keys(batch, dry_run, feed=not whole_feed))
+
+        if whole_feed and not dry_run:
+            self._delete_range(self._feed, prefix, batch_size)
+            self._delete_range(self._feed_index, prefix, batch_size)
+
+        return report
+
+    def prefix_stats(self) -> Dict[bytes, dict]:
+        """
+        Report the keys and bytes stored under each base key, from a single
+        read transaction that never copies values
+        """
+        stats = dict()
+        base_key = None
+
+        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
+            for key, value in txn.cursor().iternext(keys=True, values=True):
+                key = bytes(key)
+
+                # keys sharing a base key are adjacent
+                if base_key is None or not key.startswith(base_key + b'_'):
+                    base_key = self.extract_base_key(key)
+                    if base_key == key:
+                        base_key = None
+                        continue
+                    entry = stats.setdefault(base_key, {'keys': 0, 'bytes': 0})
+
+                if not is_part(key):
+                    entry['keys'] += 1
+                entry['bytes'] += len(self._resolve(txn, value))
+
+        return stats
+
+    def _disk_usage(self) -> int:
+        # the data file is sparse, and as large as the map, so count blocks
+        return os.stat(os.path.join(self.path, 'data.mdb')).st_blocks * 512
+
+    def compact(self) -> dict:
+        """
+        Rewrite the environment without the free pages left behind by deleted
+        keys, which LMDB otherwise reuses but never returns to the filesystem.
+
+        The environment is closed and reopened, so it must not be in use by
+        other threads or processes, or by collections from index_storage, and
+        no views of its values may still be referenced
+        """
+        if self.views_open:
+            raise RuntimeError('Cannot compact while views of stored values are still referenced')
+        if self._parent is not None:
+            raise RuntimeError('Cannot compact a shared environment; compact the collection that owns it')
+
+        before = self._disk_usage()
+        compacted = f'{self.path}.compact'
+        rmtree(compacted, ignore_errors=True)
+        os.makedirs(compacted)
+
+        try:
+            self.env.copy(compacted, compact=True)
+            self.env.close()
+            try:
+                os.replace(
+                    os.path.join(compacted, 'data.mdb'),
+                    os.path.join(self.path, 'data.mdb'))
+            finally:
+                self._open()
+        finally:
+            rmtree(compacted, ignore_errors=True)
+
+        return {'before': before, 'after': self._disk_usage()}
+
+    def put(self, key: Union[str, bytes], value: Union[str, bytes], content_type: str, created: float = None):
+        self.put_many([(key, value, content_type)], created=[created])
+
+    def put_many(
+            self,
+            items: Iterable[BatchItem],
+            offset: Union[bytes, None] = None,
+            replicate: bool = False,
+            created: Iterable[Union[float, None]] = None):
+        """
+        Write all values, along with their feed entries and the new offset,
+        in a single transaction.  With replicate, the keys are also added to
+        the outbox, so that they survive a crash until they're replicated.
+
+        Values are recorded as created now, unless created gives the time
+        each was first created elsewhere, in which case their feed entries
+        are placed at that time, too
+        """
+        items = list(items)
+        now = time.time()
+        created = [now] * len(items) if created is None else [now if c is None else c for c in created]
+
+        if self.build_feed:
+            timestamps = self._feed_timestamps(created)
+
+        feed_key = None
+        added = 0
+
+        with self._begin_write(buffers=True, db=self._data) as txn:
+            for i, (key, value, content_type) in enumerate(items):
+                key = ensure_bytes(key)
+                value = ensure_buffer(value)
+                content_type = getattr(content_type, 'value', content_type)
+
+                stored = self.compression.compress(value, content_type)
+                size = memoryview(stored).nbytes
+
+                dictionary = self.compression.dictionary_of(stored)
+                if dictionary and dictionary not in self._stored_dictionaries:
+                    self._store_dictionary(txn, dictionary)
+                # a value that happens to look like a pointer is stored behind
+                # one, whether or not deduplication is on, so that it isn't
+                # mistaken for a pointer when it's read
+                if (self.deduplicate and size >= POINTER_SIZE) or self._digest(stored) is not None:
+                    stored = self._store_blob(txn, stored)
+
+                # the previous value is released only after the new one is
+                # referenced, in case they're one and the same
+                # enough of it is copied to tell whether it's a pointer
+                previous = txn.get(key)
+                previous = None if previous is None else bytes(previous[:POINTER_SIZE + 1])
+                txn.put(key, stored)
+                if previous is not None:
+                    self._release(txn, key, previous)
+
+                # replaces any metadata describing the previous value
+                txn.put(key, self._describe(value, content_type, created[i]), db=self._metadata)
+
+                if self.bounded:
+                    added += self._track_write(txn, key, size, now)
+
+                if self.build_feed and content_type != PART_CONTENT_TYPE:
+                    base_key = self.extract_base_key(key)
+                    feed_key = ensure_bytes(
+                        f'{base_key.decode()}_{timestamps[i].decode()}')
+                    txn.put(feed_key, key, db=self._feed)
+                    txn.put(key, feed_key, db=self._feed_index)
+
+                if replicate:
+                    # each write gets a fresh token, so that finishing an upload
+                    # of an earlier value doesn't remove this one from the outbox
+                    entry = {'token': uuid4().hex, 'content_type': content_type}
+                    txn.put(key, json.dumps(entry).encode(), db=self._outbox)
+
+            # unless told otherwise, the offset follows the newest feed entry
+            offset = offset or feed_key
+            if offset is not None:
+                self.set_offset(offset, txn=txn)
+
+            if self.bounded:
+                self._set_total_bytes(txn, self._total_bytes(txn) + added)
+                self._apply_accesses(txn)
+                self._evict(txn, protected={ensure_bytes(item[0]) for item in items})
+
+        with self._written:
+            self._written.notify_all()
+
+    @staticmethod
+    def _feed_timestamps(created: List[float]) -> List[bytes]:
+        timestamps = [timestamp_id(at) for at in created]
+
+        # sorting ensures that feed entries preserve the order of items
+        # created at the same moment, e.g. all of those created now
+        indices = dict()
+        for i, at in enumerate(created):
+            indices.setdefault(at, []).append(i)
+
+        for same in indices.values():
+            for i, timestamp in zip(same, sorted(timestamps[i] for i in same)):
+                timestamps[i] = timestamp
+
+        return timestamps
+
+    @staticmethod
+    def _describe(value, content_type: Union[str, None], created: float) -> bytes:
+        return json.dumps({
+            'content_type': content_type,
+            'content_length': memoryview(value).nbytes,
+            'checksum': f'crc32:{zlib.crc32(value):08x}',
+            'created': created
+        }).encode()
+
+    def put_metadata(self, items: Iterable[Tuple[Union[str, bytes], dict]]) -> None:
+        with self._begin_write(db=self._metadata) as txn:
+            for key, metadata in items:
                 key = ensure_bytes(key)
-                if prefix is not None and not key.startswith(prefix):
-                    break
-                yield key
 
-    def __delitem__(self, key: Union[str, bytes]):
-        with self.env.begin(write=True, db=self._data) as txn:
-            txn.delete(ensure_bytes(key))
+                # metadata for keys that don't exist would never be removed
+                if txn.get(key, db=self._data) is None:
+                    continue
+
+                existing = txn.get(key)
+                merged = {**json.loads(existing), **metadata} if existing else metadata
+                txn.put(key, json.dumps(merged).encode())
+
+                # a key's cost is part of its rank
+                if self.bounded and self.eviction == 'cost':
+                    record = txn.get(key, db=self._access)
+                    if record is not None:
+                        self._rerank(txn, key, self._rank(txn, key, *ACCESS_RECORD.unpack(record)))
+
+    def metadata_many(self, keys: Iterable[Union[str, bytes]]) -> List[Union[dict, None]]:
+        with self.env.begin(buffers=True, write=False, db=self._metadata) as txn:
+            records = [txn.get(ensure_bytes(key)) for key in keys]
+            return [None if record is None else json.loads(bytes(record)) for record in records]
+
+    def iter_metadata(self, prefix: Union[str, bytes]) -> Iterable[Tuple[bytes, dict]]:
+        for key, record in self._iter_items(self._metadata, prefix, prefix=prefix):
+            yield key, json.loads(record)
+
+    def outbox(self, limit: int = None) -> List[Tuple[bytes, str, str]]:
+        """
+        List (key, token, content_type) entries awaiting replication
+        """
+        entries = []
+        with self.env.begin(write=False, db=self._outbox) as txn:
+            for key, value in islice(txn.cursor(), limit):
+                entry = json.loads(value)
+                entries.append((key, entry['token'], entry['content_type']))
+        return entries
 
-    def put(self, key: Union[str, bytes], value: Union[str, bytes], content_type: str):
-        with self.env.begin(write=True, buffers=True, db=self._data) as txn:
-            key = ensure_bytes(key)
-            txn.put(key, ensure_bytes(value))
+    @property
+    def outbox_depth(self) -> int:
+        with self.env.begin(write=False) as txn:
+            return txn.stat(self._outbox)['entries']
+
+    def remove_from_outbox(self, key: Union[bytes, str], token: str = None) -> None:
+        """
+        Remove key from the outbox, unless it's been written again since the
+        entry with token was read
+        """
+        key = ensure_bytes(key)
+
+        with self._begin_write(db=self._outbox) as txn:
+            existing = txn.get(key)
+            if existing is None:
+                return
+            if token is None or json.loads(existing)['token'] == token:
+                txn.delete(key)
+
+    def wait_for_write(
+            self,
+            offset: Union[bytes, None],
+            timeout: float,
+            poll_interval: float = None) -> Union[bytes, None]:
+
+        deadline = time.monotonic() + timeout
+        poll_interval = self.poll_interval if poll_interval is None else poll_interval
+
+        while True:
+            with self._written:
+                # reading the offset is a single lookup, so idle waiting is
+                # cheap.  Writers notify while holding the condition, so a
+                # write landing after this read always wakes the wait below
+                current = self.offset
+                if current != offset:
+                    return current
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+
+                self._written.wait(min(poll_interval, remaining))
+
+    @staticmethod
+    def _is_stale(lease: dict) -> bool:
+        if lease['expires'] < time.time():
+            return True
+
+        # lmdb environments are only shared by processes on a single host,
+        # so a lease held by a process that no longer exists is abandoned
+        if lease['pid'] == os.getpid():
+            return False
 
-            if self.build_feed:
-                timestamp = timestamp_id()
-                base_key = self.extract_base_key(key)
-                feed_key = ensure_bytes(
-                    f'{base_key.decode()}_{timestamp.decode()}')
-                txn.put(feed_key, key, db=self._feed)
-                self.set_offset(feed_key, txn=txn)
+        try:
+            os.kill(lease['pid'], 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
 
+        return False
+
+    def acquire_lease(self, key: Union[bytes, str], ttl: float) -> Union[str, None]:
+        key = ensure_bytes(key)
+
+        with self._begin_write(db=self._leases) as txn:
+            existing = txn.get(key)
+            if existing is not None and not self._is_stale(json.loads(existing)):
+                return None
+
+            token = uuid4().hex
+            lease = {'token': token, 'pid': os.getpid(), 'expires': time.time() + ttl}
+            txn.put(key, json.dumps(lease).encode())
+            return token
+
+    def release_lease(self, key: Union[bytes, str], token: str) -> None:
+        key = ensure_bytes(key)
+
+        with self._begin_write(db=self._leases) as txn:
+            existing = txn.get(key)
+
+            # a lease that expired may since have been taken over
+            if existing is not None and json.loads(existing)['token'] == token:
+                txn.delete(key)
 
     def __getitem__(self, key):
+        key = ensure_bytes(key)
+
+        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
+            value = txn.get(key)
+            if value is None:
+                raise KeyError(key)
+            value = bytes(self.compression.decompress(self._resolve(txn, value)))
+
+        self._record_access(key)
+        return value
+
+    def get_with_content_type(self, key) -> Tuple[bytes, Union[str, None]]:
+        key = ensure_bytes(key)
+
         with self.env.begin(buffers=True, write=False, db=self._data) as txn:
-            value = txn.get(ensure_bytes(key))
+            value = txn.get(key)
             if value is None:
                 raise KeyError(key)
-            return bytes(value)
+            value = bytes(self.compression.decompress(self._resolve(txn, value)))
+
+            metadata = txn.get(key, db=self._metadata)
+            content_type = None if metadata is None else json.loads(bytes(metadata)).get('content_type')
+
+        self._record_access(key)
+        return value, content_type
+
+    def get_with_metadata(self, key) -> Tuple[bytes, dict]:
+        key = ensure_bytes(key)
+
+        with self.env.begin(buffers=True, write=False, db=self._data) as txn:
+            value = txn.get(key)
+            if value is None:
+                raise KeyError(key)
+            value = bytes(self.compression.decompress(self._resolve(txn, value)))
+
+            metadata = txn.get(key, db=self._metadata)
+            metadata = {'content_type': None} if metadata is None else json.loads(bytes(metadata))
+
+        self._record_access(key)
+        return value, metadata
+
+    def _current_snapshot(self) -> Snapshot:
+        with self._snapshot_lock:
+            snapshot = None if self._snapshot is None else self._snapshot()
+
+            # a snapshot is shared until anything, in any process, is written
+            if snapshot is None or snapshot.txn.id() != self.env.info()['last_txnid']:
+                snapshot = Snapshot(self.env, self._data)
+                self._snapshot = ref(snapshot)
+                self._snapshots.add(snapshot)
+
+            return snapshot
+
+    def view(self, key) -> Union[bytes, memoryview]:
+        """
+        Return a read-only view directly over the memory map, without copying.
+
+        The view keeps the read transaction it came from open for as long as
+        it, or anything derived from it, e.g. an array, is referenced, so its
+        contents never change, even if the key is overwritten, deleted or
+        evicted.  Releasing the view, e.g. by using it as a context manager,
+        ends the transaction.  While views are held, LMDB can't reuse the
+        pages written since, and the collection can't be compacted, so views
+        shouldn't be held for long.
+
+        Small values, and compressed values, are copied instead, which is
+        cheap at that size, or necessary
+        """
+        key = ensure_bytes(key)
+        snapshot = self._current_snapshot()
+
+        with snapshot.lock:
+            value = snapshot.txn.get(key)
+            if value is None:
+                raise KeyError(key)
+
+            value = self._resolve(snapshot.txn, value)
+            if self.compression.is_compressed(value) or len(value) < self._page_size:
+                value = bytes(self.compression.decompress(value))
+            else:
+                pinned = np.frombuffer(value, dtype=np.uint8).view(PinnedBuffer)
+                pinned.snapshot = snapshot
+                value = memoryview(pinned)
+
+        self._record_access(key)
+        return value
+
+
+def replicate(
+        local: LmdbCollection,
+        remote: Collection,
+        key: Union[str, bytes],
+        content_type: str,
+        value: Union[bytes, None] = None) -> bool:
+    """
+    Write a key from a local collection to a remote one.  When the local
+    collection deduplicates, and an identical value has already been
+    replicated under another key, it's copied within the remote collection,
+    rather than uploaded again, and True is returned.  Either way, the
+    remote value is recorded as created when the local one was
+    """
+    metadata = local.metadata_many([key])[0]
+    created = None if metadata is None else metadata.get('created')
+
+    if local.deduplicate:
+        replica = local.replica_of(key)
+
+        if replica is not None and replica[0] != ensure_bytes(key):
+            source, etag = replica
+            try:
+                remote.copy(source, key, content_type, created=created, etag=etag)
+                return True
+            except KeyError:
+                # the replica has since been deleted, or overwritten
+                pass
+
+    if value is None:
+        value = local[key]
+
+    etag = remote.put(key, value, content_type, created=created)
+
+    if local.deduplicate:
+        local.mark_replicated(key, etag)
+
+    return False
+
+
+class Replicator(object):
+    """
+    Uploads the keys in a local collection's outbox to a remote collection,
+    on a pool of background threads.  Failed uploads stay in the outbox,
+    and are retried after retry_interval seconds
+    """
+
+    def __init__(
+            self,
+            local: LmdbCollection,
+            remote: Collection,
+            workers: int = 4,
+            poll_interval: float = 1,
+            retry_interval: float = 5):
+
+        super().__init__()
+        self.local = local
+        self.remote = remote
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+
+        self.uploaded = 0
+        self.copied = 0
+        self.failed = 0
+        self.last_error = None
+
+        self._in_flight = set()
+        self._retry_after = dict()
+        self._stopped = False
+        self._changed = threading.Condition()
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='conjure-replication')
+
+        # entries left over from a previous process are picked up right away
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def notify(self) -> None:
+        with self._changed:
+            self._changed.notify_all()
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._changed:
+                if self._stopped:
+                    return
+                skip = len(self._in_flight) + len(self._retry_after)
+
+            now = time.monotonic()
+
+            for key, token, content_type in self.local.outbox(limit=skip + self.workers * 2):
+                with self._changed:
+                    if key in self._in_flight or self._retry_after.get(key, 0) > now:
+                        continue
+                    self._in_flight.add(key)
+
+                self._pool.submit(self._upload, key, token, content_type)
+
+            with self._changed:
+                if self._stopped:
+                    return
+                self._changed.wait(self.poll_interval)
+
+    def _upload(self, key: bytes, token: str, content_type: str) -> None:
+        try:
+            try:
+                copied = replicate(self.local, self.remote, key, content_type)
+            except KeyError:
+                # deleted before it could be replicated
+                self.local.remove_from_outbox(key, token)
+                return
+            except Exception as e:
+                with self._changed:
+                    self.failed += 1
+                    self.last_error = e
+                    self._retry_after[key] = time.monotonic() + self.retry_interval
+                return
+
+            self.local.remove_from_outbox(key, token)
+
+            with self._changed:
+                if copied:
+                    self.copied += 1
+                else:
+                    self.uploaded += 1
+                self._retry_after.pop(key, None)
+        finally:
+            with self._changed:
+                self._in_flight.discard(key)
+                self._changed.notify_all()
+
+    @property
+    def depth(self) -> int:
+        return self.local.outbox_depth
+
+    @property
+    def stats(self) -> dict:
+        with self._changed:
+            return {
+                'pending': self.depth,
+                'in_flight': len(self._in_flight),
+                'retrying': len(self._retry_after),
+                'uploaded': self.uploaded,
+                'copied': self.copied,
+                'failed': self.failed,
+            }
+
+    def wait(self, max_depth: int = 0, timeout: float = None) -> bool:
+        """
+        Block until at most max_depth keys await replication, returning False
+        if timeout seconds elapse first
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            if self.depth <= max_depth:
+                return True
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+
+            with self._changed:
+                self._changed.wait(
+                    self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Retry failed uploads immediately, and block until the outbox is empty
+        """
+        with self._changed:
+            self._retry_after.clear()
+            self._changed.notify_all()
+
+        return self.wait(0, timeout)
+
+    def close(self) -> None:
+        with self._changed:
+            self._stopped = True
+            self._changed.notify_all()
+
+        self._dispatcher.join()
+        self._pool.shutdown(wait=True)
 
 
 class LocalCollectionWithBackup(Collection):
@@ -361,20 +2883,88 @@ class LocalCollectionWithBackup(Collection):
             remote_bucket,
             is_public=False,
             local_backup=False,
-            cors_enabled=False):
+            cors_enabled=False,
+            write_behind=False,
+            replication_workers: int = 4,
+            max_pending: int = None,
+            existence_cache: ExistenceCache = None,
+            max_local_bytes: int = None,
+            max_local_items: int = None,
+            eviction: str = 'lru',
+            deduplicate: bool = False,
+            compression: Compression = None):
 
         super().__init__()
         self.local_backup = local_backup
 
-        self._local = LmdbCollection(local_path)
+        # with limits, the local collection is a cache of the remote one.  With
+        # deduplicate, identical values are stored once locally, and copied
+        # within the remote collection, rather than uploaded, once one of them
+        # has been replicated
+        self._local = LmdbCollection(
+            local_path,
+            max_bytes=max_local_bytes,
+            max_items=max_local_items,
+            eviction=eviction,
+            deduplicate=deduplicate,
+            compression=compression)
 
         if isinstance(self.local_backup, Collection):
             self._remote = local_backup
         elif self.local_backup:
-            self._remote = LmdbCollection(f'{local_path}_backup')
+            self._remote = LmdbCollection(f'{local_path}_backup', compression=compression)
         else:
+            # public objects are served as they're stored, so only the local
+            # copies of them are compressed.  Otherwise, the bucket holds the
+            # dictionaries of the values written to it, as a backup does
             self._remote = S3Collection(
-                remote_bucket, is_public=is_public, cors_enabled=cors_enabled)
+                remote_bucket,
+                is_public=is_public,
+                cors_enabled=cors_enabled,
+                existence_cache=existence_cache,
+                compression=None if is_public else compression)
+
+        # with write_behind, writes return once they're stored locally, and
+        # are replicated in the background.  When more than max_pending keys
+        # await replication, writers block until the backlog drains.  Either
+        # way, up to replication_workers keys are replicated at once
+        self.write_behind = write_behind
+        self.max_pending = max_pending
+        self.replication_workers = replication_workers
+        self._replicator = Replicator(
+            self._local, self._remote, workers=replication_workers) if write_behind else None
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Block until all writes have been replicated, returning False if timeout
+        seconds elapse first
+        """
+        if self._replicator is None:
+            return True
+        return self._replicator.flush(timeout)
+
+    @property
+    def replication_stats(self) -> dict:
+        if self._replicator is None:
+            return {'pending': 0, 'in_flight': 0, 'retrying': 0, 'uploaded': 0, 'failed': 0}
+        return self._replicator.stats
+
+    @property
+    def max_workers(self) -> int:
+        """
+        How many requests to make at once when reading many values, which is
+        however many the remote collection makes
+        """
+        return getattr(self._remote, 'max_workers', 1)
+
+    def close(self) -> None:
+        """
+        Stop replicating in the background.  Keys still in the outbox are
+        replicated the next time the collection is opened with write_behind
+        """
+        if self._replicator is not None:
+            self._replicator.close()
+            self._replicator = None
     
     @property
     def offset(self):
@@ -385,9 +2975,31 @@ class LocalCollectionWithBackup(Collection):
     
     def set_offset(self, offset):
         self._local.set_offset(offset)
+
+    def wait_for_write(
+            self,
+            offset: Union[bytes, None],
+            timeout: float,
+            poll_interval: float = None) -> Union[bytes, None]:
+        return self._local.wait_for_write(offset, timeout, poll_interval=poll_interval)
+
+    def acquire_lease(self, key: Union[bytes, str], ttl: float) -> Union[str, None]:
+        return self._local.acquire_lease(key, ttl)
+
+    def release_lease(self, key: Union[bytes, str], token: str) -> None:
+        self._local.release_lease(key, token)
     
-    def feed(self, offset: Union[bytes, str] = None):
-        return self._local.feed(offset)
+    def feed(
+            self,
+            offset: Union[bytes, str] = None,
+            limit: int = None,
+            batch_size: int = None,
+            reverse: bool = False) -> Iterable[dict]:
+        return self._local.feed(
+            offset, limit=limit, batch_size=batch_size, reverse=reverse)
+
+    def most_recent_feed_item(self, offset: Union[bytes, str] = None) -> Union[dict, None]:
+        return self._local.most_recent_feed_item(offset)
 
     def content_length(self, key) -> int:
         try:
@@ -399,44 +3011,296 @@ class LocalCollectionWithBackup(Collection):
         return self._remote.public_uri(key)
 
     def destroy(self):
+        self.close()
         self._local.destroy()
         if self.local_backup:
             self._remote.destroy()
 
     def __delitem__(self, key):
+        self._local.remove_from_outbox(key)
         del self._local[key]
         del self._remote[key]
 
-    def iter_prefix(self, start_key, prefix=None) -> Iterable[bytes]:
-        # KLUDGE: What if we're starting from scratch on a new local machine
-        # and the remote has everything?
-        return self._local.iter_prefix(start_key, prefix)
+    def delete_many(self, keys: Iterable[Union[str, bytes]], dry_run: bool = False) -> dict:
+        """
+        Delete keys from both collections, reporting what was removed locally,
+        along with the remote collection's report
+        """
+        keys = list(keys)
+        report = self._local.delete_many(keys, dry_run=dry_run)
+        report['remote'] = self._remote.delete_many(keys, dry_run=dry_run)
+        return report
+
+    def delete_prefix(
+            self,
+            prefix: Union[str, bytes],
+            dry_run: bool = False,
+            batch_size: int = None) -> dict:
+        # the remote collection may hold keys that were never read locally
+        report = self._local.delete_prefix(prefix, dry_run=dry_run, batch_size=batch_size)
+        report['remote'] = self._remote.delete_prefix(
+            prefix, dry_run=dry_run, batch_size=batch_size)
+        return report
+
+    def prefix_stats(self, include_remote: bool = False) -> Dict[bytes, dict]:
+        """
+        Report local keys and bytes for each base key or, with include_remote,
+        for base keys found in either collection, along with the remote
+        collection's stats, which also finds keys never read locally, at the
+        cost of listing remotely
+        """
+        stats = self._local.prefix_stats()
+        if not include_remote:
+            return stats
+
+        remote = self._remote.prefix_stats()
+        for base_key in stats.keys() | remote.keys():
+            entry = stats.setdefault(base_key, {'keys': 0, 'bytes': 0})
+            entry['remote'] = remote.get(base_key, {'keys': 0, 'bytes': 0})
+
+        return stats
+
+    def compact(self) -> dict:
+        return self._local.compact()
+
+    def put_metadata(self, items: Iterable[Tuple[Union[str, bytes], dict]]) -> None:
+        self._local.put_metadata(items)
+
+    def metadata_many(self, keys: Iterable[Union[str, bytes]]) -> List[Union[dict, None]]:
+        return self._local.metadata_many(keys)
+
+    def iter_metadata(self, prefix: Union[str, bytes]) -> Iterable[Tuple[bytes, dict]]:
+        return self._local.iter_metadata(prefix)
+
+    def iter_prefix(
+            self,
+            start_key,
+            prefix=None,
+            limit: int = None,
+            batch_size: int = None,
+            include_remote: bool = False) -> Iterable[bytes]:
+        """
+        Yield keys from the local collection or, with include_remote, keys
+        from both collections merged in order, which also finds keys that
+        were never read or hydrated locally, at the cost of listing remotely
+        """
+        if not include_remote:
+            return self._local.iter_prefix(
+                start_key, prefix, limit=limit, batch_size=batch_size)
+
+        local = self._local.iter_prefix(start_key, prefix, batch_size=batch_size)
+        remote = self._remote.iter_prefix(start_key, prefix)
+        merged = (key for key, _ in groupby(heapq.merge(local, remote)))
+        return islice(merged, limit)
+
+    def hydrate(self, prefix: Union[str, bytes], workers: int = 16, batch_size: int = 256) -> dict:
+        """
+        Copy every remote key beginning with prefix that's missing locally,
+        reporting the keys and bytes copied.  Downloads happen on workers
+        threads, and values are written locally batch_size at a time, while
+        the next batch downloads
+        """
+        prefix = ensure_bytes(prefix)
+        report = {'keys': 0, 'bytes': 0}
+
+        def write(keys: List[bytes], futures: list) -> None:
+            items = []
+            created = []
+            for key, future in zip(keys, futures):
+                try:
+                    value, metadata = future.result()
+                except KeyError:
+                    # deleted since it was listed
+                    continue
+
+                items.append((key, value, metadata.get('content_type')))
+                created.append(metadata.get('created'))
+
+            # values keep the time they were created, so their feed entries
+            # fall where they did remotely
+            self._local.put_many(items, created=created)
+            report['keys'] += len(items)
+            report['bytes'] += sum(len(value) for _, value, _ in items)
+
+        pending = None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for keys in batches(self._remote.iter_prefix(prefix, prefix), batch_size):
+                exists = self._local.contains_many(keys)
+                keys = [key for key, e in zip(keys, exists) if not e]
+                if not keys:
+                    continue
+
+                futures = [pool.submit(self._remote.get_with_metadata, key) for key in keys]
+
+                if pending is not None:
+                    write(*pending)
+                pending = (keys, futures)
+
+            if pending is not None:
+                write(*pending)
+
+        return report
 
     def __contains__(self, key):
+        # checking the remote collection doesn't require downloading the value
+        return key in self._local or key in self._remote
+
+    def contains_many(self, keys: Iterable[Union[str, bytes]]) -> List[bool]:
+        keys = list(keys)
+        found = self._local.contains_many(keys)
+
+        # only keys missing locally need to be checked remotely
+        missing = [i for i, exists in enumerate(found) if not exists]
+        for i, exists in zip(missing, self._remote.contains_many([keys[i] for i in missing])):
+            found[i] = exists
+
+        return found
+
+    def view(self, key) -> Union[bytes, memoryview]:
         try:
-            self[key]
-            return True
+            return self._local.view(key)
         except KeyError:
-            return False
+            return self[key]
+
+    def open(self, key) -> BinaryIO:
+        """
+        Open a value for reading, streaming it from the remote collection
+        when it isn't available locally.  Streamed values aren't copied to
+        the local collection
+        """
+        try:
+            return self._local.open(key)
+        except KeyError:
+            return self._remote.open(key)
+
+    async def aget(self, key) -> bytes:
+        try:
+            return await self._local.aget(key)
+        except KeyError:
+            pass
+
+        value, metadata = await self._remote.aget_with_metadata(key)
+        await self._local._run_async(
+            self._local.put_many,
+            [(key, value, metadata.get('content_type'))],
+            created=[metadata.get('created')])
+        return value
+
+    async def aview(self, key) -> Union[bytes, memoryview]:
+        try:
+            return await self._local.aview(key)
+        except KeyError:
+            return await self.aget(key)
+
+    async def acontains(self, key) -> bool:
+        return await self._local.acontains(key) or await self._remote.acontains(key)
+
+    async def acontent_length(self, key) -> int:
+        try:
+            return await self._local.acontent_length(key)
+        except KeyError:
+            return await self._remote.acontent_length(key)
+
+    async def aput(self, key: Union[str, bytes], value: Union[str, bytes], content_type: str, created: float = None):
+        if self._replicator is not None:
+            return await super().aput(key, value, content_type, created=created)
+
+        await self._local.aput(key, value, content_type, created=created)
+        metadata = self._local.metadata_many([key])[0]
+        created = None if metadata is None else metadata.get('created')
+        await self._remote.aput(key, value, content_type, created=created)
+
+    async def aput_many(self, items: Iterable[BatchItem], offset: Union[bytes, None] = None):
+        if self._replicator is not None:
+            return await super().aput_many(items, offset)
+
+        # remote values are recorded as created when the local ones were
+        items = list(items)
+        await self._local.aput_many(items, offset)
+        metadata = self._local.metadata_many([key for key, _, _ in items])
+        await asyncio.gather(*(
+            self._remote.aput(key, value, content_type, created=None if meta is None else meta.get('created'))
+            for (key, value, content_type), meta in zip(items, metadata)))
+
+    async def adelete(self, key):
+        if self._replicator is not None:
+            return await super().adelete(key)
+
+        await self._local.adelete(key)
+        await self._remote.adelete(key)
 
     def __getitem__(self, key) -> bytes:
+        value, _ = self.get_with_content_type(key)
+        return value
+
+    def get_with_content_type(self, key) -> Tuple[bytes, Union[str, None]]:
+        value, metadata = self.get_with_metadata(key)
+        return value, metadata.get('content_type')
+
+    def get_with_metadata(self, key) -> Tuple[bytes, dict]:
         # first, try local
         try:
-            return self._local[key]
+            return self._local.get_with_metadata(key)
         except KeyError:
             pass
 
-        # then, try remote.  write to local
-        # if the key is in the remote collection
-        resp = self._remote[key]
+        # then, try remote.  write to local, as created when the remote
+        # value was, if the key is in the remote collection
+        value, metadata = self._remote.get_with_metadata(key)
+        self._local.put(key, value, metadata.get('content_type'), created=metadata.get('created'))
+        return value, metadata
 
-        # KLUDGE: This works, for now, but there should be
-        # another database mapping key -> content_type and
-        # a method for reading the value + metadata on the
-        # local storage instance
-        self._local.put(key, resp, content_type=None)
-        return resp
+    def put(self, key: Union[str, bytes], value: Union[str, bytes], content_type: str, created: float = None):
+        if self._replicator is not None:
+            self._put_behind([(key, value, content_type)], created=[created])
+            return
 
-    def put(self, key: Union[str, bytes], value: Union[str, bytes], content_type: str):
-        self._local.put(key, value, content_type)
-        self._remote.put(key, value, content_type)
+        # replicate records the remote value as created when the local one was
+        self._local.put(key, value, content_type, created=created)
+        replicate(self._local, self._remote, key, content_type, value)
+
+    def _put_behind(
+            self,
+            items: List[BatchItem],
+            offset: Union[bytes, None] = None,
+            created: Iterable[Union[float, None]] = None):
+        """
+        Write items locally and leave them in the outbox for the replicator
+        """
+        if self.max_pending is not None:
+            self._replicator.wait(max(self.max_pending - len(items), 0))
+
+        self._local.put_many(items, offset=offset, replicate=True, created=created)
+        self._replicator.notify()
+
+    def put_many(self, items: Iterable[BatchItem], offset: Union[bytes, None] = None):
+        items = list(items)
+
+        if self._replicator is not None:
+            self._put_behind(items, offset)
+            return
+
+        self._local.put_many(items, offset=offset)
+
+        if not self._local.deduplicate:
+            self._remote.put_many(items)
+            return
+
+        # the first of several identical values is uploaded before the rest
+        # are copied from it, and each step happens concurrently
+        first = []
+        rest = []
+        digests = set()
+        for item in items:
+            digest = hashlib.sha256(ensure_buffer(item[1])).digest()
+            (rest if digest in digests else first).append(item)
+            digests.add(digest)
+
+        def write(item: BatchItem) -> None:
+            key, value, content_type = item
+            replicate(self._local, self._remote, key, content_type, value)
+
+        with ThreadPoolExecutor(max_workers=self.replication_workers) as pool:
+            list(pool.map(write, first))
+            list(pool.map(write, rest))
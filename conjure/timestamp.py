@@ -3,6 +3,7 @@ import binascii
 import os
 
 
-def timestamp_id():
-    b = hex(int(time.time() * 1e6)).encode() + binascii.hexlify(os.urandom(8))
+def timestamp_id(at: float = None):
+    at = time.time() if at is None else at
+    b = hex(int(at * 1e6)).encode() + binascii.hexlify(os.urandom(8))
     return b[2:]
@@ -0,0 +1,242 @@
+import asyncio
+import time
+from unittest import IsolatedAsyncioTestCase, skipIf
+from uuid import uuid4 as v4
+
+from conjure.compression import MAGIC, Compression, ZlibCodec
+from conjure.decorate import json_conjure
+from conjure.storage import Collection, LmdbCollection, LocalCollectionWithBackup, S3Collection
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+
+class SlowCollection(Collection):
+    """
+    An in-memory collection whose reads block for a while
+    """
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+        self.values = dict()
+
+    def __getitem__(self, key) -> bytes:
+        time.sleep(self.delay)
+        return self.values[key]
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def put(self, key, value, content_type):
+        self.values[key] = value
+
+
+class AsyncCollectionTests(IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.content_type = 'text/plain'
+        self.backup = LmdbCollection(f'/tmp/{v4().hex}')
+        self.db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}',
+            remote_bucket=None,
+            local_backup=self.backup)
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    async def test_can_write_and_read(self):
+        await self.db.aput(b'key', b'value', self.content_type)
+
+        self.assertEqual(b'value', await self.db.aget(b'key'))
+        self.assertTrue(await self.db.acontains(b'key'))
+        self.assertEqual(5, await self.db.acontent_length(b'key'))
+        self.assertEqual(b'value', self.backup[b'key'])
+
+    async def test_concurrent_puts(self):
+        keys = [f'key_{i}'.encode() for i in range(200)]
+
+        # values large enough that writes overlap
+        value = bytes(256 * 1024)
+
+        await asyncio.gather(*(self.db.aput(key, value, self.content_type) for key in keys))
+
+        for key in keys:
+            self.assertEqual(value, await self.db.aget(key))
+            self.assertEqual(value, self.backup[key])
+
+    async def test_missing_key_raises(self):
+        with self.assertRaises(KeyError):
+            await self.db.aget(b'missing')
+
+        self.assertFalse(await self.db.acontains(b'missing'))
+
+    async def test_reads_from_backup(self):
+        self.backup.put(b'key', b'value', self.content_type)
+
+        self.assertEqual(b'value', await self.db.aget(b'key'))
+        self.assertIn(b'key', self.db._local)
+
+    async def test_backup_hits_keep_the_time_they_were_created(self):
+        self.backup.put('key', b'value', self.content_type)
+        created = self.backup.metadata_many([b'key'])[0]['created']
+        time.sleep(0.01)
+
+        await self.db.aget('key')
+        self.assertEqual(created, self.db._local.metadata_many([b'key'])[0]['created'])
+
+    async def test_write_behind_puts_keep_the_time_they_were_created(self):
+        db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}',
+            remote_bucket=None,
+            local_backup=self.backup,
+            write_behind=True)
+
+        try:
+            await db.aput(b'key', b'value', self.content_type, created=1234.5)
+            db.copy(b'key', b'other', self.content_type, created=1234.5)
+            self.assertTrue(db.flush(timeout=5))
+
+            for key in [b'key', b'other']:
+                self.assertEqual(b'value', self.backup[key])
+                self.assertEqual(1234.5, db._local.metadata_many([key])[0]['created'])
+                self.assertEqual(1234.5, self.backup.metadata_many([key])[0]['created'])
+        finally:
+            db.close()
+            db._local.destroy()
+
+    async def test_can_delete(self):
+        await self.db.aput(b'key', b'value', self.content_type)
+        await self.db.adelete(b'key')
+        self.assertFalse(await self.db.acontains(b'key'))
+
+    async def test_concurrent_reads_overlap(self):
+        db = SlowCollection(delay=0.2)
+        for i in range(4):
+            db.put(str(i), str(i).encode(), self.content_type)
+
+        start = time.monotonic()
+        values = await asyncio.gather(*(db.aget(str(i)) for i in range(4)))
+        elapsed = time.monotonic() - start
+
+        self.assertEqual([str(i).encode() for i in range(4)], values)
+        self.assertLess(elapsed, 0.6)
+
+
+@skipIf(mock_aws is None, 'moto is required to run s3 tests locally')
+class AsyncS3CollectionTests(IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.mock = mock_aws()
+        self.mock.start()
+        self.content_type = 'text/plain'
+        self.db = S3Collection('conjure-test', compression=Compression(default=ZlibCodec()))
+
+    def tearDown(self) -> None:
+        self.mock.stop()
+
+    async def test_writes_are_compressed(self):
+        value = b'the same few words, over and over again. ' * 200
+        await self.db.aput(b'key', value, self.content_type, created=1234.5)
+
+        self.assertLess(
+            self.db.client.head_object(Bucket='conjure-test', Key='key')['ContentLength'], len(value))
+        self.assertEqual(len(value), await self.db.acontent_length(b'key'))
+        self.assertEqual((value, {'content_type': self.content_type, 'created': 1234.5}),
+                         await self.db.aget_with_metadata(b'key'))
+
+    async def test_values_that_look_compressed_are_read_back(self):
+        value = MAGIC + bytes(100)
+        await self.db.aput(b'key', value, self.content_type)
+        self.assertEqual(value, await self.db.aget(b'key'))
+
+    async def test_backups_keep_the_time_values_were_created(self):
+        db = LocalCollectionWithBackup(f'/tmp/{v4().hex}', remote_bucket='conjure-test')
+
+        try:
+            await db.aput_many([(b'a', b'a', self.content_type), (b'b', b'b', self.content_type)])
+            await db.aput(b'c', b'c', self.content_type)
+
+            for key in [b'a', b'b', b'c']:
+                created = db._local.metadata_many([key])[0]['created']
+                _, metadata = await self.db.aget_with_metadata(key)
+                self.assertEqual(created, metadata['created'])
+        finally:
+            db._local.destroy()
+
+
+class AsyncConjureTests(IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.db = LmdbCollection(f'/tmp/{v4().hex}')
+        self.calls = 0
+
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            self.calls += 1
+            return {k: v * 10 for k, v in d.items()}
+
+        self.func = make_bigger
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    async def test_acall_computes_and_stores(self):
+        result = await self.func.acall({'a': 1})
+
+        self.assertEqual({'a': 10}, result)
+        self.assertTrue(self.func.exists({'a': 1}))
+        self.assertEqual(1, len(list(self.func.feed())))
+
+    async def test_acall_records_cost(self):
+        await self.func.acall({'a': 1})
+
+        key = self.func.key({'a': 1})
+        self.assertEqual(self.func.meta({'a': 1}).content_length, self.func.costs()[key]['size'])
+
+    async def test_acall_serves_stale_results_while_refreshing(self):
+        self.func.ttl = 0.05
+        await self.func.acall({'a': 1})
+        await asyncio.sleep(0.1)
+
+        self.assertEqual({'a': 10}, await self.func.acall({'a': 1}))
+        self.assertTrue(self.func.wait_for_refreshes(timeout=5))
+        self.assertEqual(2, self.calls)
+
+    async def test_acall_reads_stored_result(self):
+        self.func({'a': 1})
+
+        result = await self.func.acall({'a': 1})
+
+        self.assertEqual({'a': 10}, result)
+        self.assertEqual(1, self.calls)
+
+    async def test_aget_and_ameta(self):
+        self.func({'a': 1})
+        key = self.func.key({'a': 1})
+
+        self.assertEqual({'a': 10}, await self.func.aget(key))
+
+        meta = await self.func.ameta({'a': 1})
+        self.assertEqual(self.func.meta({'a': 1}).content_length, meta.content_length)
+        self.assertEqual(key, meta.key)
+
+    async def test_ameta_reads_stored_metadata(self):
+        await self.func.acall({'a': 1})
+
+        meta = await self.func.ameta({'a': 1})
+        expected = self.func.meta({'a': 1})
+        self.assertIsNotNone(meta.checksum)
+        self.assertEqual(expected.checksum, meta.checksum)
+        self.assertEqual(expected.content_type, meta.content_type)
+        self.assertEqual(expected.content_length, meta.content_length)
+
+    async def test_aget_raises_for_missing_key(self):
+        with self.assertRaises(KeyError):
+            await self.func.aget(self.func.key({'a': 1}))
+
+    async def test_concurrent_acalls(self):
+        results = await asyncio.gather(*(self.func.acall({'a': i}) for i in range(10)))
+        self.assertEqual([{'a': i * 10} for i in range(10)], results)
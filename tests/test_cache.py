@@ -0,0 +1,159 @@
+from unittest import TestCase
+from uuid import uuid4 as v4
+
+from conjure.cache import ExistenceCache, ResultCache
+from conjure.decorate import json_conjure
+from conjure.storage import LmdbCollection
+
+
+class ResultCacheTests(TestCase):
+
+    def test_evicts_least_recently_used_by_count(self):
+        cache = ResultCache(max_items=2)
+        cache.put(b'a', 1, 1)
+        cache.put(b'b', 2, 1)
+
+        # touch a, so that b is now the least recently used
+        self.assertEqual(1, cache[b'a'])
+
+        cache.put(b'c', 3, 1)
+        self.assertIn(b'a', cache)
+        self.assertNotIn(b'b', cache)
+        self.assertIn(b'c', cache)
+        self.assertEqual(1, cache.evictions)
+
+    def test_evicts_by_size(self):
+        cache = ResultCache(max_items=None, max_bytes=10)
+        cache.put(b'a', 1, 4)
+        cache.put(b'b', 2, 4)
+        cache.put(b'c', 3, 4)
+
+        self.assertNotIn(b'a', cache)
+        self.assertEqual(8, cache.nbytes)
+
+    def test_does_not_cache_values_larger_than_max_bytes(self):
+        cache = ResultCache(max_bytes=10)
+        cache.put(b'a', 1, 4)
+        cache.put(b'b', 2, 11)
+
+        self.assertIn(b'a', cache)
+        self.assertNotIn(b'b', cache)
+        self.assertEqual(4, cache.nbytes)
+
+    def test_replacing_a_value_updates_size(self):
+        cache = ResultCache()
+        cache.put(b'a', 1, 4)
+        cache.put(b'a', 2, 6)
+
+        self.assertEqual(1, len(cache))
+        self.assertEqual(6, cache.nbytes)
+        self.assertEqual(2, cache[b'a'])
+
+    def test_counts_hits_and_misses(self):
+        cache = ResultCache()
+        cache.put(b'a', 1, 1)
+
+        cache[b'a']
+        self.assertRaises(KeyError, lambda: cache[b'b'])
+
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+        self.assertEqual(0.5, cache.stats['hit_rate'])
+
+
+class ExistenceCacheTests(TestCase):
+
+    def test_remembers_answers_until_they_expire(self):
+        cache = ExistenceCache(positive_ttl=60, negative_ttl=-1)
+        cache.set(b'a', True)
+        cache.set(b'b', False)
+
+        self.assertTrue(cache.get(b'a'))
+        self.assertIsNone(cache.get(b'b'))
+        self.assertIsNone(cache.get(b'c'))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+    def test_answers_with_no_ttl_are_not_cached(self):
+        cache = ExistenceCache(positive_ttl=60, negative_ttl=None)
+        cache.set(b'a', True)
+        cache.set(b'a', False)
+
+        self.assertIsNone(cache.get(b'a'))
+        self.assertEqual(0, len(cache))
+
+    def test_is_bounded(self):
+        cache = ExistenceCache(max_items=2)
+        for key in [b'a', b'b', b'c']:
+            cache.set(key, True)
+
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(b'a'))
+
+
+class ConjureResultCacheTests(TestCase):
+
+    def setUp(self) -> None:
+        self.path = f'/tmp/{v4().hex}'
+        self.db = LmdbCollection(self.path)
+        self.cache = ResultCache(max_items=16)
+        self.calls = 0
+
+        @json_conjure(self.db, cache=self.cache)
+        def make_bigger(d: dict) -> dict:
+            self.calls += 1
+            return {k: v * 10 for k, v in d.items()}
+
+        self.func = make_bigger
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    def test_cache_hit_skips_storage(self):
+        first = self.func({'a': 1})
+        self.assertEqual(1, len(self.cache))
+
+        # remove the value from storage, behind the cache's back
+        del self.db[self.func.key({'a': 1})]
+
+        second = self.func({'a': 1})
+        self.assertIs(first, second)
+        self.assertEqual(1, self.calls)
+        self.assertEqual(1, self.cache.hits)
+
+    def test_storage_reads_populate_cache(self):
+        self.func({'a': 1})
+        self.cache.clear()
+        misses = self.cache.misses
+
+        self.func({'a': 1})
+        self.func({'a': 1})
+
+        self.assertEqual(1, self.calls)
+        self.assertEqual(misses + 1, self.cache.misses)
+        self.assertEqual(1, self.cache.hits)
+
+    def test_delete_invalidates_cache(self):
+        self.func({'a': 1})
+        self.func.delete({'a': 1})
+
+        self.assertEqual(0, len(self.cache))
+        self.func({'a': 1})
+        self.assertEqual(2, self.calls)
+
+    def test_recompute_replaces_cached_result(self):
+        self.func({'a': 1})
+        self.func.prefer_cache = False
+        result = self.func({'a': 1})
+        self.func.prefer_cache = True
+
+        self.assertIs(result, self.func({'a': 1}))
+        self.assertEqual(2, self.calls)
+
+    def test_batched_results_are_not_cached_before_commit(self):
+        with self.func.batch():
+            self.func({'a': 1})
+            self.func({'a': 1})
+            self.assertEqual(0, len(self.cache))
+
+        self.assertEqual(1, self.calls)
@@ -0,0 +1,268 @@
+import threading
+import time
+from unittest import TestCase, skipIf
+from uuid import uuid4 as v4
+import numpy as np
+
+from conjure.cache import ResultCache
+from conjure.chunked import ChunkedArray, ChunkedArraySerializer
+from conjure.decorate import numpy_conjure
+from conjure.storage import LmdbCollection, LocalCollectionWithBackup, S3Collection
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+
+class CountingReads(object):
+
+    def __init__(self, storage):
+        super().__init__()
+        self.storage = storage
+        self.keys = []
+
+    def __getitem__(self, key):
+        self.keys.append(key)
+        return self.storage[key]
+
+
+class TestChunkedArrays(TestCase):
+
+    def setUp(self) -> None:
+        self.path = f'/tmp/{v4().hex}'
+        self.db = LmdbCollection(self.path)
+        self.arr = np.random.normal(0, 1, (100, 12, 7)).astype(np.float32)
+
+        @numpy_conjure(self.db, chunks=(16, 5, 7))
+        def spectrogram(seed: int) -> np.ndarray:
+            self.calls += 1
+            return self.arr
+
+        self.calls = 0
+        self.spectrogram = spectrogram
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    def test_reads_lazily(self):
+        self.spectrogram(1)
+        result = self.spectrogram(1)
+
+        self.assertEqual(1, self.calls)
+        self.assertIsInstance(result, ChunkedArray)
+        self.assertEqual(self.arr.shape, result.shape)
+        self.assertEqual(self.arr.dtype, result.dtype)
+        np.testing.assert_array_equal(self.arr, np.asarray(result))
+
+    def test_new_results_are_read_lazily_too(self):
+        first = self.spectrogram(1)
+        self.assertIsInstance(first, ChunkedArray)
+        np.testing.assert_array_equal(self.arr, np.asarray(first))
+
+    def test_cache_holds_only_descriptions(self):
+        cache = ResultCache(max_bytes=self.arr.nbytes // 2)
+
+        @numpy_conjure(self.db, chunks=(16, 5, 7), cache=cache)
+        def spectrogram(seed: int) -> np.ndarray:
+            return self.arr
+
+        for seed in range(4):
+            spectrogram(seed)
+
+        self.assertEqual(4, len(cache))
+        self.assertLess(cache.nbytes, 1024)
+        self.assertIsInstance(spectrogram(0), ChunkedArray)
+        self.assertEqual(1, cache.hits)
+
+    def test_slices_match_numpy(self):
+        self.spectrogram(1)
+        result = self.spectrogram(1)
+
+        selections = [
+            (slice(10, 40),),
+            (slice(None, None, 3), 4),
+            (slice(90, 5, -7), slice(None), slice(2, 3)),
+            (-1,),
+            (Ellipsis, 3),
+            (5, Ellipsis, slice(1, None, 2)),
+            (slice(200, 300),),
+            (np.int64(17), slice(-3, None)),
+            ([1, 5, 2],),
+        ]
+
+        for selection in selections:
+            np.testing.assert_array_equal(self.arr[selection], result[selection])
+
+        self.assertRaises(IndexError, lambda: result[100])
+        self.assertRaises(IndexError, lambda: result[0, 0, 0, 0])
+
+    def test_only_touched_chunks_are_read(self):
+        self.spectrogram(1)
+        key = self.spectrogram.key(1)
+        stored = self.spectrogram.get(key)
+
+        reads = CountingReads(self.db)
+        arr = ChunkedArray(reads, key, stored.shape, stored.dtype, stored.chunks, stored.generation)
+
+        np.testing.assert_array_equal(self.arr[10:30, 6:8], arr[10:30, 6:8])
+        self.assertEqual(2, len(reads.keys))
+
+    def test_chunks_are_not_added_to_the_feed(self):
+        self.spectrogram(1)
+        self.spectrogram(2)
+
+        keys = [item['key'] for item in self.spectrogram.feed()]
+        self.assertEqual([self.spectrogram.key(1), self.spectrogram.key(2)], keys)
+
+    def test_delete_removes_chunks(self):
+        self.spectrogram(1)
+        self.spectrogram.delete(1)
+        self.assertEqual([], list(self.db.iter_prefix(b'', b'')))
+
+    def test_cost_includes_chunks(self):
+        self.spectrogram(1)
+        cost = self.spectrogram.costs()[self.spectrogram.key(1)]
+        self.assertGreater(cost['size'], self.arr.nbytes)
+
+    def test_chunks_are_not_listed_as_results(self):
+        self.spectrogram(1)
+        key = self.spectrogram.key(1)
+
+        self.assertEqual([key], list(self.spectrogram.iter_keys()))
+        self.assertEqual([key], list(self.spectrogram.costs()))
+
+        stats = self.db.prefix_stats()[self.spectrogram.identifier.encode()]
+        self.assertEqual(1, stats['keys'])
+        self.assertGreater(stats['bytes'], self.arr.nbytes)
+
+    def test_overwrites_replace_chunks(self):
+        self.spectrogram(1)
+        before = self.spectrogram.get(self.spectrogram.key(1))
+
+        self.spectrogram.prefer_cache = False
+        self.arr = np.random.normal(0, 1, (40, 12, 7)).astype(np.float32)
+        self.spectrogram(1)
+        self.spectrogram.prefer_cache = True
+
+        after = self.spectrogram(1)
+        np.testing.assert_array_equal(self.arr, np.asarray(after))
+
+        # only the chunks of the newest version are left
+        prefix = self.spectrogram.serializer.part_prefix(self.spectrogram.key(1))
+        self.assertEqual(sorted(after.chunk_keys()), list(self.db.iter_prefix(prefix, prefix)))
+
+        # and readers of the previous version never see chunks of this one
+        self.assertRaises(KeyError, lambda: before[:16])
+
+    def test_chunks_are_evicted_with_their_array(self):
+        # room for two arrays, but not three
+        db = LmdbCollection(f'/tmp/{v4().hex}', max_bytes=int(self.arr.nbytes * 2.5))
+
+        @numpy_conjure(db, chunks=(16, 5, 7))
+        def spectrogram(seed: int) -> np.ndarray:
+            return self.arr
+
+        try:
+            spectrogram(1)
+            spectrogram(2)
+
+            # reading chunks counts as reading the array they belong to
+            spectrogram(1)[10:20]
+            db.flush_accesses()
+            spectrogram(3)
+
+            key = spectrogram.key(2)
+            self.assertEqual([], list(db.iter_prefix(key, key)))
+            for seed in [1, 3]:
+                np.testing.assert_array_equal(self.arr, np.asarray(spectrogram.get(spectrogram.key(seed))))
+        finally:
+            db.destroy()
+
+    def test_default_chunks_span_all_but_the_first_axis(self):
+        serializer = ChunkedArraySerializer(chunk_bytes=12 * 7 * 4 * 10)
+        _, parts = serializer.to_parts(b'key', self.arr)
+        self.assertEqual(10, len(parts))
+
+    def test_rejects_chunks_of_the_wrong_rank(self):
+        serializer = ChunkedArraySerializer(chunks=(10, 10))
+        self.assertRaises(ValueError, lambda: serializer.to_parts(b'key', self.arr))
+
+
+@skipIf(mock_aws is None, 'moto is required to run s3 tests locally')
+class TestChunkedArraysInS3(TestCase):
+
+    def setUp(self) -> None:
+        self.mock = mock_aws()
+        self.mock.start()
+        self.db = S3Collection('conjure-test', max_workers=4)
+
+    def tearDown(self) -> None:
+        self.mock.stop()
+
+    def test_chunks_are_fetched_in_parallel(self):
+        arr = np.random.normal(0, 1, (64, 32)).astype(np.float32)
+
+        @numpy_conjure(self.db, chunks=(8, 32))
+        def spectrogram(seed: int) -> np.ndarray:
+            return arr
+
+        spectrogram(1)
+        result = spectrogram(1)
+
+        self.assertEqual(4, result.max_workers)
+        np.testing.assert_array_equal(arr[10:50], result[10:50])
+
+    def test_chunks_are_fetched_in_parallel_through_a_local_collection(self):
+        arr = np.random.normal(0, 1, (64, 32)).astype(np.float32)
+
+        def spectrogram(db):
+            @numpy_conjure(db, chunks=(8, 32))
+            def spectrogram(seed: int) -> np.ndarray:
+                return arr
+
+            return spectrogram
+
+        writer = LocalCollectionWithBackup(f'/tmp/{v4().hex}', remote_bucket=None, local_backup=self.db)
+        reader = LocalCollectionWithBackup(f'/tmp/{v4().hex}', remote_bucket=None, local_backup=self.db)
+
+        # chunks missing locally are read from the remote collection
+        read = self.db.get_with_metadata
+        lock = threading.Lock()
+        reads = {'current': 0, 'most': 0}
+
+        def slow_read(key):
+            with lock:
+                reads['current'] += 1
+                reads['most'] = max(reads['most'], reads['current'])
+            try:
+                time.sleep(0.05)
+                return read(key)
+            finally:
+                with lock:
+                    reads['current'] -= 1
+
+        try:
+            spectrogram(writer)(1)
+            self.db.get_with_metadata = slow_read
+            result = spectrogram(reader)(1)
+
+            self.assertEqual(4, result.max_workers)
+            np.testing.assert_array_equal(arr[10:50], result[10:50])
+            self.assertGreater(reads['most'], 1)
+        finally:
+            writer._local.destroy()
+            reader._local.destroy()
+
+    def test_chunks_are_not_counted_as_keys(self):
+        arr = np.random.normal(0, 1, (64, 32)).astype(np.float32)
+
+        @numpy_conjure(self.db, chunks=(8, 32))
+        def spectrogram(seed: int) -> np.ndarray:
+            return arr
+
+        spectrogram(1)
+
+        stats = self.db.prefix_stats()[spectrogram.identifier.encode()]
+        self.assertEqual(1, stats['keys'])
+        self.assertGreater(stats['bytes'], arr.nbytes)
@@ -0,0 +1,100 @@
+import json
+import os
+from unittest import TestCase, skipIf
+
+from conjure.compression import HEADER, MAGIC, Compression, Lz4Codec, ZlibCodec, ZstdCodec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4
+except ImportError:
+    lz4 = None
+
+
+def documents(n: int):
+    return [
+        json.dumps({'key': f'document_{i}', 'offset': i * 16, 'label': 'speech'}).encode()
+        for i in range(n)
+    ]
+
+
+class CompressionTests(TestCase):
+
+    def setUp(self) -> None:
+        self.value = b'the same few words, over and over again. ' * 100
+
+    def test_round_trip(self):
+        compression = Compression(default=ZlibCodec())
+        stored = compression.compress(self.value, 'text/plain')
+
+        self.assertLess(len(stored), len(self.value))
+        self.assertEqual(self.value, compression.decompress(stored))
+        self.assertEqual(len(self.value), compression.size(stored))
+
+    def test_stored_values_describe_their_codec(self):
+        stored = Compression(default=ZlibCodec()).compress(self.value, 'text/plain')
+        self.assertEqual(self.value, Compression().decompress(stored))
+
+    def test_values_that_barely_shrink_are_stored_as_they_are(self):
+        compression = Compression(default=ZlibCodec())
+        value = os.urandom(4096)
+        self.assertIs(value, compression.compress(value, 'application/octet-stream'))
+
+        forced = Compression(default=ZlibCodec(), adaptive=False)
+        self.assertTrue(forced.is_compressed(forced.compress(value, 'application/octet-stream')))
+
+    def test_compressed_content_types_are_left_alone(self):
+        compression = Compression(default=ZlibCodec())
+        self.assertIs(self.value, compression.compress(self.value, 'image/png'))
+
+    def test_codec_per_content_type(self):
+        compression = Compression(codecs={'text/plain': ZlibCodec()})
+        self.assertIs(self.value, compression.compress(self.value, 'application/json'))
+        self.assertTrue(compression.is_compressed(compression.compress(self.value, 'text/plain')))
+
+    def test_small_values_are_not_compressed(self):
+        compression = Compression(default=ZlibCodec(), min_size=64)
+        self.assertIs(b'aaaa', compression.compress(b'aaaa', 'text/plain'))
+
+    def test_values_resembling_a_header_are_not_mistaken_for_one(self):
+        compression = Compression()
+        value = MAGIC + os.urandom(HEADER.size)
+
+        stored = compression.compress(value, 'application/octet-stream')
+        self.assertNotEqual(value, stored)
+        self.assertEqual(value, compression.decompress(stored))
+
+    @skipIf(zstandard is None, 'zstandard is required for zstd compression')
+    def test_zstd(self):
+        compression = Compression(default=ZstdCodec())
+        stored = compression.compress(self.value, 'text/plain')
+        self.assertLess(len(stored), len(self.value))
+        self.assertEqual(self.value, Compression().decompress(stored))
+
+    @skipIf(lz4 is None, 'lz4 is required for lz4 compression')
+    def test_lz4(self):
+        compression = Compression(default=Lz4Codec())
+        stored = compression.compress(self.value, 'text/plain')
+        self.assertLess(len(stored), len(self.value))
+        self.assertEqual(self.value, Compression().decompress(stored))
+
+    @skipIf(zstandard is None, 'zstandard is required for zstd compression')
+    def test_dictionary_shrinks_small_values(self):
+        samples = documents(2000)
+        value = json.dumps({'key': 'document_5000', 'offset': 80000, 'label': 'speech'}).encode()
+
+        plain = Compression(default=ZstdCodec(), adaptive=False, min_size=0)
+        trained = Compression(min_size=0)
+        codec = trained.train('application/json', samples, dict_size=4096)
+
+        with_dictionary = trained.compress(value, 'application/json')
+        self.assertLess(len(with_dictionary), len(plain.compress(value, 'application/json')))
+
+        # readers need only the dictionary itself
+        reader = Compression(dictionaries=[codec.dictionary_bytes])
+        self.assertEqual(value, reader.decompress(with_dictionary))
+        self.assertRaises(ValueError, lambda: Compression().decompress(with_dictionary))
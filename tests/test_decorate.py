@@ -1,6 +1,8 @@
+from concurrent.futures import ProcessPoolExecutor
 import json
 from multiprocessing import Process
-from time import sleep
+from threading import Thread, Timer
+from time import sleep, time
 from typing import Union
 from unittest import TestCase, skip
 import requests
@@ -9,7 +11,7 @@ from random import random
 from traitlets import Callable
 
 from build.lib.conjure import IdentitySerializer, IdentityDeserializer, FunctionNameIdentifier
-from conjure.decorate import Conjure, Index, WriteNotification, conjure_index, json_conjure, text_conjure, bytes_conjure
+from conjure.decorate import Arguments, Conjure, Index, WriteNotification, conjure_index, json_conjure, text_conjure, bytes_conjure, pickle_conjure
 from conjure.identifier import FunctionContentIdentifier, LiteralFunctionIdentifier, LiteralParamsIdentifier, ParamsHash
 from conjure.serialize import JSONDeserializer, JSONSerializer
 from conjure.serve import serve_conjure
@@ -33,6 +35,10 @@ def retry(func: Callable, max_tries: int = 10, wait_time_seconds=1):
     raise exc
 
 
+def add(a: int, b: int = 0) -> dict:
+    return {'sum': a + b}
+
+
 class DecorateTests(TestCase):
 
     def setUp(self) -> None:
@@ -110,6 +116,43 @@ class DecorateTests(TestCase):
 
         self.assertEqual(conj.name, 'arr2bytes')
 
+    def test_derives_function_identifier_once(self):
+
+        class CountingIdentifier(LiteralFunctionIdentifier):
+            def __init__(self, name):
+                super().__init__(name)
+                self.calls = 0
+
+            def derive_name(self, fn):
+                self.calls += 1
+                return super().derive_name(fn)
+
+        def arr_to_bytes(data: np.ndarray):
+            return bytes(data.data)
+
+        func_identifier = CountingIdentifier('funcname')
+
+        conj = Conjure(
+            callable=arr_to_bytes,
+            content_type='application/octet-stream',
+            storage=self.db,
+            func_identifier=func_identifier,
+            param_identifier=ParamsHash(),
+            serializer=IdentitySerializer(),
+            deserializer=IdentityDeserializer())
+
+        arr = np.random.normal(0, 1, (16,))
+        conj(arr)
+        conj(arr)
+        conj.meta(arr)
+        list(conj.feed())
+
+        self.assertEqual(1, func_identifier.calls)
+
+        conj.invalidate_identifier()
+        self.assertEqual('funcname', conj.identifier)
+        self.assertEqual(2, func_identifier.calls)
+
     def test_can_exercise_read_from_cache_hook(self):
 
         g = {'value': 0}
@@ -290,6 +333,408 @@ class DecorateTests(TestCase):
         self.assertEqual(make_smaller.most_recent_key(),
                          smaller_feed[-1]['key'])
 
+    def test_batched_results_are_written_together(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            d = dict(**d)
+            keys = list(d.keys())
+            for key in keys:
+                d[f'{key}_bigger'] = d[key] * 10
+            return d
+
+        inp = {'a': 10, 'b': 3}
+
+        with make_bigger.batch():
+            initial, meta = make_bigger.result_and_meta(inp)
+            self.assertNotIn(make_bigger.key(inp), self.db)
+            self.assertTrue(make_bigger.exists(inp))
+            self.assertEqual(len(json.dumps(initial).encode()), meta.content_length)
+
+            make_bigger({'z': 11, 'b': 3})
+            self.assertEqual(0, len(list(make_bigger.feed())))
+
+        self.assertIn(make_bigger.key(inp), self.db)
+        self.assertEqual(2, len(list(make_bigger.feed())))
+        self.assertEqual(initial, make_bigger(inp))
+
+    def test_batched_results_are_cache_hits_before_commit(self):
+        calls = {'count': 0}
+
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            calls['count'] += 1
+            return {k: v * 10 for k, v in d.items()}
+
+        with make_bigger.batch():
+            make_bigger({'a': 10})
+            make_bigger({'a': 10})
+
+        self.assertEqual(1, calls['count'])
+
+    def test_listeners_are_notified_of_batched_results_after_commit(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        notifications = []
+        make_bigger.register_listener(
+            lambda n: notifications.append(n.key in self.db))
+
+        with make_bigger.batch():
+            make_bigger({'a': 10})
+            self.assertEqual([], notifications)
+
+        self.assertEqual([True], notifications)
+
+        try:
+            with make_bigger.batch():
+                make_bigger({'a': 11})
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.assertEqual([True], notifications)
+
+    def test_most_recent_key_raises_when_there_are_no_results(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        self.assertRaises(KeyError, lambda: make_bigger.most_recent_key())
+
+    def test_wait_for_feed_returns_items_written_after_offset(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        make_bigger({'a': 1})
+        offset = make_bigger.most_recent_feed_item()['timestamp']
+
+        timer = Timer(0.1, lambda: make_bigger({'a': 2}))
+        timer.start()
+        items = make_bigger.wait_for_feed(offset, timeout=5)
+        timer.join()
+
+        self.assertEqual(1, len(items))
+        self.assertEqual(make_bigger.key({'a': 2}), items[0]['key'])
+
+    def test_wait_for_feed_times_out_without_new_items(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        make_bigger({'a': 1})
+        offset = make_bigger.most_recent_feed_item()['timestamp']
+
+        self.assertEqual([], make_bigger.wait_for_feed(offset, timeout=0.1))
+
+    def test_single_flight_computes_once_for_concurrent_callers(self):
+        calls = {'count': 0}
+
+        @json_conjure(self.db, single_flight=True)
+        def make_bigger(d: dict) -> dict:
+            calls['count'] += 1
+            sleep(0.2)
+            return {k: v * 10 for k, v in d.items()}
+
+        results = []
+        threads = [
+            Thread(target=lambda: results.append(make_bigger({'a': 10})))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(1, calls['count'])
+        self.assertEqual([{'a': 100}] * 8, results)
+        self.assertEqual(0, len(make_bigger._key_locks))
+
+    def test_single_flight_waits_for_lease_holder(self):
+        calls = {'count': 0}
+
+        @json_conjure(self.db, single_flight=True)
+        def make_bigger(d: dict) -> dict:
+            calls['count'] += 1
+            return {k: v * 10 for k, v in d.items()}
+
+        # stand in for another process that's computing the same result
+        key = make_bigger.key({'a': 10})
+        token = self.db.acquire_lease(key, ttl=60)
+
+        def finish():
+            self.db.put(key, json.dumps({'a': 100}).encode(), make_bigger.content_type)
+            self.db.release_lease(key, token)
+
+        timer = Timer(0.2, finish)
+        timer.start()
+        result = make_bigger({'a': 10})
+        timer.join()
+
+        self.assertEqual({'a': 100}, result)
+        self.assertEqual(0, calls['count'])
+
+    def test_single_flight_times_out_waiting_for_lease_holder(self):
+        conj = json_conjure(self.db, single_flight=True)(lambda d: d)
+        conj.single_flight_timeout = 0.1
+
+        self.db.acquire_lease(conj.key({'a': 10}), ttl=60)
+        self.assertRaises(TimeoutError, lambda: conj({'a': 10}))
+
+    def test_map_yields_results_in_order(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        args = [{'a': i} for i in range(20)]
+        results = list(make_bigger.map(args))
+
+        self.assertEqual([{'a': i * 10} for i in range(20)], results)
+        for arg in args:
+            self.assertTrue(make_bigger.exists(arg))
+
+    def test_map_only_computes_missing_results(self):
+        calls = []
+
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            calls.append(d)
+            return {k: v * 10 for k, v in d.items()}
+
+        make_bigger({'a': 1})
+        make_bigger({'a': 3})
+
+        args = [{'a': i} for i in range(5)] + [{'a': 4}]
+        results = list(make_bigger.map(args))
+
+        self.assertEqual([{'a': i * 10} for i in range(5)] + [{'a': 40}], results)
+        self.assertEqual(
+            [{'a': 0}, {'a': 2}, {'a': 4}],
+            sorted(calls[2:], key=lambda d: d['a']))
+
+    def test_map_can_yield_results_as_they_complete(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            sleep(0.01 * (5 - d['a']))
+            return {k: v * 10 for k, v in d.items()}
+
+        make_bigger({'a': 2})
+
+        results = list(make_bigger.map([{'a': i} for i in range(5)], ordered=False))
+
+        self.assertEqual(5, len(results))
+        # stored results are available immediately
+        self.assertEqual((2, {'a': 20}), results[0])
+        self.assertEqual(
+            [(i, {'a': i * 10}) for i in range(5)],
+            sorted(results, key=lambda x: x[0]))
+
+    def test_map_writes_results_in_batches(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        notifications = []
+        make_bigger.register_listener(notifications.append)
+
+        list(make_bigger.map([{'a': i} for i in range(10)], write_batch_size=4))
+
+        self.assertEqual(10, len(list(make_bigger.feed())))
+        self.assertEqual(10, len(notifications))
+        self.assertEqual({'a': 0}, notifications[0].args[0])
+
+    def test_map_keeps_results_computed_before_iteration_stops(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        for result in make_bigger.map([{'a': i} for i in range(10)]):
+            break
+
+        self.assertTrue(make_bigger.exists({'a': 0}))
+
+    def test_map_keeps_results_finished_but_not_yet_yielded(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            # the rest finish while the first is still being computed
+            if d['a'] == 0:
+                sleep(0.2)
+            return {k: v * 10 for k, v in d.items()}
+
+        for result in make_bigger.map([{'a': i} for i in range(4)]):
+            break
+
+        for i in range(4):
+            self.assertTrue(make_bigger.exists({'a': i}))
+
+    def test_map_spreads_arguments(self):
+        conj = json_conjure(self.db)(add)
+
+        results = list(conj.map([Arguments(1, 2), Arguments(3, b=4), 5]))
+
+        self.assertEqual([{'sum': 3}, {'sum': 7}, {'sum': 5}], results)
+        self.assertTrue(conj.exists(3, b=4))
+        self.assertEqual([{'sum': 3}], list(conj.map([Arguments(1, 2)])))
+
+    def test_map_runs_on_a_process_pool(self):
+        conj = json_conjure(self.db)(add)
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            results = list(conj.map([Arguments(i, b=i) for i in range(6)], executor=executor))
+
+        self.assertEqual([{'sum': i * 2} for i in range(6)], results)
+        self.assertTrue(conj.exists(5, b=5))
+
+    def test_map_rejects_local_functions_on_a_process_pool(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            self.assertRaises(ValueError, lambda: list(make_bigger.map([{'a': 1}], executor=executor)))
+
+    def test_records_cost_of_each_result(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            sleep(0.05)
+            return {k: v * 10 for k, v in d.items()}
+
+        make_bigger({'a': 1})
+        key = make_bigger.key({'a': 1})
+
+        cost = make_bigger.costs([key])[key]
+        self.assertGreaterEqual(cost['compute_time'], 0.05)
+        self.assertGreaterEqual(cost['serialize_time'], 0)
+        self.assertEqual(make_bigger.meta({'a': 1}).content_length, cost['size'])
+        self.assertAlmostEqual(time(), cost['created'], delta=5)
+
+    def test_records_costs_of_mapped_and_batched_results(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        list(make_bigger.map([{'a': i} for i in range(5)], write_batch_size=2))
+
+        with make_bigger.batch():
+            make_bigger({'b': 1})
+            self.assertEqual(5, len(make_bigger.costs()))
+
+        costs = make_bigger.costs()
+        self.assertEqual(6, len(costs))
+        self.assertIn(make_bigger.key({'b': 1}), costs)
+
+    def test_cost_summary(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            sleep(0.01)
+            return {k: v * 10 for k, v in d.items()}
+
+        for i in range(3):
+            make_bigger({'a': i})
+
+        summary = make_bigger.cost_summary()
+        self.assertEqual(3, summary['results'])
+        self.assertGreaterEqual(summary['compute_time'], 0.03)
+        self.assertGreater(summary['time_saved'], 0)
+        self.assertEqual(
+            sum(make_bigger.meta({'a': i}).content_length for i in range(3)), summary['bytes'])
+
+    def test_deleted_results_lose_their_costs(self):
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        make_bigger({'a': 1})
+        make_bigger.delete({'a': 1})
+
+        self.assertEqual({}, make_bigger.costs())
+
+    def test_fresh_results_are_served_from_cache(self):
+        calls = {'count': 0}
+
+        @json_conjure(self.db, ttl=60)
+        def fetch(d: dict) -> dict:
+            calls['count'] += 1
+            return {'version': calls['count']}
+
+        fetch({'a': 1})
+        self.assertEqual({'version': 1}, fetch({'a': 1}))
+        self.assertEqual(1, calls['count'])
+
+    def test_stale_results_are_served_while_refreshing(self):
+        calls = {'count': 0}
+
+        @json_conjure(self.db, ttl=0.1)
+        def fetch(d: dict) -> dict:
+            calls['count'] += 1
+            if calls['count'] > 1:
+                sleep(0.5)
+            return {'version': calls['count']}
+
+        fetch({'a': 1})
+        sleep(0.15)
+
+        start = time()
+        results = [fetch({'a': 1}) for _ in range(3)]
+        self.assertLess(time() - start, 0.25)
+        self.assertEqual([{'version': 1}] * 3, results)
+
+        self.assertTrue(fetch.wait_for_refreshes(timeout=5))
+        self.assertEqual(2, calls['count'])
+        self.assertEqual({'version': 2}, fetch({'a': 1}))
+
+    def test_results_past_max_stale_are_recomputed(self):
+        calls = {'count': 0}
+
+        @json_conjure(self.db, ttl=0.05, max_stale=0.05)
+        def fetch(d: dict) -> dict:
+            calls['count'] += 1
+            return {'version': calls['count']}
+
+        fetch({'a': 1})
+        sleep(0.15)
+
+        self.assertEqual({'version': 2}, fetch({'a': 1}))
+        self.assertTrue(fetch.wait_for_refreshes(timeout=5))
+        self.assertEqual(2, calls['count'])
+
+    def test_failed_refreshes_keep_serving_stale_results(self):
+        calls = {'count': 0}
+
+        @json_conjure(self.db, ttl=0.05)
+        def fetch(d: dict) -> dict:
+            calls['count'] += 1
+            if calls['count'] > 1:
+                raise ValueError('upstream is down')
+            return {'version': calls['count']}
+
+        fetch({'a': 1})
+        sleep(0.1)
+
+        self.assertEqual({'version': 1}, fetch({'a': 1}))
+        self.assertTrue(fetch.wait_for_refreshes(timeout=5))
+        self.assertEqual(1, fetch.refresh_failures)
+        self.assertEqual({'version': 1}, fetch({'a': 1}))
+
+    def test_streamed_results_are_read_from_file_like_objects(self):
+        @pickle_conjure(self.db, stream=True)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        opened = []
+        open_value = self.db.open
+
+        def spy(key):
+            opened.append(key)
+            return open_value(key)
+
+        self.db.open = spy
+
+        make_bigger({'a': 1})
+        self.assertEqual({'a': 10}, make_bigger({'a': 1}))
+        self.assertEqual([make_bigger.key({'a': 1})], opened[-1:])
+
     def test_can_register_listener(self):
         @json_conjure(self.db)
         def make_bigger(d: dict) -> dict:
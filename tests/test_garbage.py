@@ -0,0 +1,117 @@
+from unittest import TestCase
+from uuid import uuid4 as v4
+
+from conjure.decorate import json_conjure
+from conjure.garbage import GarbageCollector
+from conjure.storage import LmdbCollection, LocalCollectionWithBackup
+
+
+class GarbageCollectorTests(TestCase):
+
+    def setUp(self) -> None:
+        self.db = LmdbCollection(f'/tmp/{v4().hex}')
+
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        self.stale = make_bigger
+
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 100 for k, v in d.items()}
+
+        self.live = make_bigger
+
+        for i in range(5):
+            self.stale({'a': i})
+            self.live({'a': i})
+
+        self.gc = GarbageCollector(self.db, [self.live], batch_size=2)
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    def test_edited_function_has_new_identifier(self):
+        self.assertNotEqual(self.stale.identifier, self.live.identifier)
+
+    def test_report_marks_live_identifiers(self):
+        report = self.gc.report()
+
+        self.assertTrue(report[self.live.identifier.encode()]['live'])
+        self.assertFalse(report[self.stale.identifier.encode()]['live'])
+        self.assertEqual(5, report[self.stale.identifier.encode()]['keys'])
+
+    def test_dry_run_deletes_nothing(self):
+        report = self.gc.collect(dry_run=True)
+
+        self.assertEqual(5, report['keys'])
+        self.assertEqual([self.stale.identifier.encode()], list(report['identifiers']))
+        self.assertTrue(self.stale.exists({'a': 0}))
+
+    def test_collect_removes_orphaned_results_and_feed(self):
+        report = self.gc.collect()
+
+        self.assertEqual(5, report['keys'])
+        self.assertFalse(any(self.stale.exists({'a': i}) for i in range(5)))
+        self.assertEqual(0, len(list(self.stale.feed())))
+
+        self.assertTrue(all(self.live.exists({'a': i}) for i in range(5)))
+        self.assertEqual(5, len(list(self.live.feed())))
+        self.assertEqual({}, self.gc.orphans())
+
+    def test_refuses_to_collect_without_registered_functions(self):
+        gc = GarbageCollector(self.db)
+        self.assertRaises(ValueError, gc.collect)
+        self.assertTrue(self.stale.exists({'a': 0}))
+
+    def test_compact_after_collecting(self):
+        self.gc.collect()
+        report = self.gc.compact()
+
+        self.assertLessEqual(report['after'], report['before'])
+        self.assertEqual({'a': 100}, self.live({'a': 1}))
+
+
+class GarbageCollectorWithBackupTests(TestCase):
+
+    def setUp(self) -> None:
+        self.db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}', remote_bucket=None, local_backup=True)
+
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        self.stale = make_bigger
+
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 100 for k, v in d.items()}
+
+        self.live = make_bigger
+        self.live({'a': 1})
+
+        # results written by another machine, and never read here
+        for i in range(3):
+            self.db._remote.put(self.stale.key({'a': i}), b'{}', 'application/json')
+
+        self.gc = GarbageCollector(self.db, [self.live])
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    def test_finds_orphans_only_stored_remotely(self):
+        orphans = self.gc.orphans()
+
+        entry = orphans[self.stale.identifier.encode()]
+        self.assertEqual(0, entry['keys'])
+        self.assertEqual(3, entry['remote']['keys'])
+
+    def test_collect_removes_orphans_only_stored_remotely(self):
+        report = self.gc.collect()
+
+        self.assertEqual({'keys': 3, 'bytes': 6}, report['remote'])
+        identifier = self.stale.identifier
+        self.assertEqual([], list(self.db._remote.iter_prefix(identifier, identifier)))
+        self.assertTrue(self.live.exists({'a': 1}))
@@ -1,5 +1,7 @@
 import json
+from hashlib import sha1
 from unittest import TestCase
+import dill as pickle
 import numpy as np
 import torch
 from conjure.identifier import FunctionContentIdentifier, FunctionNameIdentifier, ParamsHash, ParamsJSON
@@ -42,6 +44,61 @@ class TestParamsIdentifier(TestCase):
         params_b = identifier.derive_name(1, 'a', [], key1=set(), key2=b)
         self.assertEqual(params_a, params_b)
     
+    def test_non_array_arguments_produce_same_names_as_pickling(self):
+        identifier = ParamsHash()
+        name = identifier.derive_name(1, 'a', [], key1=set(), key2=dict(pony=10))
+
+        expected = sha1()
+        expected.update(pickle.dumps([1, 'a', []]))
+        expected.update(pickle.dumps(dict(key1=set(), key2=dict(pony=10))))
+        self.assertEqual(expected.hexdigest(), name)
+
+    def test_equal_arrays_with_different_layouts_produce_identical_names(self):
+        identifier = ParamsHash()
+
+        a = np.random.normal(0, 1, (3, 4, 5))
+        b = np.asfortranarray(a)
+        c = np.random.normal(0, 1, (6, 4, 5))[::2]
+        c[:] = a
+
+        self.assertEqual(identifier.derive_name(a), identifier.derive_name(b))
+        self.assertEqual(identifier.derive_name(a), identifier.derive_name(c))
+
+    def test_arrays_with_identical_bytes_but_different_shapes_produce_different_names(self):
+        identifier = ParamsHash()
+
+        a = np.random.normal(0, 1, (3, 4))
+        b = a.reshape((4, 3))
+        c = a.view(np.int64)
+
+        self.assertNotEqual(identifier.derive_name(a), identifier.derive_name(b))
+        self.assertNotEqual(identifier.derive_name(a), identifier.derive_name(c))
+
+    def test_array_position_affects_name(self):
+        identifier = ParamsHash()
+
+        a = np.zeros((3,))
+        b = np.ones((3,))
+
+        self.assertNotEqual(
+            identifier.derive_name(a, b), identifier.derive_name(b, a))
+        self.assertNotEqual(
+            identifier.derive_name(x=a, y=b), identifier.derive_name(x=b, y=a))
+
+    def test_can_use_alternate_digest(self):
+        identifier = ParamsHash(digest='blake2b')
+
+        a = np.random.normal(0, 1, (3, 4, 5))
+        b = a.copy()
+
+        params_a = identifier.derive_name(1, key=a)
+        params_b = identifier.derive_name(1, key=b)
+        self.assertEqual(params_a, params_b)
+        self.assertNotEqual(params_a, ParamsHash().derive_name(1, key=a))
+
+    def test_raises_for_unknown_digest(self):
+        self.assertRaises(ValueError, lambda: ParamsHash(digest='md4'))
+
     def test_json_namer_raises_for_args(self):
         identifier = ParamsJSON()
         self.assertRaises(ValueError, lambda: identifier.derive_name(1, 'a', key=[]))
@@ -1,7 +1,9 @@
 from unittest import TestCase
+from uuid import uuid4 as v4
 import numpy as np
 
-from conjure.logger import display_matrix
+from conjure.logger import Logger, display_matrix
+from conjure.storage import LmdbCollection
 
 
 class TestLogger(TestCase):
@@ -14,4 +16,25 @@ class TestLogger(TestCase):
     def test_display_matrix_3d(self):
         x = np.random.normal(0, 1, (128, 128, 3))
         b = display_matrix(x)
-        self.assertIsInstance(b, bytes)
\ No newline at end of file
+        self.assertIsInstance(b, bytes)
+
+class TestLoggerBatch(TestCase):
+
+    def setUp(self) -> None:
+        self.path = f'/tmp/{v4().hex}'
+        self.db = LmdbCollection(self.path)
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    def test_can_log_many_values_in_a_single_batch(self):
+        logger = Logger(self.db)
+
+        with logger.batch():
+            _, first = logger.log_json('first', {'loss': 1})
+            _, second = logger.log_json('second', {'loss': 2})
+            self.assertNotIn(first.key, self.db)
+            self.assertNotIn(second.key, self.db)
+
+        self.assertEqual(b'{"loss": 1}', self.db[first.key])
+        self.assertEqual(b'{"loss": 2}', self.db[second.key])
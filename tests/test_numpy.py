@@ -1,6 +1,7 @@
 from unittest import TestCase
 from uuid import uuid4 as v4
 import numpy as np
+from conjure.cache import ResultCache
 from conjure.contenttype import SupportedContentType
 
 from conjure.decorate import Conjure, numpy_conjure
@@ -169,6 +170,47 @@ class TestNumpyStorage(TestCase):
         self.assertEqual((3, 7, 5), retrieved.shape)
         self.assertTrue(np.allclose(1, retrieved))
 
+    def test_zero_copy_cache_hit_returns_read_only_view(self):
+
+        @numpy_conjure(self.db, zero_copy=True)
+        def get_spec_mag(x: np.ndarray) -> np.ndarray:
+            spec = np.fft.rfft(x, axis=-1, norm='ortho')
+            return np.abs(spec).astype(np.float32)
+
+        arr = np.random.normal(0, 1, (3, 128, 256))
+
+        computed_result = get_spec_mag(arr)
+        self.assertTrue(computed_result.flags.writeable)
+
+        retrieved = get_spec_mag(arr)
+        np.testing.assert_allclose(computed_result, retrieved)
+        self.assertEqual(np.float32, retrieved.dtype)
+        self.assertFalse(retrieved.flags.writeable)
+        self.assertFalse(retrieved.flags.owndata)
+
+    def test_zero_copy_cannot_be_held_in_memory(self):
+        self.assertRaises(
+            ValueError,
+            lambda: numpy_conjure(self.db, zero_copy=True, cache=ResultCache()))
+
+    def test_zero_copy_preserves_memory_order(self):
+        serializer = NumpySerializer()
+        deserializer = NumpyDeserializer(zero_copy=True)
+
+        arr = np.asfortranarray(np.random.normal(0, 1, (8, 16)))
+        retrieved = deserializer.from_bytes(serializer.to_bytes(arr))
+
+        np.testing.assert_allclose(arr, retrieved)
+        self.assertTrue(retrieved.flags.f_contiguous)
+
+    def test_zero_copy_deserializer_falls_back_for_object_arrays(self):
+        serializer = NumpySerializer()
+        deserializer = NumpyDeserializer(zero_copy=True)
+
+        arr = np.array([{'a': 1}, None], dtype=object)
+        encoded = serializer.to_bytes(arr)
+        self.assertRaises(ValueError, lambda: deserializer.from_bytes(encoded))
+
     def test_can_store_growing_series_under_single_key(self):
 
         values = {
@@ -0,0 +1,139 @@
+from threading import Timer
+from unittest import TestCase
+from uuid import uuid4 as v4
+
+from falcon import testing
+
+from conjure.decorate import json_conjure
+from conjure.serve import MutliFunctionApplication
+from conjure.storage import LmdbCollection
+
+
+class FeedTests(TestCase):
+
+    def setUp(self) -> None:
+        self.path = f'/tmp/{v4().hex}'
+        self.db = LmdbCollection(self.path)
+
+        @json_conjure(self.db)
+        def make_bigger(d: dict) -> dict:
+            return {k: v * 10 for k, v in d.items()}
+
+        self.func = make_bigger
+        self.client = testing.TestClient(MutliFunctionApplication([make_bigger], port=9999))
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    def test_can_page_through_feed(self):
+        for i in range(7):
+            self.func({'a': i})
+
+        expected = [item['key'].decode() for item in self.func.feed()]
+
+        keys = []
+        offset = None
+        pages = 0
+
+        while True:
+            params = {'limit': 3}
+            if offset is not None:
+                params['offset'] = offset
+
+            resp = self.client.simulate_get(f'/feed/{self.func.identifier}', params=params)
+            self.assertEqual(200, resp.status_code)
+
+            page = resp.json
+            self.assertLessEqual(len(page['items']), 3)
+            keys.extend(item['key'] for item in page['items'])
+            pages += 1
+
+            offset = page['next_offset']
+            if offset is None:
+                break
+
+        self.assertEqual(3, pages)
+        self.assertEqual(expected, keys)
+
+    def test_can_get_newest_items_first(self):
+        for i in range(5):
+            self.func({'a': i})
+
+        resp = self.client.simulate_get(
+            f'/feed/{self.func.identifier}', params={'order': 'desc', 'limit': 1})
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(1, len(resp.json['items']))
+        self.assertEqual(self.func.most_recent_key().decode(), resp.json['items'][0]['key'])
+        self.assertIsNotNone(resp.json['next_offset'])
+
+    def test_rejects_invalid_page_parameters(self):
+        resp = self.client.simulate_get(
+            f'/feed/{self.func.identifier}', params={'order': 'sideways'})
+        self.assertEqual(400, resp.status_code)
+
+        resp = self.client.simulate_get(
+            f'/feed/{self.func.identifier}', params={'limit': 0})
+        self.assertEqual(400, resp.status_code)
+
+    def test_function_reports_costs(self):
+        for i in range(3):
+            self.func({'a': i})
+
+        resp = self.client.simulate_get(f'/functions/{self.func.identifier}')
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(3, resp.json['costs']['results'])
+        self.assertEqual(self.func.cost_summary()['bytes'], resp.json['costs']['bytes'])
+
+    def test_head_reports_size_and_checksum_without_body(self):
+        self.func({'a': 1})
+        key = next(iter(self.func.feed()))['key'].decode()
+
+        get = self.client.simulate_get(f'/functions/{self.func.identifier}/{key}')
+        head = self.client.simulate_head(f'/functions/{self.func.identifier}/{key}')
+
+        self.assertEqual(200, head.status_code)
+        self.assertEqual(b'', head.content)
+        self.assertEqual(str(len(get.content)), head.headers['content-length'])
+        self.assertEqual(get.headers['etag'], head.headers['etag'])
+        self.assertTrue(head.headers['etag'])
+
+    def test_head_of_missing_result_is_not_found(self):
+        resp = self.client.simulate_head(f'/functions/{self.func.identifier}/missing')
+        self.assertEqual(404, resp.status_code)
+
+    def test_unknown_function_is_not_found(self):
+        resp = self.client.simulate_get('/feed/unknown')
+        self.assertEqual(404, resp.status_code)
+
+    def test_streams_items_written_after_connecting(self):
+        self.func({'a': 1})
+
+        timer = Timer(0.2, lambda: self.func({'a': 2}))
+        timer.start()
+        resp = self.client.simulate_get(
+            f'/feed/{self.func.identifier}/events', params={'timeout': 1})
+        timer.join()
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('text/event-stream', resp.headers['content-type'])
+
+        newest = self.func.most_recent_feed_item()
+        self.assertIn(f'id: {newest["timestamp"].decode()}\n', resp.text)
+        self.assertIn(newest['key'].decode(), resp.text)
+        self.assertEqual(1, resp.text.count('id: '))
+
+    def test_streams_from_last_event_id(self):
+        for i in range(3):
+            self.func({'a': i})
+
+        first = next(iter(self.func.feed()))['timestamp'].decode()
+
+        resp = self.client.simulate_get(
+            f'/feed/{self.func.identifier}/events',
+            params={'timeout': 0.5},
+            headers={'Last-Event-ID': first})
+
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(2, resp.text.count('id: '))
@@ -1,15 +1,42 @@
-from unittest import TestCase
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import zlib
+from threading import Barrier, Event, Thread, Timer
+from unittest import TestCase, skipIf
 from urllib.parse import urlparse
 from uuid import uuid4 as v4
-from conjure.storage import LmdbCollection, LocalCollectionWithBackup
+from conjure.cache import ExistenceCache
+from conjure.compression import Compression, ZlibCodec
+from conjure.storage import \
+    ACCESS_RECORD, POINTER_PREFIX, Collection, LmdbCollection, LocalCollectionWithBackup, S3Collection
 import logging
 
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 logging.getLogger('boto3').setLevel(logging.CRITICAL)
 logging.getLogger('botocore').setLevel(logging.CRITICAL)
 logging.getLogger('nose').setLevel(logging.CRITICAL)
 logging.getLogger('s3transfer').setLevel(logging.CRITICAL)
 
 
+def document(i: int) -> dict:
+    # large enough to be compressed
+    return {'key': f'doc_{i}', 'label': 'speech', 'speaker': 'unknown', 'language': 'english'}
+
+
 class TestExploratory(TestCase):
 
     @classmethod
@@ -163,6 +190,63 @@ class TestStorage(TestCase):
 
         self.assertEqual(set(keys), set(read_keys))
 
+    def test_view_of_large_value_is_not_copied(self):
+        key = b'key'
+        value = bytes(range(256)) * 64
+        self.db.put(key, value, self.content_type)
+
+        view = self.db.view(key)
+        self.assertIsInstance(view, memoryview)
+        self.assertTrue(view.readonly)
+        self.assertEqual(value, bytes(view))
+
+    def test_view_is_unchanged_by_later_writes(self):
+        key = b'key'
+        value = bytes(range(256)) * 64
+        self.db.put(key, value, self.content_type)
+
+        view = self.db.view(key)
+        self.db.put(key, bytes(reversed(value)), self.content_type)
+        self.db.put(b'other', bytes(len(value)), self.content_type)
+        del self.db._local[key]
+
+        self.assertEqual(value, bytes(view))
+
+    def test_releasing_a_view_ends_its_transaction(self):
+        key = b'key'
+        value = bytes(range(256)) * 64
+        self.db.put(key, value, self.content_type)
+
+        with self.db.view(key) as view:
+            self.assertTrue(self.db._local.views_open)
+            self.assertRaises(RuntimeError, lambda: self.db.compact())
+            self.assertEqual(value, bytes(view))
+
+        self.assertFalse(self.db._local.views_open)
+        self.db.compact()
+
+    def test_view_of_small_value_is_copied(self):
+        key = b'key'
+        value = b'value'
+        self.db.put(key, value, self.content_type)
+
+        view = self.db.view(key)
+        self.assertIsInstance(view, bytes)
+        self.assertEqual(value, view)
+
+    def test_view_reads_from_backup(self):
+        key = b'key'
+        value = b'value'
+        self.db.put(key, value, self.content_type)
+
+        del self.db._local[key]
+
+        self.assertEqual(value, bytes(self.db.view(key)))
+        self.assertIn(key, self.db._local)
+
+    def test_view_raises_for_missing_key(self):
+        self.assertRaises(KeyError, lambda: self.db._local.view(b'missing'))
+
     def test_correct_number_of_keys(self):
         n_keys = 20
 
@@ -207,3 +291,1363 @@ class TestStorage(TestCase):
         truncated_feed = list(self.db.feed(offset=middle))
 
         self.assertEqual(5, len(truncated_feed))
+
+    def test_feed_respects_limit(self):
+        base_key = v4().hex
+
+        keys = [f'{base_key}_{v4().hex}' for _ in range(10)]
+        for key in keys:
+            self.db.put(key, key, self.content_type)
+
+        feed_items = list(self.db.feed(offset=base_key, limit=4))
+        self.assertEqual(4, len(feed_items))
+        self.assertEqual(keys[:4], [item['key'].decode() for item in feed_items])
+
+    def test_batched_feed_matches_single_snapshot_feed(self):
+        base_key = v4().hex
+
+        keys = [f'{base_key}_{v4().hex}' for _ in range(10)]
+        for key in keys:
+            self.db.put(key, key, self.content_type)
+
+        expected = list(self.db.feed(offset=base_key))
+
+        for batch_size in [1, 3, 10, 11]:
+            batched = list(self.db.feed(offset=base_key, batch_size=batch_size))
+            self.assertEqual(expected, batched)
+
+            limited = list(self.db.feed(offset=base_key, batch_size=batch_size, limit=7))
+            self.assertEqual(expected[:7], limited)
+
+    def test_iter_prefix_respects_limit_and_batch_size(self):
+        base_key = v4().hex
+
+        keys = sorted(f'{base_key}_{v4().hex}'.encode() for _ in range(10))
+        for key in keys:
+            self.db.put(key, key, self.content_type)
+
+        self.db.put(b'zzz', b'zzz', self.content_type)
+
+        read_keys = list(self.db.iter_prefix(base_key, base_key, batch_size=3))
+        self.assertEqual(keys, read_keys)
+
+        read_keys = list(self.db.iter_prefix(base_key, base_key, limit=5, batch_size=2))
+        self.assertEqual(keys[:5], read_keys)
+
+    def test_can_write_while_iterating_feed_in_batches(self):
+        base_key = v4().hex
+
+        keys = [f'{base_key}_{v4().hex}' for _ in range(10)]
+        for key in keys:
+            self.db.put(key, key, self.content_type)
+
+        read_keys = []
+        for item in self.db.feed(offset=base_key, batch_size=4):
+            read_keys.append(item['key'].decode())
+            self.db.put(f'other_{v4().hex}', b'value', self.content_type)
+
+        self.assertEqual(keys, read_keys)
+
+    def test_put_many_writes_to_both_databases(self):
+        keys = [v4().hex.encode() for _ in range(10)]
+        self.db.put_many([(key, key, self.content_type) for key in keys])
+
+        for key in keys:
+            self.assertEqual(key, self.db[key])
+            self.assertIn(key, self.backup)
+
+    def test_put_many_preserves_feed_order_and_sets_offset(self):
+        base_key = v4().hex
+
+        keys = [f'{base_key}_{v4().hex}' for _ in range(100)]
+        self.db.put_many([(key, key, self.content_type) for key in keys])
+
+        feed_items = list(self.db.feed(offset=base_key))
+        self.assertEqual(keys, [item['key'].decode() for item in feed_items])
+        self.assertEqual(feed_items[-1]['timestamp'], self.db.offset)
+
+    def test_put_many_honors_explicit_offset(self):
+        keys = [v4().hex.encode() for _ in range(3)]
+        self.db.put_many([(key, key, self.content_type) for key in keys], offset=b'offset')
+        self.assertEqual(b'offset', self.db.offset)
+
+    def test_write_batch_commits_on_exit(self):
+        key = b'key'
+        value = b'value'
+
+        with self.db.batch() as batch:
+            batch.put(key, value, self.content_type)
+            self.assertNotIn(key, self.db)
+            self.assertEqual(value, batch[key])
+            self.assertEqual(len(value), batch.content_length(key))
+
+        self.assertEqual(value, self.db[key])
+        self.assertIn(key, self.backup)
+
+    def test_write_batch_is_discarded_on_error(self):
+        key = b'key'
+
+        def write_and_fail():
+            with self.db.batch() as batch:
+                batch.put(key, b'value', self.content_type)
+                raise ValueError()
+
+        self.assertRaises(ValueError, write_and_fail)
+        self.assertNotIn(key, self.db)
+
+    def test_can_get_most_recent_feed_item(self):
+        first = v4().hex
+        second = v4().hex
+
+        for i in range(5):
+            self.db.put(f'{first}_{i}', b'value', self.content_type)
+            self.db.put(f'{second}_{i}', b'value', self.content_type)
+
+        first_feed = list(self.db.feed(offset=first))
+
+        self.assertEqual(first_feed[-1], self.db.most_recent_feed_item(first))
+        self.assertEqual(f'{second}_4'.encode(), self.db.most_recent_feed_item(second)['key'])
+
+    def test_most_recent_feed_item_ignores_keys_sharing_a_prefix(self):
+        base_key = v4().hex
+
+        self.db.put(f'{base_key}_a', b'value', self.content_type)
+        self.db.put(f'{base_key}b_a', b'value', self.content_type)
+
+        self.assertEqual(f'{base_key}_a'.encode(), self.db.most_recent_feed_item(base_key)['key'])
+
+    def test_most_recent_feed_item_is_none_for_empty_feed(self):
+        self.assertIsNone(self.db.most_recent_feed_item(v4().hex))
+
+    def test_can_read_feed_in_reverse(self):
+        base_key = v4().hex
+
+        keys = [f'{base_key}_{v4().hex}' for _ in range(10)]
+        for key in keys:
+            self.db.put(key, key, self.content_type)
+        self.db.put(f'{base_key}b_{v4().hex}', b'value', self.content_type)
+
+        forward = list(self.db.feed(offset=base_key))
+        backward = list(self.db.feed(offset=base_key, reverse=True))
+        self.assertEqual(forward[::-1], backward)
+
+        for batch_size in [1, 3, 11]:
+            batched = list(self.db.feed(offset=base_key, reverse=True, batch_size=batch_size))
+            self.assertEqual(backward, batched)
+
+    def test_reverse_feed_respects_offset_and_limit(self):
+        base_key = v4().hex
+
+        keys = [f'{base_key}_{v4().hex}' for _ in range(10)]
+        for key in keys:
+            self.db.put(key, key, self.content_type)
+
+        forward = list(self.db.feed(offset=base_key))
+        middle = forward[5]['timestamp']
+
+        backward = list(self.db.feed(offset=middle, reverse=True))
+        self.assertEqual(forward[:6][::-1], backward)
+
+        limited = list(self.db.feed(offset=middle, reverse=True, limit=2))
+        self.assertEqual(forward[4:6][::-1], limited)
+
+    def test_wait_for_write_times_out_without_writes(self):
+        offset = self.db.offset
+        self.assertIsNone(self.db.wait_for_write(offset, timeout=0.1))
+
+    def test_wait_for_write_wakes_on_put(self):
+        base_key = v4().hex
+        offset = self.db.offset
+
+        key = f'{base_key}_{v4().hex}'
+        timer = Timer(0.1, lambda: self.db.put(key, key, self.content_type))
+        timer.start()
+
+        new_offset = self.db.wait_for_write(offset, timeout=5)
+        timer.join()
+
+        self.assertIsNotNone(new_offset)
+        self.assertNotEqual(offset, new_offset)
+
+    def test_wait_for_write_wakes_on_put_without_polling(self):
+        offset = self.db.offset
+
+        key = f'{v4().hex}_{v4().hex}'
+        timer = Timer(0.1, lambda: self.db.put(key, key, self.content_type))
+        timer.start()
+
+        start = time.monotonic()
+        new_offset = self.db.wait_for_write(offset, timeout=30, poll_interval=30)
+        timer.join()
+
+        self.assertNotEqual(offset, new_offset)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_lease_is_exclusive_across_threads(self):
+        n_threads = 16
+        barrier = Barrier(n_threads + 1)
+        tokens = []
+        errors = []
+
+        def acquire():
+            barrier.wait()
+            try:
+                tokens.append(self.db.acquire_lease(b'key', ttl=60))
+            except Exception as e:
+                errors.append(e)
+
+        def write():
+            barrier.wait()
+            try:
+                for i in range(100):
+                    self.db.put(f'abc_{i}', b'value', self.content_type)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=acquire) for _ in range(n_threads)] + [Thread(target=write)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(1, len([token for token in tokens if token is not None]))
+
+    def test_index_storage_shares_the_environment(self):
+        index = self.db.index_storage('index')
+        self.assertIs(self.db._local.env, index.env)
+
+        errors = []
+        barrier = Barrier(2)
+
+        def write(db):
+            barrier.wait()
+            try:
+                for i in range(100):
+                    db.put(f'abc_{i}', b'value', self.content_type)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=write, args=(db,)) for db in [self.db, index]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(b'value', index['abc_99'])
+        self.assertEqual(b'value', self.db['abc_99'])
+
+    def test_lease_is_exclusive_until_released(self):
+        token = self.db.acquire_lease(b'key', ttl=60)
+        self.assertIsNotNone(token)
+        self.assertIsNone(self.db.acquire_lease(b'key', ttl=60))
+
+        self.db.release_lease(b'key', token)
+        self.assertIsNotNone(self.db.acquire_lease(b'key', ttl=60))
+
+    def test_lease_is_not_released_by_another_holder(self):
+        token = self.db.acquire_lease(b'key', ttl=60)
+        self.db.release_lease(b'key', 'someone-else')
+        self.assertIsNone(self.db.acquire_lease(b'key', ttl=60))
+        self.db.release_lease(b'key', token)
+
+    def test_expired_lease_can_be_taken_over(self):
+        self.assertIsNotNone(self.db.acquire_lease(b'key', ttl=-1))
+        self.assertIsNotNone(self.db.acquire_lease(b'key', ttl=60))
+
+    def test_lease_held_by_exited_process_can_be_taken_over(self):
+        proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+        proc.wait()
+
+        lease = {'token': 'abandoned', 'pid': proc.pid, 'expires': 2 ** 40}
+        local = self.db._local
+        with local.env.begin(write=True, db=local._leases) as txn:
+            txn.put(b'key', json.dumps(lease).encode())
+
+        self.assertIsNotNone(self.db.acquire_lease(b'key', ttl=60))
+
+    def test_contains_many(self):
+        self.db.put(b'a', b'a', self.content_type)
+        self.backup.put(b'b', b'b', self.content_type)
+
+        self.assertEqual([True, True, False], self.db.contains_many([b'a', b'b', b'c']))
+        self.assertEqual([True, False], self.db._local.contains_many([b'a', b'b']))
+
+
+    def test_delete_prefix_dry_run_reports_without_deleting(self):
+        local = self.db._local
+        for i in range(5):
+            local.put(f'abc_{i}', b'value', self.content_type)
+        local.put('abd_0', b'value', self.content_type)
+
+        report = local.delete_prefix('abc_', dry_run=True)
+
+        self.assertEqual({'keys': 5, 'bytes': 25}, report)
+        self.assertEqual(6, len(list(local.iter_prefix(b'ab', b'ab'))))
+
+    def test_delete_prefix_removes_keys_and_feed_entries(self):
+        local = self.db._local
+        for i in range(5):
+            local.put(f'abc_{i}', b'value', self.content_type)
+        local.put('abd_0', b'value', self.content_type)
+
+        report = local.delete_prefix('abc_')
+
+        self.assertEqual({'keys': 5, 'bytes': 25}, report)
+        self.assertEqual([b'abd_0'], list(local.iter_prefix(b'ab', b'ab')))
+        self.assertEqual(0, len(list(local.feed(b'abc'))))
+        self.assertEqual(1, len(list(local.feed(b'abd'))))
+
+    def test_delete_many_skips_missing_keys(self):
+        local = self.db._local
+        local.put('abc_0', b'value', self.content_type)
+        local.put('abc_1', b'value', self.content_type)
+
+        report = local.delete_many(['abc_0', 'abc_missing'])
+
+        self.assertEqual({'keys': 1, 'bytes': 5}, report)
+        self.assertNotIn(b'abc_0', local)
+        self.assertEqual([b'abc_1'], [item['key'] for item in local.feed(b'abc')])
+
+    def test_feed_entries_of_earlier_writes_are_indexed_on_open(self):
+        local = self.db._local
+        for i in range(3):
+            local.put(f'abc_{i}', b'value', self.content_type)
+        local.put('abc_1', b'value', self.content_type)
+
+        # as if written before the feed was indexed
+        with local._begin_write() as txn:
+            txn.drop(local._feed_index, delete=False)
+        local.env.close()
+        local._open()
+
+        local.delete_many(['abc_1'])
+        self.assertEqual([b'abc_0', b'abc_2'], [item['key'] for item in local.feed(b'abc')])
+
+    def test_delete_prefix_removes_keys_from_both_collections(self):
+        for i in range(3):
+            self.db.put(f'abc_{i}', b'value', self.content_type)
+
+        report = self.db.delete_prefix('abc_')
+
+        self.assertEqual(3, report['keys'])
+        self.assertEqual(3, report['remote']['keys'])
+        self.assertNotIn(b'abc_0', self.backup)
+
+    def test_hydrate_copies_missing_remote_keys(self):
+        for i in range(10):
+            self.backup.put(f'abc_{i}', b'value', self.content_type)
+        self.backup.put('abd_0', b'value', self.content_type)
+        self.db.put('abc_0', b'value', self.content_type)
+
+        report = self.db.hydrate('abc_', workers=4, batch_size=3)
+
+        self.assertEqual({'keys': 9, 'bytes': 45}, report)
+        self.assertEqual(
+            [f'abc_{i}'.encode() for i in range(10)],
+            list(self.db.iter_prefix(b'abc', b'abc')))
+        self.assertNotIn(b'abd_0', self.db._local)
+        self.assertEqual(10, len(list(self.db.feed(b'abc'))))
+
+        self.assertEqual({'keys': 0, 'bytes': 0}, self.db.hydrate('abc_'))
+
+    def test_hydrated_keys_keep_their_place_in_the_feed(self):
+        self.backup.put('abc_0', b'value', self.content_type)
+        created = self.backup.metadata_many([b'abc_0'])[0]['created']
+        time.sleep(0.01)
+        self.db._local.put('abc_1', b'value', self.content_type)
+
+        self.db.hydrate('abc_')
+
+        self.assertEqual([b'abc_0', b'abc_1'], [item['key'] for item in self.db.feed(b'abc')])
+        self.assertEqual(created, self.db._local.metadata_many([b'abc_0'])[0]['created'])
+
+    def test_iter_prefix_can_merge_remote_keys(self):
+        self.backup.put('abc_0', b'value', self.content_type)
+        self.backup.put('abc_2', b'value', self.content_type)
+        self.db.put('abc_1', b'value', self.content_type)
+        self.db.put('abc_3', b'value', self.content_type)
+
+        self.assertEqual([b'abc_1', b'abc_3'], list(self.db.iter_prefix(b'abc', b'abc')))
+        self.assertEqual(
+            [b'abc_0', b'abc_1', b'abc_2', b'abc_3'],
+            list(self.db.iter_prefix(b'abc', b'abc', include_remote=True)))
+        self.assertEqual(
+            [b'abc_0', b'abc_1'],
+            list(self.db.iter_prefix(b'abc', b'abc', limit=2, include_remote=True)))
+
+    def test_delete_prefix_in_batches(self):
+        local = self.db._local
+        for i in range(25):
+            local.put(f'abc_{i:02d}', b'value', self.content_type)
+        local.put('abd_0', b'value', self.content_type)
+
+        report = local.delete_prefix('abc_', dry_run=True, batch_size=10)
+        self.assertEqual({'keys': 25, 'bytes': 125}, report)
+        self.assertEqual(25, len(list(local.feed(b'abc'))))
+
+        report = local.delete_prefix('abc_', batch_size=10)
+        self.assertEqual({'keys': 25, 'bytes': 125}, report)
+        self.assertEqual([b'abd_0'], list(local.iter_prefix(b'ab', b'ab')))
+        self.assertEqual(0, len(list(local.feed(b'abc'))))
+        self.assertEqual(1, len(list(local.feed(b'abd'))))
+
+    def test_metadata_is_merged_and_discarded_with_values(self):
+        db = self.db._local
+        db.put('abc_0', b'value', self.content_type)
+        db.put('abc_1', b'value', self.content_type)
+
+        db.put_metadata([(b'abc_0', {'a': 1}), (b'missing', {'a': 1})])
+        db.put_metadata([(b'abc_0', {'b': 2}), (b'abc_1', {'a': 3})])
+
+        def custom(metadata):
+            return {k: v for k, v in metadata.items() if k in ('a', 'b')}
+
+        first, second, missing = db.metadata_many([b'abc_0', b'abc_1', b'missing'])
+        self.assertEqual({'a': 1, 'b': 2}, custom(first))
+        self.assertEqual({'a': 3}, custom(second))
+        self.assertIsNone(missing)
+        self.assertEqual(
+            [(b'abc_0', {'a': 1, 'b': 2}), (b'abc_1', {'a': 3})],
+            [(key, custom(metadata)) for key, metadata in self.db.iter_metadata(b'abc_')])
+
+        db.put('abc_0', b'new value', self.content_type)
+        del db[b'abc_1']
+        first, second = db.metadata_many([b'abc_0', b'abc_1'])
+        self.assertEqual({}, custom(first))
+        self.assertIsNone(second)
+
+    def test_put_stores_content_type_length_and_checksum(self):
+        db = self.db._local
+        before = time.time()
+        db.put_many([('abc_0', b'value', self.content_type), ('abc_1', b'', 'application/json')])
+
+        first, second = db.metadata_many([b'abc_0', b'abc_1'])
+        self.assertEqual(self.content_type, first['content_type'])
+        self.assertEqual(5, first['content_length'])
+        self.assertEqual(f'crc32:{zlib.crc32(b"value"):08x}', first['checksum'])
+        self.assertGreaterEqual(first['created'], before)
+        self.assertEqual('application/json', second['content_type'])
+        self.assertEqual(0, second['content_length'])
+
+    def test_content_length_is_read_from_metadata(self):
+        db = self.db._local
+        db.put('abc_0', b'value', self.content_type)
+        db.put_metadata([(b'abc_0', {'content_length': 1234})])
+        self.assertEqual(1234, db.content_length(b'abc_0'))
+
+    def test_content_length_falls_back_to_value_without_metadata(self):
+        db = self.db._local
+        db.put('abc_0', b'value', self.content_type)
+        with db.env.begin(write=True) as txn:
+            txn.delete(b'abc_0', db=db._metadata)
+        self.assertEqual(5, db.content_length(b'abc_0'))
+
+    def test_get_with_content_type(self):
+        self.db.put('abc_0', b'value', self.content_type)
+        self.assertEqual((b'value', self.content_type), self.db.get_with_content_type(b'abc_0'))
+        with self.assertRaises(KeyError):
+            self.db.get_with_content_type(b'missing')
+
+    def test_remote_hits_keep_the_time_they_were_created(self):
+        self.backup.put('abc_0', b'value', self.content_type)
+        created = self.backup.metadata_many([b'abc_0'])[0]['created']
+        time.sleep(0.01)
+
+        self.assertEqual(b'value', self.db['abc_0'])
+        self.assertEqual(created, self.db._local.metadata_many([b'abc_0'])[0]['created'])
+
+    def test_remote_hits_keep_their_content_type(self):
+        self.backup.put('abc_0', b'value', 'application/json')
+        self.assertEqual(b'value', self.db['abc_0'])
+        self.assertEqual('application/json', self.db._local.metadata_many([b'abc_0'])[0]['content_type'])
+
+    def test_prefix_stats(self):
+        local = self.db._local
+        for i in range(3):
+            local.put(f'abc_{i}', b'value', self.content_type)
+        local.put('abd_0', b'longer value', self.content_type)
+        local.put('no-delimiter', b'value', self.content_type)
+
+        self.assertEqual({
+            b'abc': {'keys': 3, 'bytes': 15},
+            b'abd': {'keys': 1, 'bytes': 12},
+        }, self.db.prefix_stats())
+
+    def test_prefix_stats_can_include_remote_keys(self):
+        self.db._local.put('abc_0', b'value', self.content_type)
+        self.backup.put('abd_0', b'longer value', self.content_type)
+
+        self.assertEqual({b'abc': {'keys': 1, 'bytes': 5}}, self.db.prefix_stats())
+        self.assertEqual({
+            b'abc': {'keys': 1, 'bytes': 5, 'remote': {'keys': 0, 'bytes': 0}},
+            b'abd': {'keys': 0, 'bytes': 0, 'remote': {'keys': 1, 'bytes': 12}},
+        }, self.db.prefix_stats(include_remote=True))
+
+    def test_compact_reclaims_space(self):
+        local = self.db._local
+        value = os.urandom(4096)
+        local.put_many([(f'abc_{i}', value, self.content_type) for i in range(2000)])
+        local.put('abd_0', b'value', self.content_type)
+        local.delete_prefix('abc_')
+
+        report = self.db.compact()
+
+        self.assertLess(report['after'], report['before'] / 10)
+        self.assertEqual(b'value', local['abd_0'])
+        self.assertEqual(1, len(list(local.feed(b'abd'))))
+
+        local.put('abd_1', b'value', self.content_type)
+        self.assertEqual(b'value', local['abd_1'])
+
+
+class TestBoundedLmdbCollection(TestCase):
+
+    def setUp(self) -> None:
+        self.content_type = 'application/text-plain'
+        self.path = f'/tmp/{v4().hex}'
+        self.db = None
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    def open(self, **kwargs) -> LmdbCollection:
+        self.db = LmdbCollection(self.path, **kwargs)
+        return self.db
+
+    def test_rejects_unknown_policy(self):
+        self.assertRaises(ValueError, lambda: LmdbCollection(self.path, eviction='fifo'))
+        self.open()
+
+    def test_evicts_least_recently_used_by_size(self):
+        db = self.open(max_bytes=100)
+        for i in range(10):
+            db.put(f'abc_{i}', b'0123456789', self.content_type)
+
+        self.assertEqual(10, len(list(db.iter_prefix(b'abc', b'abc'))))
+
+        # touch the oldest key, so that the next two are least recently used
+        db[b'abc_0']
+        db.put('abc_10', b'0123456789', self.content_type)
+
+        self.assertIn(b'abc_0', db)
+        self.assertNotIn(b'abc_1', db)
+        self.assertNotIn(b'abc_2', db)
+        self.assertIn(b'abc_10', db)
+        self.assertEqual(90, db.nbytes)
+        self.assertEqual(2, db.evictions)
+
+    def test_evicts_least_frequently_used_by_count(self):
+        db = self.open(max_items=5, eviction='lfu')
+        for i in range(5):
+            db.put(f'abc_{i}', b'value', self.content_type)
+
+        for _ in range(3):
+            db[b'abc_3']
+        db[b'abc_4']
+        db.put('abc_5', b'value', self.content_type)
+
+        self.assertEqual(
+            [b'abc_3', b'abc_4', b'abc_5'], list(db.iter_prefix(b'abc', b'abc'))[-3:])
+        self.assertEqual(4, len(list(db.iter_prefix(b'abc', b'abc'))))
+        self.assertNotIn(b'abc_0', db)
+
+    def test_eviction_removes_feed_entries(self):
+        db = self.open(max_items=10)
+        for i in range(11):
+            db.put(f'abc_{i:02d}', b'value', self.content_type)
+
+        keys = [item['key'] for item in db.feed(b'abc')]
+        self.assertEqual(list(db.iter_prefix(b'abc', b'abc')), keys)
+        self.assertEqual(9, len(keys))
+
+    def test_does_not_evict_keys_awaiting_replication(self):
+        db = self.open(max_items=2)
+        db.put_many([('abc_0', b'value', self.content_type)], replicate=True)
+        db.put('abc_1', b'value', self.content_type)
+        db.put('abc_2', b'value', self.content_type)
+
+        self.assertIn(b'abc_0', db)
+        self.assertNotIn(b'abc_1', db)
+
+    def test_tracks_size_through_overwrites_and_deletes(self):
+        db = self.open(max_bytes=1000)
+        db.put('abc_0', b'value', self.content_type)
+        db.put('abc_0', b'longer value', self.content_type)
+        db.put('abc_1', b'value', self.content_type)
+        self.assertEqual(17, db.nbytes)
+
+        del db[b'abc_0']
+        self.assertEqual(5, db.nbytes)
+
+        db.delete_prefix('abc_')
+        self.assertEqual(0, db.nbytes)
+
+    def test_reads_are_recorded_in_batches(self):
+        db = self.open(max_items=10, access_batch_size=3, access_flush_interval=60)
+        db.put('abc_0', b'value', self.content_type)
+
+        def count():
+            with db.env.begin(db=db._access) as txn:
+                return ACCESS_RECORD.unpack(txn.get(b'abc_0'))[1]
+
+        db[b'abc_0']
+        db.view(b'abc_0')
+        self.assertEqual(1, count())
+
+        db[b'abc_0']
+        self.assertEqual(4, count())
+
+    def test_evicts_cheapest_results_per_byte(self):
+        db = self.open(max_items=3, eviction='cost')
+        db.eviction_headroom = 0
+        for i in range(3):
+            db.put(f'abc_{i}', b'value', self.content_type)
+
+        db.put_metadata([
+            (b'abc_0', {'compute_time': 10}),
+            (b'abc_1', {'compute_time': 0.1}),
+            (b'abc_2', {'compute_time': 5}),
+        ])
+        db.put('abc_3', b'value', self.content_type)
+
+        self.assertNotIn(b'abc_1', db)
+        self.assertIn(b'abc_0', db)
+        self.assertIn(b'abc_2', db)
+
+    def test_tracks_keys_written_before_it_was_bounded(self):
+        db = self.open()
+        for i in range(5):
+            db.put(f'abc_{i}', b'value', self.content_type)
+        db.env.close()
+
+        db = self.open(max_items=5)
+        self.assertEqual(25, db.nbytes)
+
+        db[b'abc_0']
+        db.put('abc_5', b'value', self.content_type)
+        self.assertIn(b'abc_0', db)
+        self.assertEqual(4, len(list(db.iter_prefix(b'abc', b'abc'))))
+
+    def test_ranks_keys_again_when_the_policy_changes(self):
+        db = self.open(max_items=5)
+        for i in range(5):
+            db.put(f'abc_{i}', b'value', self.content_type)
+
+        # abc_0 is the least recently, but the most frequently, read
+        for _ in range(3):
+            db[b'abc_0']
+        for i in range(1, 5):
+            db[f'abc_{i}'.encode()]
+        db.flush_accesses()
+        db.env.close()
+
+        db = self.open(max_items=5, eviction='lfu')
+        db.eviction_headroom = 0
+        db.put('abc_5', b'value', self.content_type)
+
+        self.assertIn(b'abc_0', db)
+        self.assertNotIn(b'abc_1', db)
+
+    def test_rank_index_follows_writes_reads_and_deletes(self):
+        db = self.open(max_items=100)
+        for i in range(5):
+            db.put(f'abc_{i}', b'value', self.content_type)
+
+        db.put('abc_1', b'longer value', self.content_type)
+        db[b'abc_0']
+        db.flush_accesses()
+        del db[b'abc_2']
+        db.delete_prefix('abc_4')
+
+        with db.env.begin(db=db._ranks) as txn:
+            ranked = [key[8:] for key in txn.cursor().iternext(keys=True, values=False)]
+
+        self.assertEqual([b'abc_3', b'abc_1', b'abc_0'], ranked)
+
+
+class TestDeduplication(TestCase):
+
+    def setUp(self) -> None:
+        self.content_type = 'application/octet-stream'
+        self.db = LmdbCollection(f'/tmp/{v4().hex}', deduplicate=True)
+        self.value = os.urandom(1024)
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    def blobs(self) -> int:
+        with self.db.env.begin() as txn:
+            return txn.stat(self.db._blobs)['entries']
+
+    def test_identical_values_are_stored_once(self):
+        self.db.put_many([(f'abc_{i}', self.value, self.content_type) for i in range(3)])
+
+        self.assertEqual(1, self.blobs())
+        self.assertEqual(2, self.db.deduplicated)
+        for i in range(3):
+            self.assertEqual(self.value, self.db[f'abc_{i}'])
+            self.assertEqual(self.value, bytes(self.db.view(f'abc_{i}')))
+            self.assertEqual(1024, self.db.content_length(f'abc_{i}'))
+
+    def test_value_is_removed_with_its_last_reference(self):
+        self.db.put_many([(f'abc_{i}', self.value, self.content_type) for i in range(3)])
+
+        del self.db['abc_0']
+        self.db.delete_many(['abc_1'])
+        self.assertEqual(1, self.blobs())
+        self.assertEqual(self.value, self.db['abc_2'])
+
+        self.db.delete_prefix('abc_')
+        self.assertEqual(0, self.blobs())
+
+    def test_overwriting_releases_previous_value(self):
+        self.db.put('abc_0', self.value, self.content_type)
+        self.db.put('abc_0', self.value, self.content_type)
+        self.assertEqual(1, self.blobs())
+        self.assertEqual(self.value, self.db['abc_0'])
+
+        self.db.put('abc_0', b'something else entirely, and long enough to share', self.content_type)
+        self.assertEqual(1, self.blobs())
+        self.assertEqual(b'something else entirely, and long enough to share', self.db['abc_0'])
+
+    def test_small_values_are_stored_in_place(self):
+        self.db.put('abc_0', b'value', self.content_type)
+        self.db.put('abc_1', b'value', self.content_type)
+        self.assertEqual(0, self.blobs())
+        self.assertEqual(b'value', self.db['abc_1'])
+
+    def test_sizes_are_those_of_values(self):
+        self.db.put_many([(f'abc_{i}', self.value, self.content_type) for i in range(3)])
+        self.assertEqual({b'abc': {'keys': 3, 'bytes': 3072}}, self.db.prefix_stats())
+        self.assertEqual(3072, self.db.nbytes)
+        self.assertEqual({'keys': 3, 'bytes': 3072}, self.db.delete_prefix('abc_', dry_run=True))
+
+    def test_values_are_read_after_deduplication_is_turned_off(self):
+        self.db.put('abc_0', self.value, self.content_type)
+        self.db.env.close()
+        self.db = LmdbCollection(self.db.path)
+
+        self.assertEqual(self.value, self.db['abc_0'])
+        self.db.put('abc_0', b'value', self.content_type)
+        self.assertEqual(0, self.blobs())
+
+    def test_values_that_look_like_pointers_are_read_back(self):
+        # one of them names a value that's actually stored
+        self.db.put('abc_0', self.value, self.content_type)
+        values = [POINTER_PREFIX + hashlib.sha256(self.value).digest(), POINTER_PREFIX + bytes(32)]
+
+        plain = LmdbCollection(f'/tmp/{v4().hex}')
+        try:
+            for db in [self.db, plain]:
+                for i, value in enumerate(values, 1):
+                    db.put(f'abc_{i}', value, self.content_type)
+                    self.assertEqual(value, db[f'abc_{i}'])
+                    self.assertEqual(value, bytes(db.view(f'abc_{i}')))
+                    self.assertEqual(len(value), db.content_length(f'abc_{i}'))
+
+            self.db.delete_many(['abc_1', 'abc_2'])
+            self.assertEqual(self.value, self.db['abc_0'])
+            self.assertEqual(1, self.blobs())
+        finally:
+            plain.destroy()
+
+    def test_identical_values_are_copied_rather_than_replicated(self):
+        remote = RemoteStandIn(f'/tmp/{v4().hex}')
+        db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}',
+            remote_bucket=None,
+            local_backup=remote,
+            write_behind=True,
+            deduplicate=True)
+
+        try:
+            db.put('abc_0', self.value, self.content_type)
+            self.assertTrue(db.flush(timeout=5))
+            db.put_many([(f'abc_{i}', self.value, self.content_type) for i in range(1, 3)])
+            self.assertTrue(db.flush(timeout=5))
+
+            self.assertEqual(1, db.replication_stats['uploaded'])
+            self.assertEqual(2, db.replication_stats['copied'])
+            for i in range(3):
+                self.assertEqual(self.value, remote[f'abc_{i}'])
+        finally:
+            db.destroy()
+
+
+class TestCompressedLmdbCollection(TestCase):
+
+    def setUp(self) -> None:
+        self.content_type = 'text/plain'
+        self.path = f'/tmp/{v4().hex}'
+        self.db = LmdbCollection(self.path, compression=Compression(default=ZlibCodec()))
+        self.value = b'the same few words, over and over again. ' * 200
+
+    def tearDown(self) -> None:
+        self.db.destroy()
+
+    def stored(self, key: bytes) -> bytes:
+        with self.db.env.begin(db=self.db._data) as txn:
+            return txn.get(key)
+
+    def test_values_are_compressed_when_stored(self):
+        self.db.put('abc_0', self.value, self.content_type)
+
+        self.assertLess(len(self.stored(b'abc_0')), len(self.value))
+        self.assertEqual(self.value, self.db['abc_0'])
+        self.assertEqual(self.value, bytes(self.db.view('abc_0')))
+        self.assertEqual((self.value, self.content_type), self.db.get_with_content_type('abc_0'))
+
+    def test_sizes(self):
+        self.db.put('abc_0', self.value, self.content_type)
+        stored = len(self.stored(b'abc_0'))
+
+        self.assertEqual(len(self.value), self.db.content_length('abc_0'))
+        self.assertEqual({b'abc': {'keys': 1, 'bytes': stored}}, self.db.prefix_stats())
+
+    def test_compressed_values_are_read_without_compression(self):
+        self.db.put('abc_0', self.value, self.content_type)
+        self.db.env.close()
+        self.db = LmdbCollection(self.path)
+        self.assertEqual(self.value, self.db['abc_0'])
+
+    def test_compression_with_deduplication(self):
+        self.db.deduplicate = True
+        self.db.put_many([(f'abc_{i}', self.value, self.content_type) for i in range(3)])
+
+        self.assertEqual(2, self.db.deduplicated)
+        self.assertEqual(self.value, self.db['abc_2'])
+
+    @skipIf(zstandard is None, 'zstandard is required for zstd dictionaries')
+    def test_trained_dictionaries_are_stored(self):
+        for i in range(2000):
+            self.db.put(f'abc_{i}', json.dumps({'key': f'doc_{i}', 'label': 'speech'}), 'application/json')
+
+        self.db.train_dictionary('application/json', prefix='abc_', dict_size=4096)
+        self.db.put('abd_0', json.dumps({'key': 'doc_5000', 'label': 'speech'}), 'application/json')
+
+        self.db.env.close()
+        self.db = LmdbCollection(self.path)
+        self.assertEqual({'key': 'doc_5000', 'label': 'speech'}, json.loads(self.db['abd_0']))
+        self.assertIn('application/json', self.db.compression.codecs)
+
+    @skipIf(zstandard is None, 'zstandard is required for zstd dictionaries')
+    def test_backups_store_the_dictionaries_of_their_values(self):
+        db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}', None, local_backup=True, compression=Compression(default=ZlibCodec()))
+
+        try:
+            for i in range(2000):
+                db.put(f'abc_{i}', json.dumps(document(i)), 'application/json')
+
+            db._local.train_dictionary('application/json', prefix='abc_', dict_size=4096)
+            db.put('abd_0', json.dumps(document(5000)), 'application/json')
+
+            db._remote.env.close()
+            backup = LmdbCollection(db._remote.path)
+            self.assertEqual(document(5000), json.loads(backup['abd_0']))
+            backup.destroy()
+        finally:
+            db._local.destroy()
+
+
+class RemoteStandIn(Collection):
+    """
+    A local stand-in for a remote collection, whose writes can be held up,
+    or made to fail
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.db = LmdbCollection(path)
+        self.gate = Event()
+        self.gate.set()
+        self.fail = False
+
+    def __getitem__(self, key):
+        return self.db[key]
+
+    def __contains__(self, key):
+        return key in self.db
+
+    def __delitem__(self, key):
+        del self.db[key]
+
+    def put(self, key, value, content_type, created=None):
+        self.gate.wait()
+        if self.fail:
+            raise IOError('remote is unavailable')
+        self.db.put(key, value, content_type, created=created)
+
+    def destroy(self):
+        self.db.destroy()
+
+
+class TestWriteBehind(TestCase):
+
+    def setUp(self) -> None:
+        self.content_type = 'text/plain'
+        self.path = f'/tmp/{v4().hex}'
+        self.remote = RemoteStandIn(f'/tmp/{v4().hex}')
+        self.db = self._open()
+
+    def _open(self, **kwargs):
+        return LocalCollectionWithBackup(
+            self.path,
+            remote_bucket=None,
+            local_backup=self.remote,
+            write_behind=True,
+            **kwargs)
+
+    def tearDown(self) -> None:
+        self.remote.gate.set()
+        self.db.destroy()
+
+    def test_writes_return_before_replication(self):
+        self.remote.gate.clear()
+
+        self.db.put(b'key', b'value', self.content_type)
+
+        self.assertEqual(b'value', self.db._local[b'key'])
+        self.assertNotIn(b'key', self.remote)
+        self.assertEqual(1, self.db.replication_stats['pending'])
+
+        self.remote.gate.set()
+        self.assertTrue(self.db.flush(timeout=5))
+
+        self.assertEqual(b'value', self.remote[b'key'])
+        self.assertEqual(0, self.db.replication_stats['pending'])
+        self.assertEqual(1, self.db.replication_stats['uploaded'])
+
+    def test_replicas_keep_the_time_they_were_created(self):
+        self.remote.gate.clear()
+        self.db.put(b'key', b'value', self.content_type)
+        created = self.db._local.metadata_many([b'key'])[0]['created']
+        time.sleep(0.01)
+
+        self.remote.gate.set()
+        self.assertTrue(self.db.flush(timeout=5))
+        self.assertEqual(created, self.remote.db.metadata_many([b'key'])[0]['created'])
+
+    def test_writes_succeed_while_replication_drains(self):
+        errors = []
+
+        def write(n: int):
+            try:
+                for i in range(500):
+                    self.db.put(f'{n}_{i}', b'value', self.content_type)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=write, args=(n,)) for n in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertTrue(self.db.flush(timeout=60))
+        self.assertEqual(3000, len(list(self.remote.db.iter_prefix(b''))))
+
+    def test_flush_times_out_while_remote_is_unavailable(self):
+        self.remote.gate.clear()
+        self.db.put(b'key', b'value', self.content_type)
+        self.assertFalse(self.db.flush(timeout=0.1))
+
+    def test_failed_uploads_are_retried(self):
+        self.remote.fail = True
+        self.db.put(b'key', b'value', self.content_type)
+        self.assertFalse(self.db.flush(timeout=0.3))
+
+        stats = self.db.replication_stats
+        self.assertGreaterEqual(stats['failed'], 1)
+        self.assertEqual(1, stats['pending'])
+
+        self.remote.fail = False
+        self.assertTrue(self.db.flush(timeout=5))
+        self.assertEqual(b'value', self.remote[b'key'])
+
+    def test_outbox_survives_restart(self):
+        self.remote.fail = True
+        self.db.put_many([(b'a', b'a', self.content_type), (b'b', b'b', self.content_type)])
+        self.db.close()
+        self.db._local.env.close()
+
+        self.remote.fail = False
+        self.db = self._open()
+
+        self.assertTrue(self.db.flush(timeout=5))
+        self.assertEqual(b'a', self.remote[b'a'])
+        self.assertEqual(b'b', self.remote[b'b'])
+
+    def test_writers_block_when_too_many_keys_are_pending(self):
+        self.db.close()
+        self.db._local.env.close()
+        self.db = self._open(max_pending=2)
+        self.remote.gate.clear()
+
+        self.db.put(b'a', b'a', self.content_type)
+        self.db.put(b'b', b'b', self.content_type)
+
+        writer = Thread(target=lambda: self.db.put(b'c', b'c', self.content_type))
+        writer.start()
+        writer.join(timeout=0.3)
+        self.assertTrue(writer.is_alive())
+
+        self.remote.gate.set()
+        writer.join(timeout=5)
+        self.assertFalse(writer.is_alive())
+
+        self.assertTrue(self.db.flush(timeout=5))
+        self.assertEqual(b'c', self.remote[b'c'])
+
+    def test_deleted_keys_are_not_replicated(self):
+        self.remote.fail = True
+        self.db.put(b'a', b'a', self.content_type)
+        self.db.put(b'b', b'b', self.content_type)
+        self.assertFalse(self.db.flush(timeout=0.3))
+
+        # removed locally, while the upload awaits a retry
+        del self.db._local[b'b']
+
+        self.remote.fail = False
+        self.assertTrue(self.db.flush(timeout=5))
+        self.assertIn(b'a', self.remote)
+        self.assertNotIn(b'b', self.remote)
+
+
+@skipIf(mock_aws is None, 'moto is required to run s3 tests locally')
+class TestS3Collection(TestCase):
+
+    def setUp(self) -> None:
+        self.mock = mock_aws()
+        self.mock.start()
+        self.content_type = 'text/plain'
+        self.db = S3Collection(
+            'conjure-test', existence_cache=ExistenceCache(positive_ttl=60, negative_ttl=60))
+
+    def tearDown(self) -> None:
+        self.mock.stop()
+
+    def test_contains_does_not_read_value(self):
+        self.db.put(b'key', b'value', self.content_type)
+        self.db.existence_cache.clear()
+
+        self.db.client.get_object = None
+        self.assertIn(b'key', self.db)
+        self.assertNotIn(b'missing', self.db)
+
+    def test_put_many_ignores_offset(self):
+        self.db.put_many([(b'a', b'a', self.content_type)], offset=b'abc_123')
+        self.assertEqual(b'a', self.db[b'a'])
+
+    def test_copy_within_bucket(self):
+        self.db.put(b'key', b'value', self.content_type)
+        self.db.copy(b'key', b'copy', 'application/json')
+
+        self.assertEqual((b'value', 'application/json'), self.db.get_with_content_type(b'copy'))
+        self.assertRaises(KeyError, lambda: self.db.copy(b'missing', b'other', self.content_type))
+
+    def test_compressed_values(self):
+        db = S3Collection('conjure-test', compression=Compression(default=ZlibCodec()))
+        value = b'the same few words, over and over again. ' * 200
+        db.put(b'key', value, self.content_type)
+
+        self.assertLess(
+            db.client.head_object(Bucket='conjure-test', Key='key')['ContentLength'], len(value))
+        self.assertEqual((value, self.content_type), db.get_with_content_type(b'key'))
+        self.assertEqual(len(value), db.content_length(b'key'))
+        self.assertEqual(value, db.open(b'key').read())
+
+        db.copy(b'key', b'copy', self.content_type)
+        self.assertEqual(value, db[b'copy'])
+        self.assertEqual(value, self.db[b'copy'])
+
+    @skipIf(zstandard is None, 'zstandard is required for zstd dictionaries')
+    def test_values_written_with_a_dictionary_are_read_elsewhere(self):
+        db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}', remote_bucket='conjure-test', compression=Compression(default=ZlibCodec()))
+
+        try:
+            for i in range(2000):
+                db.put(f'abc_{i}', json.dumps(document(i)), 'application/json')
+
+            db._local.train_dictionary('application/json', prefix='abc_', dict_size=4096)
+            db.put('abd_0', json.dumps(document(5000)), 'application/json')
+        finally:
+            db._local.destroy()
+
+        # a reader on another machine has never seen the dictionary
+        reader = LocalCollectionWithBackup(f'/tmp/{v4().hex}', remote_bucket='conjure-test')
+        try:
+            self.assertEqual(document(5000), json.loads(reader['abd_0']))
+
+            # the dictionary is never listed, or counted, as a key
+            self.assertEqual(2001, len(list(reader._remote.iter_prefix(b''))))
+            self.assertEqual({b'abc', b'abd'}, set(reader._remote.prefix_stats()))
+        finally:
+            reader._local.destroy()
+
+    def test_public_buckets_cannot_be_compressed(self):
+        self.assertRaises(
+            ValueError,
+            lambda: S3Collection('conjure-test', is_public=True, compression=Compression(default=ZlibCodec())))
+
+    def test_uploads_keep_the_time_values_were_created(self):
+        db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}', remote_bucket='conjure-test', deduplicate=True)
+        value = os.urandom(1024)
+
+        try:
+            db.put_many([(f'abc_{i}', value, self.content_type) for i in range(2)])
+
+            for key in [b'abc_0', b'abc_1']:
+                created = db._local.metadata_many([key])[0]['created']
+                _, metadata = self.db.get_with_metadata(key)
+                self.assertEqual(created, metadata['created'])
+        finally:
+            db._local.destroy()
+
+    def test_identical_values_are_uploaded_once(self):
+        db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}', remote_bucket='conjure-test', deduplicate=True)
+        value = os.urandom(1024)
+
+        uploads = []
+        put = db._remote.put
+        db._remote.put = lambda *args, **kwargs: uploads.append(args[0]) or put(*args, **kwargs)
+
+        try:
+            db.put_many([(f'abc_{i}', value, self.content_type) for i in range(3)])
+            self.assertEqual(['abc_0'], uploads)
+            for i in range(3):
+                self.assertEqual(value, self.db[f'abc_{i}'])
+        finally:
+            db._local.destroy()
+
+    def test_each_distinct_value_is_uploaded_once(self):
+        db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}', remote_bucket='conjure-test', deduplicate=True)
+        values = [os.urandom(1024) for _ in range(3)]
+
+        uploads = []
+        put = db._remote.put
+        db._remote.put = lambda *args, **kwargs: uploads.append(args[0]) or put(*args, **kwargs)
+
+        try:
+            db.put_many([(f'abc_{i}', values[i % 3], self.content_type) for i in range(9)])
+            self.assertEqual(['abc_0', 'abc_1', 'abc_2'], sorted(uploads))
+            for i in range(9):
+                self.assertEqual(values[i % 3], self.db[f'abc_{i}'])
+        finally:
+            db._local.destroy()
+
+    def test_replicas_overwritten_elsewhere_are_not_copied(self):
+        db = LocalCollectionWithBackup(
+            f'/tmp/{v4().hex}', remote_bucket='conjure-test', deduplicate=True)
+        value = os.urandom(1024)
+
+        try:
+            db.put('abc_0', value, self.content_type)
+
+            # another client replaces the replica
+            self.db.put('abc_0', b'overwritten', self.content_type)
+
+            db.put('abc_1', value, self.content_type)
+            self.assertEqual(value, self.db['abc_1'])
+        finally:
+            db._local.destroy()
+
+    def test_content_length(self):
+        self.db.put(b'key', b'value', self.content_type)
+        self.assertEqual(5, self.db.content_length(b'key'))
+        self.assertRaises(KeyError, lambda: self.db.content_length(b'missing'))
+
+    def test_existence_answers_are_cached(self):
+        self.assertNotIn(b'key', self.db)
+
+        # written by another client, and so not yet visible
+        self.db.client.put_object(Bucket=self.db.bucket, Key='key', Body=b'value')
+        self.assertNotIn(b'key', self.db)
+
+        self.db.existence_cache.invalidate(b'key')
+        self.assertIn(b'key', self.db)
+
+    def test_writes_and_deletes_update_cached_answers(self):
+        self.assertNotIn(b'key', self.db)
+        self.db.put(b'key', b'value', self.content_type)
+        self.assertIn(b'key', self.db)
+
+        del self.db[b'key']
+        self.assertNotIn(b'key', self.db)
+
+    def _multipart_collection(self):
+        # S3 requires parts of at least 5MB
+        return S3Collection(
+            'conjure-test',
+            multipart_threshold=6 * 1024 * 1024,
+            part_size=5 * 1024 * 1024)
+
+    def test_large_values_round_trip_in_parts(self):
+        db = self._multipart_collection()
+        value = os.urandom(12 * 1024 * 1024)
+
+        db.put(b'key', value, self.content_type)
+
+        head = db.client.head_object(Bucket=db.bucket, Key='key')
+        self.assertTrue(head['ETag'].strip('"').endswith('-3'))
+
+        read = db[b'key']
+        self.assertEqual(value, read)
+        self.assertEqual(len(value), db.content_length(b'key'))
+
+    def test_ranged_reads_restart_when_the_value_is_overwritten(self):
+        db = self._multipart_collection()
+        old = os.urandom(12 * 1024 * 1024)
+        new = os.urandom(12 * 1024 * 1024)
+        db.put(b'key', old, self.content_type)
+
+        get_range = db._get_range
+        overwrites = []
+
+        def overwrite_then_get_range(*args):
+            if not overwrites:
+                overwrites.append(True)
+                db.put(b'key', new, self.content_type)
+            return get_range(*args)
+
+        db._get_range = overwrite_then_get_range
+
+        read = db[b'key']
+        self.assertIsInstance(read, bytes)
+        self.assertEqual(new, read)
+
+    def test_can_upload_from_file_like_object(self):
+        db = self._multipart_collection()
+        value = os.urandom(7 * 1024 * 1024)
+
+        db.put(b'key', io.BytesIO(value), self.content_type)
+        self.assertEqual(value, db[b'key'])
+
+        db.put(b'empty', io.BytesIO(b''), self.content_type)
+        self.assertEqual(b'', db[b'empty'])
+
+    def test_small_and_empty_values(self):
+        self.db.put(b'small', b'value', self.content_type)
+        self.db.put(b'empty', b'', self.content_type)
+
+        self.assertEqual(b'value', self.db[b'small'])
+        self.assertEqual(b'', self.db[b'empty'])
+        self.assertRaises(KeyError, lambda: self.db[b'missing'])
+
+    def test_can_stream_and_seek(self):
+        db = self._multipart_collection()
+        value = os.urandom(11 * 1024 * 1024)
+        db.put(b'key', value, self.content_type)
+
+        with db.open(b'key') as f:
+            self.assertEqual(value[:10], f.read(10))
+
+            f.seek(6 * 1024 * 1024)
+            self.assertEqual(value[6 * 1024 * 1024:6 * 1024 * 1024 + 100], f.read(100))
+
+            f.seek(-5, io.SEEK_END)
+            self.assertEqual(value[-5:], f.read())
+            self.assertEqual(b'', f.read())
+
+        self.assertRaises(KeyError, lambda: db.open(b'missing'))
+
+    def test_delete_prefix_in_batches(self):
+        self.db.delete_batch_size = 10
+        for i in range(25):
+            self.db.put(f'abc_{i}', b'value', self.content_type)
+        self.db.put('abd_0', b'value', self.content_type)
+
+        report = self.db.delete_prefix('abc_', dry_run=True)
+        self.assertEqual({'keys': 25, 'bytes': 125}, report)
+        self.assertIn(b'abc_0', self.db)
+
+        report = self.db.delete_prefix('abc_')
+        self.assertEqual({'keys': 25, 'bytes': 125}, report)
+        self.assertEqual([b'abd_0'], list(self.db.iter_prefix('', 'ab')))
+        self.assertNotIn(b'abc_0', self.db)
+
+    def test_iter_prefix_includes_start_key(self):
+        for i in range(3):
+            self.db.put(f'abc_{i}', b'value', self.content_type)
+
+        self.assertEqual([b'abc_1', b'abc_2'], list(self.db.iter_prefix(b'abc_1', b'abc')))
+        self.assertEqual([b'abc_1'], list(self.db.iter_prefix(b'abc_1', b'abc', limit=1)))
+
+    def test_merged_listing_includes_start_key_once(self):
+        self.db.put('abc_1', b'value', self.content_type)
+        self.db.put('abc_2', b'value', self.content_type)
+
+        path = f'/tmp/{v4().hex}'
+        db = LocalCollectionWithBackup(path, remote_bucket='conjure-test')
+        try:
+            # only stored remotely
+            self.assertEqual(
+                [b'abc_1', b'abc_2'],
+                list(db.iter_prefix(b'abc_1', b'abc', include_remote=True)))
+
+            db._local.put('abc_1', b'value', self.content_type)
+            self.assertEqual(
+                [b'abc_1', b'abc_2'],
+                list(db.iter_prefix(b'abc_1', b'abc', include_remote=True)))
+        finally:
+            db._local.destroy()
+
+    def test_hydrated_keys_keep_the_time_they_were_uploaded(self):
+        self.db.put('abc_0', b'value', self.content_type)
+        uploaded = self.db.client.head_object(Bucket='conjure-test', Key='abc_0')['LastModified']
+
+        path = f'/tmp/{v4().hex}'
+        db = LocalCollectionWithBackup(path, remote_bucket='conjure-test')
+        try:
+            db.hydrate('abc_')
+            self.assertEqual(
+                uploaded.timestamp(), db._local.metadata_many([b'abc_0'])[0]['created'])
+        finally:
+            db._local.destroy()
+
+    def test_hydrates_local_collection_from_bucket(self):
+        for i in range(5):
+            self.db.put(f'abc_{i}', f'value-{i}'.encode(), self.content_type)
+
+        path = f'/tmp/{v4().hex}'
+        db = LocalCollectionWithBackup(path, remote_bucket='conjure-test')
+        try:
+            self.assertEqual([], list(db.iter_prefix(b'abc', b'abc')))
+            self.assertEqual(5, len(list(db.iter_prefix(b'abc', b'abc', include_remote=True))))
+
+            report = db.hydrate('abc_')
+
+            self.assertEqual({'keys': 5, 'bytes': 35}, report)
+            self.assertEqual(b'value-3', db._local[b'abc_3'])
+        finally:
+            db._local.destroy()
+
+    def test_prefix_stats(self):
+        for i in range(3):
+            self.db.put(f'abc_{i}', b'value', self.content_type)
+        self.db.put('abd_0', b'value', self.content_type)
+        self.db.put('no-delimiter', b'value', self.content_type)
+
+        self.assertEqual({
+            b'abc': {'keys': 3, 'bytes': 15},
+            b'abd': {'keys': 1, 'bytes': 5},
+        }, self.db.prefix_stats())
+
+    def test_delete_many(self):
+        self.db.put('a', b'value', self.content_type)
+        self.db.put('b', b'value', self.content_type)
+
+        self.assertEqual(
+            {'keys': 1, 'bytes': 5}, self.db.delete_many(['a', 'missing'], dry_run=True))
+
+        self.assertEqual(
+            {'keys': 1, 'bytes': 5}, self.db.delete_many(['a', 'missing']))
+        self.assertNotIn(b'a', self.db)
+        self.assertIn(b'b', self.db)